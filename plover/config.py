@@ -32,6 +32,8 @@ DEFAULT_SYSTEM_NAME = 'English Stenotype'
 SYSTEM_CONFIG_SECTION = 'System: %s'
 SYSTEM_KEYMAP_OPTION = 'keymap[%s]'
 
+PERFORMANCE_CONFIG_SECTION = 'Performance'
+
 
 class DictionaryConfig(namedtuple('DictionaryConfig', 'path enabled')):
 
@@ -350,6 +352,21 @@ class Config:
         plugin_option('system_name', 'system', DEFAULT_SYSTEM_NAME, 'System', 'name'),
         system_keymap_option(),
         dictionaries_option(),
+        # Performance.
+        boolean_option('cache_dictionaries', False, PERFORMANCE_CONFIG_SECTION),
+        int_option('dictionary_loading_processes', 0, 0, None, PERFORMANCE_CONFIG_SECTION),
+        boolean_option('prebuild_reverse_index', False, PERFORMANCE_CONFIG_SECTION),
+        boolean_option('prebuild_search_indexes', False, PERFORMANCE_CONFIG_SECTION),
+        boolean_option('prune_multistroke_lookups', False, PERFORMANCE_CONFIG_SECTION),
+        boolean_option('compact_dictionary_storage', False, PERFORMANCE_CONFIG_SECTION),
+        boolean_option('journaled_dictionary_saves', False, PERFORMANCE_CONFIG_SECTION),
+        int_option('dictionary_save_delay', 0, 0, None, PERFORMANCE_CONFIG_SECTION),
+        int_option('dictionary_lookup_cache_size', 0, 0, None, PERFORMANCE_CONFIG_SECTION),
+        boolean_option('merged_dictionary_index', False, PERFORMANCE_CONFIG_SECTION),
+        boolean_option('enable_latency_probes', False, PERFORMANCE_CONFIG_SECTION),
+        int_option('latency_log_interval', 60, 0, None, PERFORMANCE_CONFIG_SECTION),
+        int_option('hook_slow_threshold', 0, 0, None, PERFORMANCE_CONFIG_SECTION),
+        boolean_option('asynchronous_hooks', False, PERFORMANCE_CONFIG_SECTION),
     ])
 
     def _lookup(self, key):
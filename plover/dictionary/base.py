@@ -3,14 +3,15 @@
 
 # TODO: maybe move this code into the StenoDictionary itself. The current saver 
 # structure is odd and awkward.
-# TODO: write tests for this file
 
 """Common elements to all dictionary formats."""
 
 from os.path import splitext
-import functools
 import threading
+import time
 
+from plover import log
+from plover.dictionary.cache import load_in_process
 from plover.registry import registry
 
 
@@ -25,20 +26,102 @@ def _get_dictionary_class(filename):
                                   registry.list_plugins('dictionary'))))
     return dict_module
 
-def _locked(fn):
-    lock = threading.Lock()
-    @functools.wraps(fn)
-    def wrapper(*args, **kwargs):
-        with lock:
-            fn(*args, **kwargs)
-    return wrapper
-
-def _threaded(fn):
-    @functools.wraps(fn)
-    def wrapper(*args, **kwargs):
-        t = threading.Thread(target=fn, args=args, kwargs=kwargs)
-        t.start()
-    return wrapper
+
+class SaveScheduler:
+    """Save a dictionary in the background.
+
+    Once installed, the dictionary `save` method only schedules a save,
+    done by a single worker thread (only running while there are pending
+    saves). Save requests are debounced (see `delay`), and coalesced: any
+    number of requests made before the save starts result in a single save.
+
+    """
+
+    def __init__(self, dictionary, delay=0):
+        self._dictionary = dictionary
+        self._save = dictionary.save
+        # Delay (in seconds) between the last
+        # save request, and the actual save.
+        self.delay = delay
+        self._condition = threading.Condition()
+        self._listeners = set()
+        self._pending = False
+        self._deadline = 0
+        self._thread = None
+
+    @classmethod
+    def install(cls, dictionary, delay=0):
+        scheduler = cls(dictionary, delay)
+        dictionary.save = scheduler.schedule
+        dictionary.save_scheduler = scheduler
+        return scheduler
+
+    def add_listener(self, callback):
+        """Add a save completed notification callback.
+
+        <callback> is called from the worker thread with the dictionary,
+        the save duration (in seconds), and the exception if the save
+        failed (None otherwise).
+
+        """
+        self._listeners.add(callback)
+
+    def remove_listener(self, callback):
+        self._listeners.remove(callback)
+
+    def schedule(self):
+        with self._condition:
+            self._pending = True
+            self._deadline = time.monotonic() + self.delay
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.start()
+            else:
+                self._condition.notify_all()
+
+    def flush(self):
+        """Save now if a save is pending, and wait for any save in progress."""
+        with self._condition:
+            self._deadline = 0
+            self._condition.notify_all()
+            while self._thread is not None:
+                self._condition.wait()
+
+    def _run(self):
+        with self._condition:
+            while True:
+                if not self._pending:
+                    self._thread = None
+                    self._condition.notify_all()
+                    return
+                timeout = self._deadline - time.monotonic()
+                if timeout > 0:
+                    self._condition.wait(timeout)
+                    continue
+                self._pending = False
+                self._condition.release()
+                try:
+                    self._run_save()
+                finally:
+                    self._condition.acquire()
+
+    def _run_save(self):
+        exception = None
+        start_time = time.perf_counter()
+        try:
+            self._save()
+        except Exception as e:
+            log.error('saving dictionary %s failed', self._dictionary.path, exc_info=True)
+            exception = e
+        duration = time.perf_counter() - start_time
+        if exception is None:
+            log.debug('saved dictionary %s in %.3fs', self._dictionary.path, duration)
+        for callback in list(self._listeners):
+            try:
+                callback(self._dictionary, duration, exception)
+            except Exception:
+                log.error('dictionary save listener %r failed', callback, exc_info=True)
+
 
 def create_dictionary(resource, threaded_save=True):
     '''Create a new dictionary.
@@ -50,15 +133,40 @@ def create_dictionary(resource, threaded_save=True):
     '''
     d = _get_dictionary_class(resource).create(resource)
     if threaded_save:
-        d.save = _threaded(_locked(d.save))
+        SaveScheduler.install(d)
     return d
 
-def load_dictionary(resource, threaded_save=True):
+def load_dictionary(resource, threaded_save=True, cache=None, executor=None,
+                    progress=None, compact_storage=None):
     '''Load a dictionary from a file.
 
     The format is inferred from the extension.
+
+    If <threaded_save> is True, the dictionary is saved in the
+    background (see `SaveScheduler`).
+
+    For supported formats (see `StenoDictionary.cacheable`):
+    - if <cache> is not None, it must be a `plover.dictionary.cache.DictionaryCache`
+      instance, used to speed up loading
+    - if <executor> is not None, it must be a `concurrent.futures.ProcessPoolExecutor`,
+      used to parse the dictionary file in a separate process
+    - otherwise, if <progress> is not None, it's called with the number
+      of bytes processed so far and the total size of the file while
+      parsing it (see `StenoDictionary.load`)
+    - if <compact_storage> is not None, it overrides the format default
+      (see `StenoDictionary.compact_storage`)
     '''
-    d = _get_dictionary_class(resource).load(resource)
+    dict_class = _get_dictionary_class(resource)
+    if not dict_class.cacheable:
+        d = dict_class.load(resource)
+    elif cache is not None:
+        d = cache.load(dict_class, resource, executor, progress, compact_storage)
+    elif executor is not None:
+        d = load_in_process(dict_class, resource, executor,
+                            compact_storage=compact_storage)[0]
+    else:
+        d = dict_class.load(resource, progress=progress,
+                            compact_storage=compact_storage)
     if not d.readonly and threaded_save:
-        d.save = _threaded(_locked(d.save))
+        SaveScheduler.install(d)
     return d
@@ -0,0 +1,361 @@
+"""Binary pre-compiled dictionary cache.
+
+Parsing a big dictionary (decoding, normalizing every key, ...) is slow,
+so the result can be saved to a binary cache file, which can then be
+memory mapped and queried directly on the next load, without having to
+build the usual in-memory storage.
+
+A cache file is only valid for the exact same dictionary file (path,
+modification time and size, and same for its journal if any), dictionary
+class, and steno system.
+
+Layout (native byte order, all integers are unsigned 32 bits):
+
+- header: magic, version, number of entries, number of hash table
+  buckets, longest key, signature length, followed by the signature
+- hash table: one bucket per slot, holding an entry index + 1 (0 for an
+  empty bucket), open addressing with linear probing on the CRC32 of
+  the encoded key
+- entries: 4 integers per entry, key offset and length, and
+  translation offset and length, into the strings section
+- strings: UTF-8 encoded keys ('/' separated strokes) and translations
+
+"""
+
+from array import array
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+
+from plover import log, system
+from plover.resource import resource_filename, resource_update
+from plover.steno import STROKE_DELIMITER
+from plover.steno_dictionary import JOURNAL_SUFFIX
+
+
+MAGIC = b'PLVD'
+VERSION = 1
+
+_HEADER = struct.Struct('=4s5I')
+
+
+def _encode_key(key):
+    return STROKE_DELIMITER.join(key).encode('utf-8')
+
+def _decode_key(key_bytes):
+    if not key_bytes:
+        return ()
+    return tuple(str(key_bytes, 'utf-8').split(STROKE_DELIMITER))
+
+
+class MappedStorage:
+    """Read-only dictionary storage, backed by a memory mapped cache file
+    (or any other buffer holding data in the cache format).
+
+    Note: the entries are decoded on the fly on access, no Python objects
+    are created for them until then. The results of the last lookups
+    (including misses) are cached, so the entries used while writing
+    are only decoded once (the storage is read-only, so the cache is
+    never outdated).
+
+    """
+
+    frozen = True
+
+    # Maximum number of cached lookups (see `get`):
+    # the cache is simply reset once full.
+    LOOKUP_CACHE_SIZE = 10000
+
+    def __init__(self, buffer):
+        magic, version, count, bucket_count, longest_key, signature_len = \
+                _HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('invalid cache file')
+        view = memoryview(buffer)
+        offset = _HEADER.size
+        self.signature = bytes(view[offset:offset+signature_len])
+        offset += signature_len
+        offset += -offset % 4
+        end = offset + 4 * bucket_count
+        self._buckets = view[offset:end].cast('I')
+        offset, end = end, end + 16 * count
+        self._entries = view[offset:end].cast('I')
+        self._strings = view[end:]
+        self._buffer = buffer
+        self._count = count
+        self._mask = bucket_count - 1
+        self.longest_key = longest_key
+        self._lookup_cache = {}
+
+    @classmethod
+    def open(cls, filename):
+        with open(filename, 'rb') as fp:
+            buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer)
+
+    def _string(self, offset, length):
+        return str(self._strings[offset:offset+length], 'utf-8')
+
+    def _find(self, key):
+        try:
+            key_bytes = _encode_key(key)
+        except TypeError:
+            return None
+        buckets = self._buckets
+        entries = self._entries
+        strings = self._strings
+        mask = self._mask
+        n = zlib.crc32(key_bytes) & mask
+        while True:
+            index = buckets[n]
+            if not index:
+                return None
+            index = 4 * (index - 1)
+            key_offset, key_len = entries[index], entries[index+1]
+            if strings[key_offset:key_offset+key_len] == key_bytes:
+                return self._string(entries[index+2], entries[index+3])
+            n = (n + 1) & mask
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        entries = self._entries
+        strings = self._strings
+        for index in range(0, 4 * self._count, 4):
+            key_offset, key_len = entries[index], entries[index+1]
+            yield _decode_key(strings[key_offset:key_offset+key_len])
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, fallback=None):
+        cache = self._lookup_cache
+        try:
+            value = cache[key]
+        except KeyError:
+            value = self._find(key)
+            if len(cache) >= self.LOOKUP_CACHE_SIZE:
+                cache.clear()
+            cache[key] = value
+        except TypeError:
+            # Unhashable key.
+            return fallback
+        return fallback if value is None else value
+
+    def items(self):
+        entries = self._entries
+        strings = self._strings
+        for index in range(0, 4 * self._count, 4):
+            key_offset, key_len, value_offset, value_len = entries[index:index+4]
+            yield (_decode_key(strings[key_offset:key_offset+key_len]),
+                   self._string(value_offset, value_len))
+
+    @staticmethod
+    def pack(key):
+        return key
+
+    @staticmethod
+    def unpack(packed_key):
+        return packed_key
+
+    @staticmethod
+    def key_length(packed_key):
+        return len(packed_key)
+
+    @staticmethod
+    def prefixes(packed_key):
+        return (packed_key[:n] for n in range(1, len(packed_key)))
+
+    @staticmethod
+    def intern(value):
+        return value
+
+    packed_keys = __iter__
+    packed_items = items
+
+
+def pack_entries(signature, items):
+    """Pack the dictionary entries <items> in the cache format."""
+    strings = bytearray()
+    entries = array('I')
+    hashes = []
+    longest_key = 0
+    for key, value in items:
+        key_bytes = _encode_key(key)
+        value_bytes = value.encode('utf-8')
+        entries.extend((len(strings), len(key_bytes),
+                        len(strings) + len(key_bytes), len(value_bytes)))
+        strings += key_bytes
+        strings += value_bytes
+        hashes.append(zlib.crc32(key_bytes))
+        longest_key = max(longest_key, len(key))
+    count = len(hashes)
+    # Keep the load factor under 50%.
+    bucket_count = 1
+    while bucket_count < 2 * count:
+        bucket_count *= 2
+    mask = bucket_count - 1
+    buckets = array('I', bytes(4 * bucket_count))
+    for index, h in enumerate(hashes):
+        n = h & mask
+        while buckets[n]:
+            n = (n + 1) & mask
+        buckets[n] = index + 1
+    header = _HEADER.pack(MAGIC, VERSION, count, bucket_count,
+                          longest_key, len(signature)) + signature
+    return b''.join((
+        header, bytes(-len(header) % 4),
+        buckets.tobytes(), entries.tobytes(),
+        strings,
+    ))
+
+def write_cache(filename, signature, items):
+    """Write a cache file for the dictionary entries <items>."""
+    with open(filename, 'wb') as fp:
+        fp.write(pack_entries(signature, items))
+
+def load_packed(dict_class, resource, signature=b''):
+    """Load a dictionary, and return its entries packed in the cache format.
+
+    Note: this is meant to be run in a worker process (see `load_in_process`).
+
+    """
+    return pack_entries(signature, dict_class.load(resource).items())
+
+def load_in_process(dict_class, resource, executor, signature=b'',
+                    compact_storage=None):
+    """Load a dictionary by parsing it in a separate process.
+
+    The worker sends back the entries packed in the cache format, so the
+    result is cheap to transfer, and directly usable as storage for the
+    dictionary (see `MappedStorage`).
+
+    Return the dictionary and the packed data.
+
+    """
+    data = executor.submit(load_packed, dict_class, resource, signature).result()
+    return dict_class.load(resource, storage=MappedStorage(data),
+                           compact_storage=compact_storage), data
+
+
+class DictionaryCache:
+    """Manage the pre-compiled caches of dictionaries under <cache_dir>."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def cache_path(self, resource):
+        name = hashlib.sha1(resource.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, name + '.cache')
+
+    @staticmethod
+    def signature(dict_class, resource):
+        filename = resource_filename(resource)
+        st = os.stat(filename)
+        journal = ''
+        if dict_class.journalable:
+            try:
+                journal_st = os.stat(filename + JOURNAL_SUFFIX)
+            except FileNotFoundError:
+                pass
+            else:
+                journal = '%r:%u' % (journal_st.st_mtime, journal_st.st_size)
+        return '\0'.join((
+            resource,
+            repr(st.st_mtime),
+            str(st.st_size),
+            journal,
+            '%s.%s' % (dict_class.__module__, dict_class.__qualname__),
+            system.NAME or '',
+            sys.byteorder,
+        )).encode('utf-8')
+
+    def load(self, dict_class, resource, executor=None, progress=None,
+             compact_storage=None):
+        """Load a dictionary, using the cache if it's valid.
+
+        If not, the dictionary is loaded normally (in a separate process
+        if <executor> is set, see `load_in_process`, otherwise reporting
+        progress to <progress> if set), and the cache is rebuilt from the
+        result in the background.
+
+        See `StenoDictionary.load` for <compact_storage>.
+
+        """
+        signature = self.signature(dict_class, resource)
+        cache_path = self.cache_path(resource)
+        storage = None
+        if os.path.exists(cache_path):
+            try:
+                storage = MappedStorage.open(cache_path)
+            except (OSError, ValueError, struct.error):
+                log.debug('invalid dictionary cache: %s', cache_path, exc_info=True)
+            else:
+                if storage.signature != signature:
+                    storage = None
+        if storage is not None:
+            log.debug('loading dictionary %s from cache', resource)
+            return dict_class.load(resource, storage=storage,
+                                   compact_storage=compact_storage)
+        if executor is None:
+            d = dict_class.load(resource, progress=progress,
+                                compact_storage=compact_storage)
+            # Note: copy the entries now, before the dictionary can be
+            # changed: they must match the signature.
+            args = (cache_path, signature, d.items_snapshot())
+        else:
+            d, data = load_in_process(dict_class, resource, executor,
+                                      signature, compact_storage)
+            args = (cache_path, signature, None, data)
+        threading.Thread(target=self.update, args=args, daemon=True).start()
+        return d
+
+    def update(self, cache_path, signature, items, data=None):
+        """(Re)build a dictionary cache from its entries <items>.
+
+        If <data> is set, it must be the dictionary entries
+        already packed in the cache format (see `pack_entries`).
+
+        """
+        start_time = time.time()
+        try:
+            if data is None:
+                data = pack_entries(signature, items)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with resource_update(cache_path) as temp_path:
+                with open(temp_path, 'wb') as fp:
+                    fp.write(data)
+        except Exception:
+            log.debug('updating dictionary cache %s failed', cache_path, exc_info=True)
+        else:
+            log.debug('updated dictionary cache %s in %.3fs',
+                      cache_path, time.time() - start_time)
+
+    def prune(self, resources):
+        """Remove the caches of dictionaries other than <resources>."""
+        keep = {os.path.basename(self.cache_path(resource))
+                for resource in resources}
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not name.endswith('.cache') or name in keep:
+                continue
+            try:
+                os.unlink(os.path.join(self.cache_dir, name))
+            except OSError:
+                # E.g. still in use on Windows.
+                log.debug('removing dictionary cache %s failed', name, exc_info=True)
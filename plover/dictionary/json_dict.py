@@ -6,6 +6,8 @@
 """
 
 import codecs
+import os
+import re
 
 try:
     import simplejson as json
@@ -16,22 +18,143 @@ from plover.steno_dictionary import StenoDictionary
 from plover.steno import normalize_steno
 
 
+# Size of the chunks read when parsing a dictionary file.
+CHUNK_SIZE = 1024 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# Fast path for the common case of an entry mapping a string to a string:
+# key, value, and the following delimiter (`,` or the closing brace).
+# Note: control characters are not allowed in strings.
+_STRING = r'"([^"\\\x00-\x1f]*(?:\\.[^"\\\x00-\x1f]*)*)"'
+_STRING_ENTRY = re.compile(r'[ \t\n\r]*{0}[ \t\n\r]*:[ \t\n\r]*{0}[ \t\n\r]*([,}}])'
+                           .format(_STRING), re.DOTALL)
+
+
+def _parse_entries(fp, encoding, progress):
+    """Incrementally parse the JSON object in file <fp>.
+
+    Entries are yielded as they are parsed, so only one chunk of
+    the file contents is kept in memory at any given time.
+
+    If the top-level value is not an object, fallback to parsing
+    the whole contents at once, so errors are the same as for
+    `dict(json.loads(contents))`.
+
+    """
+    total = os.fstat(fp.fileno()).st_size
+    decoder = codecs.getincrementaldecoder(encoding)()
+    raw_decode = json.JSONDecoder().raw_decode
+    skip_whitespace = _WHITESPACE.match
+    match_string_entry = _STRING_ENTRY.match
+    done = 0
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def read_more():
+        nonlocal buffer, pos, done, eof
+        if eof:
+            return False
+        data = fp.read(CHUNK_SIZE)
+        done += len(data)
+        eof = not data
+        buffer = buffer[pos:] + decoder.decode(data, final=eof)
+        pos = 0
+        progress(done, total)
+        return True
+
+    def unescape(string):
+        if '\\' in string:
+            string = raw_decode('"%s"' % string)[0]
+        return string
+
+    def parse_entry():
+        end = skip_whitespace(buffer, pos).end()
+        if buffer[end] != '"':
+            raise ValueError('Expecting property name enclosed in double quotes')
+        key, end = raw_decode(buffer, end)
+        end = skip_whitespace(buffer, end).end()
+        if buffer[end] != ':':
+            raise ValueError('Expecting \':\' delimiter')
+        end = skip_whitespace(buffer, end + 1).end()
+        value, end = raw_decode(buffer, end)
+        end = skip_whitespace(buffer, end).end()
+        if buffer[end] not in ',}':
+            raise ValueError('Expecting \',\' delimiter')
+        return key, value, end
+
+    # Opening brace.
+    while True:
+        pos = skip_whitespace(buffer, pos).end()
+        if pos < len(buffer) or not read_more():
+            break
+    if buffer[pos:pos+1] != '{':
+        while read_more():
+            pass
+        yield from dict(json.loads(buffer)).items()
+        return
+    pos += 1
+    # Empty object?
+    while True:
+        pos = skip_whitespace(buffer, pos).end()
+        if pos < len(buffer) or not read_more():
+            break
+    if buffer[pos:pos+1] == '}':
+        pos += 1
+    else:
+        # Entries.
+        while True:
+            m = match_string_entry(buffer, pos)
+            if m is not None:
+                key, value, delimiter = m.groups()
+                key, value = unescape(key), unescape(value)
+                end = m.end() - 1
+            else:
+                # Note: on error, assume this is because the current
+                # entry is truncated, and try again with more data.
+                try:
+                    key, value, end = parse_entry()
+                except (IndexError, ValueError) as e:
+                    if not read_more():
+                        if isinstance(e, IndexError):
+                            e = 'unexpected end of file'
+                        raise ValueError('invalid JSON dictionary: %s' % e) from None
+                    continue
+                delimiter = buffer[end]
+            yield key, value
+            pos = end + 1
+            if delimiter == '}':
+                break
+    # Trailing whitespace.
+    while True:
+        pos = skip_whitespace(buffer, pos).end()
+        if pos < len(buffer):
+            raise ValueError('invalid JSON dictionary: extra data')
+        if not read_more():
+            break
+
+
 class JsonDictionary(StenoDictionary):
 
+    cacheable = True
+    journalable = True
+
     def _load(self, filename):
         with open(filename, 'rb') as fp:
-            contents = fp.read()
-        for encoding in ('utf-8', 'latin-1'):
-            try:
-                contents = contents.decode(encoding)
-            except UnicodeDecodeError:
-                continue
+            for encoding in ('utf-8', 'latin-1'):
+                fp.seek(0)
+                try:
+                    # Note: the entries are added straight to the
+                    # storage, without any intermediate dictionary.
+                    self.update((normalize_steno(k), v) for k, v in
+                                _parse_entries(fp, encoding, self._loading_progress))
+                except UnicodeDecodeError:
+                    continue
+                else:
+                    break
             else:
-                break
-        else:
-            raise ValueError('\'%s\' encoding could not be determined' % (filename,))
-        d = dict(json.loads(contents))
-        self.update((normalize_steno(x[0]), x[1]) for x in d.items())
+                raise ValueError('\'%s\' encoding could not be determined' % (filename,))
 
     def _save(self, filename):
         with open(filename, 'wb') as fp:
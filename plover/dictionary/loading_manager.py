@@ -3,18 +3,68 @@
 
 """Centralized place for dictionary loading operation."""
 
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import multiprocessing
+import sys
 import threading
 import time
 
 from plover.dictionary.base import load_dictionary
 from plover.exception import DictionaryLoaderException
+from plover.registry import registry
 from plover.resource import resource_timestamp
-from plover import log
+from plover import log, system
+
+
+def _init_loading_process(sys_path, system_name):
+    # Make sure worker processes can load the same plugins
+    # (when not forked from the main process).
+    sys.path[:] = sys_path
+    if not registry.list_plugins('dictionary'):
+        registry.update()
+    if system.NAME != system_name:
+        system.setup(system_name)
+
+
+def _can_use_processes():
+    # Worker processes re-run the frozen executable: outside of
+    # Windows (see `multiprocessing.freeze_support`), they would
+    # start another instance of the application.
+    return not getattr(sys, 'frozen', False) or sys.platform.startswith('win')
 
 
 class DictionaryLoadingManager:
 
-    def __init__(self):
+    def __init__(self, prebuild_reverse_index=False, cache=None, processes=0,
+                 progress=None, prebuild_search_indexes=False,
+                 build_prefix_index=False, compact_storage=None):
+        # If set, build the reverse lookup indexes of each
+        # dictionary in the background after loading it,
+        # instead of on the first reverse lookup.
+        self.prebuild_reverse_index = prebuild_reverse_index
+        # Same, for the search indexes (see `StenoDictionary.search`).
+        self.prebuild_search_indexes = prebuild_search_indexes
+        # If set, build the prefix index of each dictionary in the
+        # background after loading it, so multi-stroke lookups
+        # can be pruned (see `StenoDictionary.has_prefix`).
+        self.build_prefix_index = build_prefix_index
+        # If not None, override the storage of supported dictionaries
+        # (see `StenoDictionary.compact_storage`): only applies to
+        # dictionaries loaded (or reloaded) afterwards.
+        self.compact_storage = compact_storage
+        # Optional pre-compiled dictionaries cache
+        # (see `plover.dictionary.cache.DictionaryCache`).
+        self.cache = cache
+        # If not 0, the maximum number of worker processes
+        # used by `load` to parse supported dictionaries,
+        # otherwise everything happens in this process.
+        self.processes = processes
+        # If set, called with the dictionary filename, the number of
+        # bytes processed so far, and the total size of the file, while
+        # parsing supported dictionaries (see `load_dictionary`).
+        # Note: this is done from the loading threads.
+        self.progress = progress
         self.dictionaries = {}
 
     def __len__(self):
@@ -26,12 +76,16 @@ class DictionaryLoadingManager:
     def __contains__(self, filename):
         return filename in self.dictionaries
 
-    def start_loading(self, filename):
+    def start_loading(self, filename, executor=None):
         op = self.dictionaries.get(filename)
         if op is not None and not op.needs_reloading():
             return op
         log.info('%s dictionary: %s', 'loading' if op is None else 'reloading', filename)
-        op = DictionaryLoadingOperation(filename)
+        op = DictionaryLoadingOperation(filename, self.prebuild_reverse_index,
+                                        self.cache, executor, self.progress,
+                                        self.prebuild_search_indexes,
+                                        self.build_prefix_index,
+                                        self.compact_storage)
         self.dictionaries[filename] = op
         return op
 
@@ -42,11 +96,32 @@ class DictionaryLoadingManager:
 
     def load(self, filenames):
         start_time = time.time()
-        self.dictionaries = {f: self.start_loading(f) for f in filenames}
-        results = [
-            self.dictionaries[f].get()
-            for f in filenames
-        ]
+        executor = None
+        if self.processes and filenames and not _can_use_processes():
+            log.debug('worker processes are not supported in frozen '
+                      'builds on this platform, loading in threads')
+        elif self.processes and filenames:
+            # Note: worker processes are only started on demand, and
+            # spawned, not forked: forking a multi-threaded process
+            # (e.g. from the other loading threads) can deadlock.
+            executor = ProcessPoolExecutor(
+                max_workers=min(self.processes, len(filenames)),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_loading_process,
+                initargs=(sys.path, system.NAME),
+            )
+        try:
+            self.dictionaries = {f: self.start_loading(f, executor) for f in filenames}
+            results = [
+                self.dictionaries[f].get()
+                for f in filenames
+            ]
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        if self.cache is not None:
+            # Forget about dictionaries that are not used anymore.
+            self.cache.prune(filenames)
         log.info('loaded %u dictionaries in %.3fs',
                  len(results), time.time() - start_time)
         return results
@@ -54,9 +129,19 @@ class DictionaryLoadingManager:
 
 class DictionaryLoadingOperation:
 
-    def __init__(self, filename):
+    def __init__(self, filename, prebuild_reverse_index=False,
+                 cache=None, executor=None, progress=None,
+                 prebuild_search_indexes=False, build_prefix_index=False,
+                 compact_storage=None):
         self.loading_thread = threading.Thread(target=self.load)
         self.filename = filename
+        self.prebuild_reverse_index = prebuild_reverse_index
+        self.prebuild_search_indexes = prebuild_search_indexes
+        self.build_prefix_index = build_prefix_index
+        self.compact_storage = compact_storage
+        self.cache = cache
+        self.executor = executor
+        self.progress = progress
         self.result = None
         self.loading_thread.start()
 
@@ -86,7 +171,19 @@ class DictionaryLoadingOperation:
         timestamp = None
         try:
             timestamp = resource_timestamp(self.filename)
-            self.result = load_dictionary(self.filename)
+            progress = self.progress
+            if progress is not None:
+                progress = functools.partial(progress, self.filename)
+            self.result = load_dictionary(self.filename, cache=self.cache,
+                                          executor=self.executor,
+                                          progress=progress,
+                                          compact_storage=self.compact_storage)
+            if self.prebuild_reverse_index:
+                self.result.build_reverse_index(background=True)
+            if self.prebuild_search_indexes:
+                self.result.build_search_indexes(background=True)
+            if self.build_prefix_index:
+                self.result.build_prefix_index(background=True)
         except Exception as e:
             log.debug('loading dictionary %s failed', self.filename, exc_info=True)
             self.result = DictionaryLoaderException(self.filename, e)
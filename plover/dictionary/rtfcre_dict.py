@@ -13,7 +13,6 @@ http://www.legalxml.org/workgroups/substantive/transcripts/cre-spec.htm
 
 """
 
-import codecs
 import inspect
 import re
 
@@ -24,11 +23,81 @@ from plover.formatting import ATOM_RE
 
 
 # A regular expression to capture an individual entry in the dictionary.
+# Note: only kept as a reference, see `parse_entries`.
 DICT_ENTRY_PATTERN = re.compile(r'(?s)(?<!\\){\\\*\\cxs (?P<steno>[^}]+)}' + 
                                 r'(?P<translation>.*?)(?:(?<!\\)(?:\r\n|\n))*?'+
                                 r'(?=(?:(?<!\\){\\\*\\cxs [^}]+})|' +
                                 r'(?:(?:(?<!\\)(?:\r\n|\n)\s*)*}\s*\Z))')
 
+# Start of an entry (followed by its steno).
+ENTRY_START = '{\\*\\cxs '
+
+
+def _find_entry(s, pos):
+    # Find the next entry from <pos>, return the positions
+    # of its start and of the end of its steno, or (-1, -1).
+    while True:
+        start = s.find(ENTRY_START, pos)
+        if start == -1:
+            return -1, -1
+        steno_start = start + len(ENTRY_START)
+        steno_end = s.find('}', steno_start)
+        if steno_end == -1:
+            return -1, -1
+        if steno_end != steno_start and (start == 0 or s[start-1] != '\\'):
+            return start, steno_end
+        pos = start + 1
+
+def _is_newline(s, pos):
+    # Unescaped newline at <pos>?
+    return (s.startswith('\n', pos) or s.startswith('\r\n', pos)) and \
+            (pos == 0 or s[pos-1] != '\\')
+
+def parse_entries(s):
+    """Split the RTF/CRE dictionary contents <s> into (steno, translation) pairs.
+
+    This is a linear version of `DICT_ENTRY_PATTERN`, with the same results:
+    - a translation ends with the next entry start, or with the closing
+      brace of the document (entries before an unterminated end are dropped)
+    - unescaped trailing newlines are not part of a translation
+
+    """
+    start, steno_end = _find_entry(s, 0)
+    if start == -1:
+        return
+    # End of the document: position of the closing brace.
+    closing_brace = len(s)
+    while closing_brace and s[closing_brace-1].isspace():
+        closing_brace -= 1
+    closing_brace -= 1
+    while start != -1:
+        steno = s[start+len(ENTRY_START):steno_end]
+        translation_start = steno_end + 1
+        start, steno_end = _find_entry(s, translation_start)
+        if start != -1:
+            translation_end = start
+            # Strip trailing newlines.
+            while translation_end > translation_start and s[translation_end-1] == '\n':
+                if translation_end - 2 >= translation_start and \
+                   s[translation_end-2] == '\r' and \
+                   _is_newline(s, translation_end - 2):
+                    translation_end -= 2
+                elif _is_newline(s, translation_end - 1):
+                    translation_end -= 1
+                else:
+                    break
+        else:
+            if closing_brace < translation_start or s[closing_brace] != '}':
+                return
+            # Strip trailing whitespace, starting from the first newline.
+            translation_end = closing_brace
+            while translation_end > translation_start and s[translation_end-1].isspace():
+                translation_end -= 1
+            while translation_end < closing_brace and not _is_newline(s, translation_end):
+                translation_end += 1
+        yield steno, s[translation_start:translation_end]
+
+
 class TranslationConverter:
     """Convert an RTF/CRE translation into plover's internal format."""
     
@@ -277,6 +346,99 @@ class TranslationConverter:
             tokens.append(token)
         return ''.join(tokens)
 
+class TranslationParser(TranslationConverter):
+    """Faster `TranslationConverter`, with the same output.
+
+    Instead of trying every handler in turn at each position, dispatch
+    on the first character of the next token, so only the handlers that
+    can possibly match are tried (in the same order).
+
+    """
+
+    # Single character escapes: `\` followed by...
+    ESCAPES = {
+        # _re_handle_escapedchar
+        '-': '-', '\\': '\\', '{': '{', '}': '}',
+        # _re_handle_hardspace
+        '~': '{^ ^}',
+        # _re_handle_dash
+        '_': '-',
+        # _re_handle_escaped_newline
+        '\r': '{#Return}{#Return}',
+        '\n': '{#Return}{#Return}',
+    }
+
+    def __init__(self, styles={}):
+        super().__init__(styles)
+        def handler(method):
+            return re.compile(method.__doc__).match, method
+        self._infix = handler(self._re_handle_infix)
+        self._suffix = handler(self._re_handle_suffix)
+        self._prefix = handler(self._re_handle_prefix)
+        self._commands = handler(self._re_handle_commands)
+        self._simple_command_group = handler(self._re_handle_simple_command_group)
+        self._eclipse_command = handler(self._re_handle_eclipse_command)
+        self._punctuation = handler(self._re_handle_punctuation)
+        self._text = handler(self._re_handle_text)
+        # Anything that's not plain text.
+        self._find_special = re.compile(r'[{}\\\r\n]|  ').search
+
+    def _next_token(self, s, pos):
+        c = s[pos]
+        if c == '\\':
+            token = self.ESCAPES.get(s[pos+1:pos+2])
+            if token is not None:
+                return pos + 2, token
+            if s.startswith('cxds ', pos + 1):
+                candidates = (self._infix, self._suffix, self._commands)
+            else:
+                candidates = (self._commands,)
+        elif c == '{':
+            candidates = (self._simple_command_group, self._eclipse_command)
+        elif c in '}\r\n':
+            return None
+        else:
+            match_text, handle_text = self._text
+            m = match_text(s, pos)
+            text = m.group()
+            # Note: a prefix can only match if the text
+            # has no spaces, and is followed by `\cxds`.
+            if ' ' not in text and s.startswith('\\cxds', m.end()):
+                candidates = (self._prefix,)
+            elif pos == 0 and c in '.?!:;,':
+                candidates = (self._punctuation,)
+            elif '  ' in text:
+                return m.end(), handle_text(m)
+            else:
+                return m.end(), text
+            candidates += (self._text,)
+        for match, handle in candidates:
+            m = match(s, pos)
+            if m is not None:
+                return m.end(), handle(m)
+        if c == '{':
+            return self._match_nested_command_group(s, pos)
+        return None
+
+    def __call__(self, s):
+        self.seen_par = False
+        # Fast path for plain text.
+        if self._find_special(s) is None and s[:1] not in '.?!:;,':
+            return s
+        pos = 0
+        tokens = []
+        end = len(s)
+        while pos != end:
+            result = self._next_token(s, pos)
+            if result is None:
+                return None
+            pos, token = result
+            if token is None:
+                return None
+            tokens.append(token)
+        return ''.join(tokens)
+
+
 STYLESHEET_RE = re.compile(r'(?s){\\s([0-9]+).*?((?:\b\w+\b\s*)+);}')
 
 def load_stylesheet(s):
@@ -286,7 +448,67 @@ def load_stylesheet(s):
 HEADER = ("{\\rtf1\\ansi{\\*\\cxrev100}\\cxdict{\\*\\cxsystem Plover}" +
           "{\\stylesheet{\\s0 Normal;}}\r\n")
 
+# Number of entries formatted before each write on save.
+SAVE_CHUNK_SIZE = 1000
+
+# Meta atoms conversions (see `_format_translation`), in order:
+# - meta with a fixed conversion
+_FORMAT_META = {
+    '{.}': r'{\cxp. }',
+    '{!}': r'{\cxp! }',
+    '{?}': r'{\cxp? }',
+    '{,}': r'{\cxp, }',
+    '{:}': r'{\cxp: }',
+    '{;}': r'{\cxp; }',
+    '{^}': r'\cxds ',
+    '{-|}': r'\cxfc ',
+    '{>}': r'\cxfls ',
+    '{ }': ' ',
+}
+# - others: (pattern, template)
+_FORMAT_META_PATTERNS = tuple(
+    (re.compile(pattern).fullmatch, template)
+    for pattern, template in (
+        (r'{\^([^^}]*)}', r'\\cxds \1'),
+        (r'{([^^}]*)\^}', r'\1\\cxds '),
+        (r'{\^([^^}]*)\^}', r'\\cxds \1\\cxds '),
+        (r'{&([^}]+)}', r'{\\cxfing \1}'),
+        (r'{#([^}]+)}', r'\\{#\1\\}'),
+        (r'{PLOVER:([a-zA-Z]+)}', r'\\{PLOVER:\1\\}'),
+    )
+)
+
+def _format_meta(meta):
+    result = _FORMAT_META.get(meta)
+    if result is not None:
+        return result
+    for match, template in _FORMAT_META_PATTERNS:
+        m = match(meta)
+        if m is not None:
+            return m.expand(template)
+    return meta
+
 def format_translation(t):
+    """Convert translation <t> to the RTF/CRE format.
+
+    Same result as `_format_translation`, but in a single pass: with no
+    escapes, each atom can be converted on its own (in which case, at
+    most one of its substitutions applies).
+
+    """
+    if '\\' in t:
+        return _format_translation(t)
+    atoms = []
+    for atom in ATOM_RE.findall(t):
+        atom = atom.strip()
+        if not atom:
+            continue
+        if atom[0] == '{':
+            atom = _format_meta(atom)
+        atoms.append(atom)
+    return ' '.join(atoms)
+
+def _format_translation(t):
     t = ' '.join([x.strip() for x in ATOM_RE.findall(t) if x.strip()])
     
     t = re.sub(r'{\.}', r'{\\cxp. }', t)
@@ -312,27 +534,39 @@ def format_translation(t):
 
 class RtfDictionary(StenoDictionary):
 
+    cacheable = True
+
     def _load(self, filename):
         with open(filename, 'rb') as fp:
             s = fp.read().decode('cp1252')
         def parse():
             styles = load_stylesheet(s)
-            converter = TranslationConverter(styles)
-            for m in DICT_ENTRY_PATTERN.finditer(s):
-                steno = normalize_steno(m.group('steno'))
-                translation = m.group('translation')
+            converter = TranslationParser(styles)
+            for steno, translation in parse_entries(s):
                 converted = converter(translation)
                 if converted is not None:
-                    yield steno, converted
+                    yield normalize_steno(steno), converted
         self.update(parse())
 
     def _save(self, filename):
-        with open(filename, 'wb') as fp:
-            writer = codecs.getwriter('cp1252')(fp)
-            writer.write(HEADER)
-            for s, t in self.items():
-                s = '/'.join(s)
-                t = format_translation(t)
-                entry = "{\\*\\cxs %s}%s\r\n" % (s, t)
-                writer.write(entry)
-            writer.write("}\r\n")
+        export(filename, self.items())
+
+
+def export(filename, entries):
+    """Write <entries> to an RTF/CRE dictionary file.
+
+    Note: <entries> can be any iterable of (steno, translation) pairs,
+    e.g. `StenoDictionaryCollection.entries()` to export a whole
+    collection of dictionaries, without merging them first.
+
+    """
+    with open(filename, 'wb') as fp:
+        fp.write(HEADER.encode('cp1252'))
+        chunk = []
+        for s, t in entries:
+            chunk.append("{\\*\\cxs %s}%s\r\n" % ('/'.join(s), format_translation(t)))
+            if len(chunk) == SAVE_CHUNK_SIZE:
+                fp.write(''.join(chunk).encode('cp1252'))
+                chunk.clear()
+        chunk.append("}\r\n")
+        fp.write(''.join(chunk).encode('cp1252'))
@@ -1,16 +1,20 @@
 
 from collections import namedtuple, OrderedDict
 from functools import wraps
-from queue import Queue
+from queue import Full, Queue
 import os
 import shutil
 import threading
+import time
 
 from plover import log, system
+from plover.dictionary.cache import DictionaryCache
 from plover.dictionary.loading_manager import DictionaryLoadingManager
 from plover.exception import DictionaryLoaderException
 from plover.formatting import Formatter
+from plover.latency import LatencyProbes
 from plover.misc import shorten_path
+from plover.oslayer.config import CACHE_DIR
 from plover.registry import registry
 from plover.resource import ASSET_SCHEME, resource_filename
 from plover.steno import Stroke
@@ -63,6 +67,49 @@ def copy_default_dictionaries(dictionaries_files):
         shutil.copyfile(resource_filename(default_dictionary), dictionary)
 
 
+class HookDispatcher:
+    '''Deliver hooks asynchronously, from a separate thread.
+
+    Pending hooks are held in a bounded queue: when it's full, new
+    hooks are dropped (and logged), so slow callbacks cannot stall
+    the engine.
+    '''
+
+    def __init__(self, run_hook, maxsize):
+        self._run_hook = run_hook
+        self._queue = Queue(maxsize)
+        self._thread = threading.Thread(target=self._run,
+                                        name='hooks', daemon=True)
+        self.dropped = 0
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        '''Stop the thread, after delivering all the pending hooks.'''
+        self._queue.put(None)
+        self._thread.join()
+
+    def put(self, hook, callbacks, args, kwargs):
+        try:
+            self._queue.put_nowait((hook, callbacks, args, kwargs))
+        except Full:
+            if not self.dropped:
+                log.warning('hooks queue is full, dropping %r', hook)
+            self.dropped += 1
+        else:
+            if self.dropped:
+                log.warning('hooks queue was full, dropped %u hooks', self.dropped)
+                self.dropped = 0
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            self._run_hook(*item)
+
+
 def with_lock(func):
     # To keep __doc__/__name__ attributes of the initial function.
     @wraps(func)
@@ -81,6 +128,7 @@ class StenoEngine:
     output_changed
     config_changed
     dictionaries_loaded
+    dictionary_loading_progress
     send_string
     send_backspaces
     send_key_combination
@@ -92,6 +140,15 @@ class StenoEngine:
     quit
     '''.split()
 
+    # Hooks that can be delivered asynchronously (see `HookDispatcher`).
+    ASYNC_HOOKS = ('stroked', 'translated', 'output_changed')
+
+    # Maximum number of pending asynchronous hooks.
+    ASYNC_HOOKS_QUEUE_SIZE = 1000
+
+    # Maximum number of cached suggestions results (see `get_suggestions`).
+    SUGGESTIONS_CACHE_SIZE = 256
+
     def __init__(self, config, controller, keyboard_emulation):
         self._config = config
         self._controller = controller
@@ -113,11 +170,27 @@ class StenoEngine:
         self._translator.add_listener(log.translation)
         self._translator.add_listener(self._formatter.format)
         self._dictionaries = self._translator.get_dictionary()
-        self._dictionaries_manager = DictionaryLoadingManager()
+        self._dictionaries.add_change_listener(self._on_dictionaries_changed)
+        self._suggestions = None
+        self._on_dictionaries_changed()
+        self._dictionaries_manager = DictionaryLoadingManager(
+            progress=self._on_dictionary_loading_progress)
         self._running_state = self._translator.get_state()
         self._keyboard_emulation = keyboard_emulation
         self._hooks = { hook: [] for hook in self.HOOKS }
         self._running_extensions = {}
+        # Latency probes, when enabled (see `_on_stroked_probed`).
+        self._latency = None
+        self._latency_log_interval = 0
+        self._latency_last_log = 0
+        self._latency_format = 0
+        self._latency_output = 0
+        self._latency_hooks = 0
+        # Hooks profiling, when enabled (see `_run_hook`).
+        self._hook_slow_threshold = 0
+        self._hook_stats = {}
+        self._hook_stats_lock = threading.Lock()
+        self._hook_dispatcher = None
 
     def __enter__(self):
         self._lock.__enter__()
@@ -164,6 +237,13 @@ class StenoEngine:
         self._update(full=True)
         self._controller.start(self._on_control_message)
 
+    def _on_dictionary_loading_progress(self, filename, done, total):
+        # Note: called from the dictionary loading threads, not the engine's,
+        # so the hook is run directly (without profiling latencies).
+        hook = 'dictionary_loading_progress'
+        self._run_hook(hook, tuple(self._hooks[hook]),
+                       (filename, done, total), {})
+
     def _set_dictionaries(self, dictionaries):
         def dictionaries_changed(l1, l2):
             if len(l1) != len(l2):
@@ -175,10 +255,23 @@ class StenoEngine:
         if not dictionaries_changed(dictionaries, self._dictionaries.dicts):
             # No change.
             return
-        self._dictionaries = StenoDictionaryCollection(dictionaries)
+        self._dictionaries.remove_change_listener(self._on_dictionaries_changed)
+        self._dictionaries = StenoDictionaryCollection(
+            dictionaries,
+            merged_index=self._dictionaries.merged_index,
+            lookup_cache_size=self._dictionaries.lookup_cache_size,
+        )
+        self._dictionaries.add_change_listener(self._on_dictionaries_changed)
+        self._on_dictionaries_changed()
         self._translator.set_dictionary(self._dictionaries)
         self._trigger_hook('dictionaries_loaded', self._dictionaries)
 
+    def _on_dictionaries_changed(self, key=None):
+        # Any change can affect suggestions, so start over with a
+        # new cache (atomically replaced, see `get_suggestions`).
+        self._suggestions = Suggestions(self._dictionaries.snapshot(),
+                                        self.SUGGESTIONS_CACHE_SIZE)
+
     def _update(self, config_update=None, full=False, reset_machine=False):
         original_config = self._config.as_dict()
         # Update configuration.
@@ -208,6 +301,12 @@ class StenoEngine:
         self._formatter.start_attached = config['start_attached']
         self._formatter.start_capitalized = config['start_capitalized']
         self._translator.set_min_undo_length(config['undo_levels'])
+        # Update latency probes.
+        self._set_latency_probes(config['enable_latency_probes'])
+        self._latency_log_interval = config['latency_log_interval']
+        # Update hooks dispatch.
+        self._set_hook_slow_threshold(config['hook_slow_threshold'])
+        self._set_asynchronous_hooks(config['asynchronous_hooks'])
         # Update system.
         system_name = config['system_name']
         if system.NAME != system_name:
@@ -233,7 +332,7 @@ class StenoEngine:
             self._machine = machine_class(machine_params.options)
             self._machine.set_suppression(self._is_running)
             self._machine.add_state_callback(self._machine_state_callback)
-            self._machine.add_stroke_callback(self._machine_stroke_callback)
+            self._machine.add_stroke_mask_callback(self._machine_stroke_callback)
             self._machine_params = machine_params
             update_keymap = True
             start_machine = True
@@ -259,6 +358,18 @@ class StenoEngine:
             for d in config['dictionaries']
         )
         copy_default_dictionaries(config_dictionaries.keys())
+        if config['cache_dictionaries']:
+            if self._dictionaries_manager.cache is None:
+                self._dictionaries_manager.cache = DictionaryCache(CACHE_DIR)
+        else:
+            self._dictionaries_manager.cache = None
+        self._dictionaries_manager.processes = config['dictionary_loading_processes']
+        self._dictionaries_manager.prebuild_reverse_index = config['prebuild_reverse_index']
+        self._dictionaries_manager.prebuild_search_indexes = config['prebuild_search_indexes']
+        self._dictionaries_manager.build_prefix_index = config['prune_multistroke_lookups']
+        self._dictionaries_manager.compact_storage = config['compact_dictionary_storage']
+        self._dictionaries.lookup_cache_size = config['dictionary_lookup_cache_size']
+        self._dictionaries.merged_index = config['merged_dictionary_index']
         # Start by unloading outdated dictionaries.
         self._dictionaries_manager.unload_outdated()
         self._set_dictionaries([
@@ -278,6 +389,10 @@ class StenoEngine:
             else:
                 d = result
             d.enabled = config_dictionaries[d.path].enabled
+            d.journaled = config['journaled_dictionary_saves']
+            if d.save_scheduler is not None:
+                # Note: the option is in milliseconds.
+                d.save_scheduler.delay = config['dictionary_save_delay'] / 1000
             dictionaries.append(d)
         self._set_dictionaries(dictionaries)
 
@@ -305,7 +420,21 @@ class StenoEngine:
 
     def _quit(self, code):
         self._stop()
+        for d in self._dictionaries.dicts:
+            if d.readonly:
+                continue
+            # Finish pending saves.
+            if d.save_scheduler is not None:
+                d.save_scheduler.flush()
+            # Compact the journal.
+            if d.journaled:
+                try:
+                    d.compact()
+                except Exception:
+                    log.error('saving dictionary %s failed', d.path, exc_info=True)
         self.code = code
+        # Deliver pending hooks first.
+        self._set_asynchronous_hooks(False)
         self._trigger_hook('quit')
         return True
 
@@ -328,7 +457,11 @@ class StenoEngine:
         self._same_thread_hook(self._on_machine_state_changed, machine_state)
 
     def _machine_stroke_callback(self, steno_keys):
-        self._same_thread_hook(self._on_stroked, steno_keys)
+        if self._latency is None:
+            self._same_thread_hook(self._on_stroked, steno_keys)
+        else:
+            self._same_thread_hook(self._on_stroked, steno_keys,
+                                   time.perf_counter_ns())
 
     @with_lock
     def _on_machine_state_changed(self, machine_state):
@@ -373,11 +506,56 @@ class StenoEngine:
         self._consume_engine_command(command, force=force)
         return False
 
-    def _on_stroked(self, steno_keys):
+    def _on_stroked(self, steno_keys, timestamp=None):
+        if self._latency is not None:
+            self._on_stroked_probed(steno_keys, timestamp)
+            return
+        stroke = Stroke(steno_keys)
+        log.stroke(stroke)
+        self._translator.translate(stroke)
+        self._trigger_hook('stroked', stroke)
+
+    def _on_stroked_probed(self, steno_keys, timestamp=None):
+        latency = self._latency
+        clock = time.perf_counter_ns
+        start = clock()
+        if timestamp is not None:
+            latency.add('queue', start - timestamp)
+        self._latency_format = self._latency_output = self._latency_hooks = 0
         stroke = Stroke(steno_keys)
         log.stroke(stroke)
         self._translator.translate(stroke)
+        translated = clock()
+        format_hooks = self._latency_hooks
         self._trigger_hook('stroked', stroke)
+        end = clock()
+        latency.add('translate', translated - start - self._latency_format)
+        latency.add('format', self._latency_format - self._latency_output - format_hooks)
+        latency.add('output', self._latency_output)
+        latency.add('hooks', self._latency_hooks)
+        latency.add('total', end - start)
+        if self._latency_log_interval and \
+           end - self._latency_last_log >= self._latency_log_interval * 1e9:
+            self._latency_last_log = end
+            log.info('%s', latency.summary())
+
+    def _format_probed(self, undo, do, prev):
+        start = time.perf_counter_ns()
+        self._formatter.format(undo, do, prev)
+        self._latency_format += time.perf_counter_ns() - start
+
+    def _set_latency_probes(self, enabled):
+        if enabled == (self._latency is not None):
+            return
+        if enabled:
+            self._latency = LatencyProbes()
+            self._latency_last_log = time.perf_counter_ns()
+            self._translator.remove_listener(self._formatter.format)
+            self._translator.add_listener(self._format_probed)
+        else:
+            self._latency = None
+            self._translator.remove_listener(self._format_probed)
+            self._translator.add_listener(self._formatter.format)
 
     def _on_translated(self, old, new):
         if not self._is_running:
@@ -387,19 +565,34 @@ class StenoEngine:
     def _send_backspaces(self, b):
         if not self._is_running:
             return
-        self._keyboard_emulation.send_backspaces(b)
+        if self._latency is None:
+            self._keyboard_emulation.send_backspaces(b)
+        else:
+            start = time.perf_counter_ns()
+            self._keyboard_emulation.send_backspaces(b)
+            self._latency_output += time.perf_counter_ns() - start
         self._trigger_hook('send_backspaces', b)
 
     def _send_string(self, s):
         if not self._is_running:
             return
-        self._keyboard_emulation.send_string(s)
+        if self._latency is None:
+            self._keyboard_emulation.send_string(s)
+        else:
+            start = time.perf_counter_ns()
+            self._keyboard_emulation.send_string(s)
+            self._latency_output += time.perf_counter_ns() - start
         self._trigger_hook('send_string', s)
 
     def _send_key_combination(self, c):
         if not self._is_running:
             return
-        self._keyboard_emulation.send_key_combination(c)
+        if self._latency is None:
+            self._keyboard_emulation.send_key_combination(c)
+        else:
+            start = time.perf_counter_ns()
+            self._keyboard_emulation.send_key_combination(c)
+            self._latency_output += time.perf_counter_ns() - start
         self._trigger_hook('send_key_combination', c)
 
     def _send_engine_command(self, command):
@@ -471,32 +664,54 @@ class StenoEngine:
     def join(self):
         return self.code
 
-    @with_lock
+    # Note: the lookup methods do not lock the engine, so they never
+    # wait on (nor delay) strokes translation: they query a snapshot
+    # of the dictionaries (see `dictionaries_snapshot`).
+
+    @property
+    def dictionaries_snapshot(self):
+        '''Immutable view of the current dictionaries state.
+
+        Safe to use from any thread, without locking the engine
+        (see `StenoDictionaryCollectionSnapshot`).
+        '''
+        return self._dictionaries.snapshot()
+
     def lookup(self, translation):
-        return self._dictionaries.lookup(translation)
+        return self.dictionaries_snapshot.lookup(translation)
 
-    @with_lock
     def raw_lookup(self, translation):
-        return self._dictionaries.raw_lookup(translation)
+        return self.dictionaries_snapshot.raw_lookup(translation)
 
-    @with_lock
     def lookup_from_all(self, translation):
-        return self._dictionaries.lookup_from_all(translation)
+        return self.dictionaries_snapshot.lookup_from_all(translation)
 
-    @with_lock
     def raw_lookup_from_all(self, translation):
-        return self._dictionaries.raw_lookup_from_all(translation)
+        return self.dictionaries_snapshot.raw_lookup_from_all(translation)
 
-    @with_lock
     def reverse_lookup(self, translation):
-        matches = self._dictionaries.reverse_lookup(translation)
+        matches = self.dictionaries_snapshot.reverse_lookup(translation)
         return [] if matches is None else matches
 
-    @with_lock
     def casereverse_lookup(self, translation):
-        matches = self._dictionaries.casereverse_lookup(translation)
+        matches = self.dictionaries_snapshot.casereverse_lookup(translation)
         return set() if matches is None else matches
 
+    def search_translations(self, pattern, substring=False,
+                            ignore_case=False, count=None):
+        return self.dictionaries_snapshot.search_translations(
+            pattern, substring, ignore_case, count)
+
+    def build_search_indexes(self, strokes=True, translations=True):
+        '''Build the search indexes of the dictionaries in the background.
+
+        So the first search (see `search_translations`) does not have to.
+        Only the indexes on <strokes> and/or <translations> are built.
+        '''
+        for d in self.dictionaries_snapshot.dicts:
+            d.build_search_indexes(background=True, strokes=strokes,
+                                   translations=translations)
+
     @with_lock
     def add_dictionary_filter(self, dictionary_filter):
         self._dictionaries.add_filter(dictionary_filter)
@@ -505,9 +720,11 @@ class StenoEngine:
     def remove_dictionary_filter(self, dictionary_filter):
         self._dictionaries.remove_filter(dictionary_filter)
 
-    @with_lock
     def get_suggestions(self, translation):
-        return Suggestions(self._dictionaries).find(translation)
+        return self._suggestions.find(translation)
+
+    def get_suggestions_many(self, translations):
+        return self._suggestions.find_many(translations)
 
     @property
     @with_lock
@@ -550,16 +767,113 @@ class StenoEngine:
     def dictionaries(self):
         return self._dictionaries
 
+    @property
+    @with_lock
+    def latency_stats(self):
+        '''Per stage statistics of the strokes processing latency.
+
+        None if latency probes are disabled, otherwise a dictionary
+        mapping each stage to its statistics (see `plover.latency`).
+        '''
+        if self._latency is None:
+            return None
+        return self._latency.stats()
+
+    @with_lock
+    def reset_latency_stats(self):
+        if self._latency is not None:
+            self._latency.reset()
+
     # Hooks.
 
     def _trigger_hook(self, hook, *args, **kwargs):
-        for callback in self._hooks[hook]:
+        callbacks = self._hooks[hook]
+        if self._hook_dispatcher is not None and hook in self.ASYNC_HOOKS:
+            if callbacks:
+                # Note: pass a copy, as the callbacks list can
+                # be changed by the time the hook is delivered.
+                self._hook_dispatcher.put(hook, tuple(callbacks), args, kwargs)
+        elif self._latency is not None:
+            start = time.perf_counter_ns()
+            self._run_hook(hook, callbacks, args, kwargs)
+            self._latency_hooks += time.perf_counter_ns() - start
+        else:
+            self._run_hook(hook, callbacks, args, kwargs)
+
+    def _run_hook(self, hook, callbacks, args, kwargs):
+        threshold = self._hook_slow_threshold
+        for callback in callbacks:
+            if threshold:
+                start = time.perf_counter()
             try:
                 callback(*args, **kwargs)
             except Exception:
                 log.error('hook %r callback %r failed',
                           hook, callback,
                           exc_info=True)
+            if threshold:
+                self._profile_hook(hook, callback,
+                                   time.perf_counter() - start)
+
+    def _profile_hook(self, hook, callback, duration):
+        # Note: can be called from the hooks dispatcher thread.
+        with self._hook_stats_lock:
+            stats = self._hook_stats.setdefault(hook, {}).get(callback)
+            if stats is None:
+                stats = self._hook_stats[hook][callback] = {
+                    'count': 0, 'total': 0.0, 'max': 0.0, 'slow': 0,
+                }
+            stats['count'] += 1
+            stats['total'] += duration
+            stats['max'] = max(stats['max'], duration)
+            if duration * 1000 >= self._hook_slow_threshold:
+                stats['slow'] += 1
+                log.warning('hook %r callback %r is slow: %.1fms',
+                            hook, callback, duration * 1000)
+
+    def _set_hook_slow_threshold(self, threshold):
+        if threshold == self._hook_slow_threshold:
+            return
+        log.info('%s hooks profiling', 'enabling' if threshold else 'disabling')
+        self._hook_slow_threshold = threshold
+        if not threshold:
+            self.reset_hook_stats()
+
+    def _set_asynchronous_hooks(self, enabled):
+        if enabled == (self._hook_dispatcher is not None):
+            return
+        if enabled:
+            log.info('enabling asynchronous hooks')
+            self._hook_dispatcher = HookDispatcher(self._run_hook,
+                                                   self.ASYNC_HOOKS_QUEUE_SIZE)
+            self._hook_dispatcher.start()
+        else:
+            log.info('disabling asynchronous hooks')
+            dispatcher, self._hook_dispatcher = self._hook_dispatcher, None
+            dispatcher.stop()
+
+    @property
+    def hook_stats(self):
+        '''Per callback statistics of the hooks dispatch.
+
+        A dictionary mapping each hook to a dictionary of its
+        callbacks statistics: number of calls, total and max
+        duration (in seconds), and number of slow calls.
+        Only updated when hooks profiling is enabled (the
+        `hook_slow_threshold` option is not 0).
+        '''
+        with self._hook_stats_lock:
+            return {
+                hook: {
+                    callback: dict(stats)
+                    for callback, stats in hook_stats.items()
+                }
+                for hook, hook_stats in self._hook_stats.items()
+            }
+
+    def reset_hook_stats(self):
+        with self._hook_stats_lock:
+            self._hook_stats.clear()
 
     @with_lock
     def hook_connect(self, hook, callback):
@@ -127,6 +127,8 @@ class DictionariesWidget(QWidget, Ui_DictionariesWidget):
         self.table.dropEvent = self._drop_event
         engine.signal_connect('config_changed', self.on_config_changed)
         engine.signal_connect('dictionaries_loaded', self.on_dictionaries_loaded)
+        engine.signal_connect('dictionary_loading_progress',
+                              self.on_dictionary_loading_progress)
 
     def setFocus(self):
         self.table.setFocus()
@@ -135,6 +137,24 @@ class DictionariesWidget(QWidget, Ui_DictionariesWidget):
         self._update_dictionaries(loaded_dictionaries=loaded_dictionaries,
                                   record=False, save=False)
 
+    def on_dictionary_loading_progress(self, filename, done, total):
+        if filename in self._loaded_dictionaries:
+            return
+        for n, dictionary in enumerate(self._config_dictionaries):
+            if dictionary.path == filename:
+                break
+        else:
+            return
+        if self._reverse_order:
+            n = len(self._config_dictionaries) - n - 1
+        item = self.table.verticalHeaderItem(n)
+        if item is None:
+            return
+        # i18n: Widget: “DictionariesWidget”, tooltip.
+        item.setToolTip(_('This dictionary is being loaded ({progress}%).').format(
+            progress=done * 100 // total if total else 100,
+        ))
+
     def on_config_changed(self, config_update):
         update_kwargs = {}
         if 'dictionaries' in config_update:
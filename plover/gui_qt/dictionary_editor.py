@@ -1,12 +1,14 @@
 
-from operator import attrgetter, itemgetter
 from collections import namedtuple
-from itertools import chain
+import heapq
+from itertools import chain, islice
+import threading
 
 from PyQt5.QtCore import (
     QAbstractTableModel,
     QModelIndex,
     Qt,
+    pyqtSignal,
 )
 from PyQt5.QtWidgets import (
     QComboBox,
@@ -54,28 +56,189 @@ class DictionaryItemDelegate(QStyledItemDelegate):
 
 class DictionaryItemModel(QAbstractTableModel):
 
+    # Number of rows loaded at once: rows are only created
+    # on demand, when scrolling (see `fetchMore`).
+    FETCH_SIZE = 1000
+
+    # Emitted by the indexes loading thread when done.
+    _indexes_ready = pyqtSignal()
+
     def __init__(self, dictionary_list, sort_column, sort_order):
         super().__init__()
         self._dictionary_list = dictionary_list
         self._operations = []
         self._entries = []
+        self._items = None
+        # Entries changed since the last update: not to be fetched again.
+        self._edited = set()
+        self._strokes_filter = None
+        self._translation_filter = None
         self._sort_column = sort_column
         self._sort_order = sort_order
+        # The dictionaries search indexes (used for sorting and filtering)
+        # may take a while to build: this is done in the background, rows
+        # are only available once it's done (see `_on_indexes_ready`).
+        self._loading_thread = None
+        # `(dictionary, strokes)` indexes built by the model,
+        # released when done with it (see `release_indexes`).
+        self._built_indexes = []
+        self._released = False
+        self._indexes_ready.connect(self._on_indexes_ready)
         self._update_entries()
 
+    def _build_indexes(self, dictionary_list, strokes):
+        for dictionary in dictionary_list:
+            dictionary.build_search_indexes(strokes=strokes,
+                                            translations=not strokes)
+        if self._released:
+            self.release_indexes()
+            return
+        try:
+            self._indexes_ready.emit()
+        except RuntimeError:
+            # The model is already gone.
+            pass
+
+    def release_indexes(self):
+        '''Release the search indexes built for the model, to save memory.'''
+        self._released = True
+        for dictionary, strokes in self._built_indexes:
+            dictionary.release_search_indexes(strokes=strokes,
+                                              translations=not strokes)
+
+    def _on_indexes_ready(self):
+        self._loading_thread = None
+        self.modelAboutToBeReset.emit()
+        # Keep new rows that are not part of a dictionary yet.
+        new_items = [item for item in self._entries if not item.strokes]
+        self._update_entries(self._strokes_filter, self._translation_filter)
+        self._entries[:0] = new_items
+        self.modelReset.emit()
+
+    @property
+    def loading(self):
+        return self._loading_thread is not None
+
+    def _filters(self):
+        by_strokes = self._sort_column != _COL_TRANS
+        if by_strokes:
+            sort_filter, other_filter = self._strokes_filter, self._translation_filter
+        else:
+            sort_filter, other_filter = self._translation_filter, self._strokes_filter
+        return by_strokes, sort_filter, other_filter
+
+    def _needed_index(self):
+        # The search index used by `_dictionary_items`:
+        # True for strokes, False for translations.
+        by_strokes, sort_filter, other_filter = self._filters()
+        if other_filter is not None and sort_filter is None:
+            return not by_strokes
+        return by_strokes
+
+    def _dictionary_items(self, dictionary):
+        # Iterate over the `(sort_key, strokes)` entries of <dictionary>,
+        # sorted and filtered using the dictionary search indexes.
+        by_strokes, sort_filter, other_filter = self._filters()
+        descending = self._sort_order == Qt.DescendingOrder
+        if other_filter is not None and sort_filter is None:
+            # Only the (hopefully few) matching entries need sorting.
+            if by_strokes:
+                sort_key = lambda strokes, translation: '/'.join(strokes).lower()
+            else:
+                sort_key = lambda strokes, translation: translation.lower()
+            return iter(sorted(
+                ((sort_key(strokes, translation), strokes)
+                 for strokes, translation in dictionary.search(
+                     other_filter, strokes=not by_strokes)),
+                reverse=descending,
+            ))
+        return dictionary.sorted_keys(strokes=by_strokes,
+                                      pattern=sort_filter or '',
+                                      reverse=descending)
+
+    def _dictionary_entries(self, dictionary):
+        for sort_key, strokes in self._dictionary_items(dictionary):
+            yield sort_key, strokes, dictionary
+
+    def _iter_items(self):
+        descending = self._sort_order == Qt.DescendingOrder
+        if self._sort_column == _COL_DICT:
+            dictionary_list = sorted(self._dictionary_list,
+                                     key=lambda dictionary: dictionary.path,
+                                     reverse=descending)
+            sources = chain.from_iterable(map(self._dictionary_entries,
+                                              dictionary_list))
+        else:
+            sources = heapq.merge(*map(self._dictionary_entries,
+                                       self._dictionary_list),
+                                  key=lambda entry: entry[0],
+                                  reverse=descending)
+        strokes_filter = self._strokes_filter
+        translation_filter = self._translation_filter
+        edited = self._edited
+        for sort_key, strokes, dictionary in sources:
+            if (dictionary.path, strokes) in edited:
+                # Already listed.
+                continue
+            translation = dictionary.get(strokes)
+            if translation is None:
+                # Deleted since.
+                continue
+            if strokes_filter is not None and \
+               not '/'.join(strokes).startswith(strokes_filter):
+                continue
+            if translation_filter is not None and \
+               not translation.startswith(translation_filter):
+                continue
+            yield DictionaryItem(strokes, translation, dictionary)
+
+    def _fetch(self):
+        items = list(islice(self._items, self.FETCH_SIZE))
+        if len(items) < self.FETCH_SIZE:
+            self._items = None
+        return items
+
     def _update_entries(self, strokes_filter=None, translation_filter=None):
-        self._entries = []
-        for dictionary in self._dictionary_list:
-            for strokes, translation in dictionary.items():
-                if strokes_filter is not None and \
-                   not '/'.join(strokes).startswith(strokes_filter):
-                    continue
-                if translation_filter is not None and \
-                   not translation.startswith(translation_filter):
-                    continue
-                item = DictionaryItem(strokes, translation, dictionary)
-                self._entries.append(item)
-        self.sort(self._sort_column, self._sort_order)
+        self._strokes_filter = strokes_filter or None
+        self._translation_filter = translation_filter or None
+        self._edited = set()
+        if not self.loading:
+            strokes = self._needed_index()
+            missing = [dictionary for dictionary in self._dictionary_list
+                       if not dictionary.has_search_index(strokes)]
+            if missing:
+                self._built_indexes.extend((dictionary, strokes)
+                                           for dictionary in missing)
+                self._loading_thread = threading.Thread(
+                    target=self._build_indexes, args=(missing, strokes),
+                    daemon=True)
+                self._loading_thread.start()
+        if self.loading:
+            # Wait for the indexes.
+            self._items = None
+            self._entries = []
+            return
+        self._items = self._iter_items()
+        self._entries = self._fetch()
+
+    def _set_item(self, item):
+        item.dictionary[item.strokes] = item.translation
+        if self._items is not None:
+            self._edited.add((item.dictionary.path, item.strokes))
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self._items is not None
+
+    def fetchMore(self, parent):
+        if parent.isValid() or self._items is None:
+            return
+        items = self._fetch()
+        if not items:
+            return
+        row = len(self._entries)
+        self.beginInsertRows(QModelIndex(), row, row + len(items) - 1)
+        self._entries.extend(items)
+        self.endInsertRows()
 
     @property
     def has_undo(self):
@@ -137,7 +300,7 @@ class DictionaryItemModel(QAbstractTableModel):
             # the result of the undo.
             self.new_row(0, item=old_item, record=False)
         else:
-            old_item.dictionary[old_item.strokes] = old_item.translation
+            self._set_item(old_item)
             self._entries[row] = old_item
             self.dataChanged.emit(self.index(row, _COL_STENO),
                                   self.index(row, _COL_TRANS))
@@ -196,16 +359,16 @@ class DictionaryItemModel(QAbstractTableModel):
         self.modelReset.emit()
 
     def sort(self, column, order):
-        self.layoutAboutToBeChanged.emit()
-        if column == _COL_DICT:
-            key = attrgetter('dictionary_path')
-        else:
-            key = itemgetter(column)
-        self._entries.sort(key=key,
-                           reverse=(order == Qt.DescendingOrder))
+        if (column, order) == (self._sort_column, self._sort_order):
+            return
+        self.modelAboutToBeReset.emit()
+        # Keep new rows that are not part of a dictionary yet.
+        new_items = [item for item in self._entries if not item.strokes]
         self._sort_column = column
         self._sort_order = order
-        self.layoutChanged.emit()
+        self._update_entries(self._strokes_filter, self._translation_filter)
+        self._entries[:0] = new_items
+        self.modelReset.emit()
 
     def setData(self, index, value, role=Qt.EditRole, record=True):
         assert role == Qt.EditRole
@@ -239,7 +402,7 @@ class DictionaryItemModel(QAbstractTableModel):
                 old_item = None
         new_item = DictionaryItem(strokes, translation, dictionary)
         self._entries[row] = new_item
-        dictionary[strokes] = translation
+        self._set_item(new_item)
         if record:
             self._operations.append((old_item, new_item))
         self.dataChanged.emit(index, index)
@@ -321,6 +484,7 @@ class DictionaryEditor(QDialog, Ui_DictionaryEditor, WindowState):
         ))
         self.restore_state()
         self.finished.connect(self.save_state)
+        self.finished.connect(self._model.release_indexes)
 
     @property
     def _selection(self):
@@ -17,6 +17,7 @@ class Engine(StenoEngine, QThread):
     signal_output_changed = pyqtSignal(bool)
     signal_config_changed = pyqtSignal(QVariant)
     signal_dictionaries_loaded = pyqtSignal(QVariant)
+    signal_dictionary_loading_progress = pyqtSignal(str, QVariant, QVariant)
     signal_send_string = pyqtSignal(str)
     signal_send_backspaces = pyqtSignal(int)
     signal_send_key_combination = pyqtSignal(str)
@@ -2,6 +2,8 @@
 from PyQt5.QtCore import QEvent, Qt
 
 from plover import _
+from plover.steno import sort_steno_strokes
+from plover.suggestions import Suggestion
 from plover.translation import unescape_translation
 
 from plover.gui_qt.lookup_dialog_ui import Ui_LookupDialog
@@ -18,6 +20,10 @@ class LookupDialog(Tool, Ui_LookupDialog):
     ROLE = 'lookup'
     SHORTCUT = 'Ctrl+L'
 
+    # Maximum number of other translations starting with
+    # the pattern listed after the exact suggestions.
+    MAX_PREFIX_MATCHES = 20
+
     def __init__(self, engine):
         super().__init__(engine)
         self.setupUi(self)
@@ -26,6 +32,9 @@ class LookupDialog(Tool, Ui_LookupDialog):
         self.pattern.setFocus()
         self.restore_state()
         self.finished.connect(self.save_state)
+        # Don't wait for the first lookup to build the search indexes.
+        # Note: only translations are searched.
+        engine.build_search_indexes(strokes=False)
 
     def eventFilter(self, watched, event):
         if event.type() == QEvent.KeyPress and \
@@ -40,6 +49,16 @@ class LookupDialog(Tool, Ui_LookupDialog):
     def on_lookup(self, pattern):
         translation = unescape_translation(pattern.strip())
         suggestion_list = self._engine.get_suggestions(translation)
+        if translation:
+            listed = {suggestion.text for suggestion in suggestion_list}
+            for match in self._engine.search_translations(
+                translation, ignore_case=True, count=self.MAX_PREFIX_MATCHES,
+            ):
+                if match in listed:
+                    continue
+                strokes_list = self._engine.reverse_lookup(match)
+                if strokes_list:
+                    suggestion_list.append(Suggestion(match, sort_steno_strokes(strokes_list)))
         self._update_suggestions(suggestion_list)
 
     def changeEvent(self, event):
@@ -1,7 +1,9 @@
 
+from queue import Empty, Queue
 import re
+import threading
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import QVariant, Qt, pyqtSignal
 from PyQt5.QtGui import (
     QCursor,
     QFont,
@@ -35,6 +37,9 @@ class SuggestionsDialog(Tool, Ui_SuggestionsDialog):
 
     STYLE_TRANSLATION, STYLE_STROKES = range(2)
 
+    # Emitted by the worker thread (see `_find_suggestions`).
+    suggestions_found = pyqtSignal(QVariant)
+
     # Anatomy of the text document:
     # - "root" frame:
     #  - 0+ "suggestions" frames
@@ -59,10 +64,18 @@ class SuggestionsDialog(Tool, Ui_SuggestionsDialog):
         # i18n: Widget: “SuggestionsDialog”, “font” menu.
         self._font_menu_strokes = QAction(_('&Strokes'), self._font_menu)
         self._font_menu.addActions([self._font_menu_text, self._font_menu_strokes])
+        # Suggestions are looked up in a separate thread,
+        # so slow lookups do not block the GUI.
+        self._requests = Queue()
+        self._worker = threading.Thread(target=self._find_suggestions,
+                                        name='suggestions', daemon=True)
+        self.suggestions_found.connect(self._on_suggestions_found)
+        self._worker.start()
         engine.signal_connect('translated', self.on_translation)
         self.suggestions.setFocus()
         self.restore_state()
         self.finished.connect(self.save_state)
+        self.finished.connect(self._stop_worker)
 
     def _get_font(self, name):
         return getattr(self.suggestions, name)
@@ -130,14 +143,30 @@ class SuggestionsDialog(Tool, Ui_SuggestionsDialog):
             retro_formatter = RetroFormatter(last_translations)
             split_words = retro_formatter.last_words(10, rx=self.WORD_RX)
 
-        suggestion_list = []
-        for phrase in self.tails(split_words):
-            phrase = ''.join(phrase)
-            suggestion_list.extend(self._engine.get_suggestions(phrase))
+        self._requests.put(split_words)
+
+    def _find_suggestions(self):
+        while True:
+            split_words = self._requests.get()
+            # Only the latest request matters.
+            while True:
+                try:
+                    split_words = self._requests.get_nowait()
+                except Empty:
+                    break
+            if split_words is None:
+                break
+            phrases = [''.join(phrase) for phrase in self.tails(split_words)]
+            suggestion_list = self._engine.get_suggestions_many(phrases)
+            if not suggestion_list and split_words:
+                suggestion_list = [Suggestion(split_words[-1], [])]
+            self.suggestions_found.emit(suggestion_list)
 
-        if not suggestion_list and split_words:
-            suggestion_list = [Suggestion(split_words[-1], [])]
+    def _stop_worker(self):
+        self._requests.put(None)
+        self._worker.join()
 
+    def _on_suggestions_found(self, suggestion_list):
         if suggestion_list and suggestion_list != self._last_suggestions:
             self._last_suggestions = suggestion_list
             self._show_suggestions(suggestion_list)
@@ -0,0 +1,102 @@
+"""Stroke latency measurements.
+
+Latencies (in nanoseconds) are aggregated into histograms with
+logarithmic buckets: 4 buckets per power of 2, so percentiles are
+accurate to within 25%, using constant memory and time per sample.
+
+"""
+
+# Stages of the processing of a stroke by the engine:
+# - queue: waiting for the engine thread (from the machine notification)
+# - translate: translation (`Translator`), excluding formatting
+# - format: formatting (`Formatter`), excluding output and hooks
+# - output: keyboard emulation
+# - hooks: hooks callbacks
+# - total: whole processing, excluding the queue wait
+STAGES = ('queue', 'translate', 'format', 'output', 'hooks', 'total')
+
+PERCENTILES = (0.50, 0.95, 0.99)
+
+_BUCKETS = 256
+
+
+def _bucket_index(ns):
+    if ns < 4:
+        return max(ns, 0)
+    bits = ns.bit_length()
+    return ((bits - 2) << 2) | ((ns >> (bits - 3)) & 3)
+
+def _bucket_upper_bound(index):
+    if index < 4:
+        return index + 1
+    bits = (index >> 2) + 2
+    return ((index & 3) + 5) << (bits - 3)
+
+
+class Histogram:
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * _BUCKETS
+        self.count = 0
+
+    def add(self, ns):
+        self.counts[_bucket_index(ns)] += 1
+        self.count += 1
+
+    def percentile(self, p):
+        '''Return the <p> percentile (0 to 1), in seconds.
+
+        Note: the value returned is the upper bound of the
+        corresponding bucket, or None if there are no samples.
+        '''
+        if not self.count:
+            return None
+        threshold = max(1, p * self.count)
+        total = 0
+        for index, count in enumerate(self.counts):
+            total += count
+            if total >= threshold:
+                break
+        return _bucket_upper_bound(index) / 1e9
+
+
+class LatencyProbes:
+
+    def __init__(self):
+        self.histograms = {stage: Histogram() for stage in STAGES}
+
+    def add(self, stage, ns):
+        self.histograms[stage].add(ns)
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+
+    def stats(self):
+        '''Return the statistics for each stage.
+
+        A dictionary mapping each stage to its samples count,
+        and the `p50`, `p95` and `p99` percentiles (in seconds).
+        '''
+        stats = {}
+        for stage, histogram in self.histograms.items():
+            stage_stats = {'count': histogram.count}
+            for p in PERCENTILES:
+                stage_stats['p%u' % round(p * 100)] = histogram.percentile(p)
+            stats[stage] = stage_stats
+        return stats
+
+    def summary(self):
+        '''Return a one line summary of the statistics (in milliseconds).'''
+        parts = []
+        for stage, stage_stats in self.stats().items():
+            if not stage_stats['count']:
+                continue
+            parts.append('%s %s' % (stage, '/'.join(
+                '%.2f' % (stage_stats['p%u' % round(p * 100)] * 1e3)
+                for p in PERCENTILES
+            )))
+        return 'stroke latency (ms, p50/p95/p99): %s' % (', '.join(parts) or 'no data')
@@ -14,6 +14,7 @@ import serial
 from plover import _, log
 from plover.machine.keymap import Keymap
 from plover.misc import boolean
+from plover.steno import keys_to_mask, mask_to_keys
 
 
 # i18n: Machine state.
@@ -43,6 +44,7 @@ class StenotypeBase:
         self.keymap = Keymap(keys, keys)
         self.keymap.set_mappings(zip(keys, keys))
         self.stroke_subscribers = []
+        self.stroke_mask_subscribers = []
         self.state_subscribers = []
         self.state = STATE_STOPPED
 
@@ -64,7 +66,8 @@ class StenotypeBase:
         Argument:
 
         callback -- The function to call whenever there is output from
-        the stenotype machine and output is being captured.
+        the stenotype machine and output is being captured. It is called
+        with the list of pressed steno keys.
 
         """
         self.stroke_subscribers.append(callback)
@@ -79,6 +82,20 @@ class StenotypeBase:
         """
         self.stroke_subscribers.remove(callback)
 
+    def add_stroke_mask_callback(self, callback):
+        """Subscribe to output from the stenotype machine, as bit masks.
+
+        Same as `add_stroke_callback`, but <callback> is called with the
+        bit mask of the pressed steno keys (see `plover.steno.keys_to_mask`),
+        which is cheaper for drivers decoding strokes directly to masks.
+
+        """
+        self.stroke_mask_subscribers.append(callback)
+
+    def remove_stroke_mask_callback(self, callback):
+        """Unsubscribe a callback added with `add_stroke_mask_callback`."""
+        self.stroke_mask_subscribers.remove(callback)
+
     def add_state_callback(self, callback):
         self.state_subscribers.append(callback)
         
@@ -86,9 +103,35 @@ class StenotypeBase:
         self.state_subscribers.remove(callback)
 
     def _notify(self, steno_keys):
-        """Invoke the callback of each subscriber with the given argument."""
-        for callback in self.stroke_subscribers:
-            callback(steno_keys)
+        """Invoke the callback of each subscriber with the given argument.
+
+        <steno_keys> is either a sequence of steno keys, or their bit mask
+        (see `plover.steno.keys_to_mask`), and is converted as needed
+        for each kind of subscriber.
+
+        """
+        if self.stroke_mask_subscribers:
+            if isinstance(steno_keys, int):
+                mask = steno_keys
+            else:
+                mask = keys_to_mask(steno_keys)
+            for callback in self.stroke_mask_subscribers:
+                callback(mask)
+        if self.stroke_subscribers:
+            if isinstance(steno_keys, int):
+                steno_keys = mask_to_keys(steno_keys)
+            for callback in self.stroke_subscribers:
+                callback(steno_keys)
+
+    def _keys_masks(self, keys):
+        """Return the bit masks of the steno keys bound to each of the
+        machine keys <keys> (see `plover.steno.keys_to_mask`).
+
+        Note: the result is only valid for the current keymap and system.
+
+        """
+        return [keys_to_mask(self.keymap.keys_to_actions((key,)))
+                for key in keys]
 
     def set_suppression(self, enabled):
         '''Enable keyboard suppression.
@@ -5,7 +5,7 @@
 
 import binascii
 
-from plover import log
+from plover import log, system
 from plover.machine.base import SerialStenotypeBase
 
 
@@ -40,6 +40,33 @@ class GeminiPr(SerialStenotypeBase):
         res2
     '''
 
+    def __init__(self, params):
+        super().__init__(params)
+        self._byte_masks = None
+        self._byte_masks_keymap = None
+        self._byte_masks_system = None
+
+    def _get_byte_masks(self):
+        """Return the steno keys mask for each possible
+        (7 bits) value of each byte in a packet."""
+        if self.keymap is not self._byte_masks_keymap or \
+           system.KEY_ORDER is not self._byte_masks_system:
+            keys_masks = self._keys_masks(STENO_KEY_CHART)
+            byte_masks = []
+            for i in range(BYTES_PER_STROKE):
+                masks = []
+                for b in range(0x80):
+                    mask = 0
+                    for j in range(1, 8):
+                        if (b & (0x80 >> j)):
+                            mask |= keys_masks[i * 7 + j - 1]
+                    masks.append(mask)
+                byte_masks.append(masks)
+            self._byte_masks = byte_masks
+            self._byte_masks_keymap = self.keymap
+            self._byte_masks_system = system.KEY_ORDER
+        return self._byte_masks
+
     def run(self):
         """Overrides base class run method. Do not call directly."""
         self._ready()
@@ -48,11 +75,8 @@ class GeminiPr(SerialStenotypeBase):
                 log.error('discarding invalid packet: %s',
                           binascii.hexlify(packet))
                 continue
-            steno_keys = []
-            for i, b in enumerate(packet):
-                for j in range(1, 8):
-                    if (b & (0x80 >> j)):
-                        steno_keys.append(STENO_KEY_CHART[i * 7 + j - 1])
-            steno_keys = self.keymap.keys_to_actions(steno_keys)
-            if steno_keys:
-                self._notify(steno_keys)
+            mask = 0
+            for masks, b in zip(self._get_byte_masks(), packet):
+                mask |= masks[b & 0x7f]
+            if mask:
+                self._notify(mask)
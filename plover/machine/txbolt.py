@@ -3,6 +3,7 @@
 
 "Thread-based monitoring of a stenotype machine using the TX Bolt protocol."
 
+from plover import system
 import plover.machine.base
 
 # In the TX Bolt protocol, there are four sets of keys grouped in
@@ -48,16 +49,36 @@ class TxBolt(plover.machine.base.SerialStenotypeBase):
 
     def __init__(self, params):
         super().__init__(params)
+        self._byte_masks = None
+        self._byte_masks_keymap = None
+        self._byte_masks_system = None
         self._reset_stroke_state()
 
     def _reset_stroke_state(self):
-        self._pressed_keys = []
+        self._stroke_mask = 0
         self._last_key_set = 0
 
+    def _get_byte_masks(self):
+        """Return the steno keys mask for each possible byte value."""
+        if self.keymap is not self._byte_masks_keymap or \
+           system.KEY_ORDER is not self._byte_masks_system:
+            keys_masks = self._keys_masks(STENO_KEY_CHART)
+            byte_masks = []
+            for byte in range(256):
+                key_set = byte >> 6
+                mask = 0
+                for i in range(5 if key_set == 3 else 6):
+                    if (byte >> i) & 1:
+                        mask |= keys_masks[(key_set * 6) + i]
+                byte_masks.append(mask)
+            self._byte_masks = byte_masks
+            self._byte_masks_keymap = self.keymap
+            self._byte_masks_system = system.KEY_ORDER
+        return self._byte_masks
+
     def _finish_stroke(self):
-        steno_keys = self.keymap.keys_to_actions(self._pressed_keys)
-        if steno_keys:
-            self._notify(steno_keys)
+        if self._stroke_mask:
+            self._notify(self._stroke_mask)
         self._reset_stroke_state()
 
     def run(self):
@@ -75,16 +96,14 @@ class TxBolt(plover.machine.base.SerialStenotypeBase):
                 self._finish_stroke()
                 continue
 
+            byte_masks = self._get_byte_masks()
             for byte in raw:
                 key_set = byte >> 6
                 if key_set <= self._last_key_set:
                     # Starting a new stroke, finish previous one.
                     self._finish_stroke()
                 self._last_key_set = key_set
-                for i in range(5 if key_set == 3 else 6):
-                    if (byte >> i) & 1:
-                        key = STENO_KEY_CHART[(key_set * 6) + i]
-                        self._pressed_keys.append(key)
+                self._stroke_mask |= byte_masks[byte]
                 if key_set == 3:
                     # Last possible set, the stroke is finished.
                     self._finish_stroke()
@@ -1,6 +1,6 @@
 
 from plover.translation import Translation
-from plover.steno import Stroke
+from plover.steno import Stroke, keys_to_mask
 from plover import system
 
 
@@ -12,12 +12,7 @@ def toggle_asterisk(translator, stroke, cmdline):
         return
     t = translations[-1]
     translator.untranslate_translation(t)
-    keys = set(t.strokes[-1].steno_keys)
-    if '*' in keys:
-        keys.remove('*')
-    else:
-        keys.add('*')
-    translator.translate_stroke(Stroke(keys))
+    translator.translate_stroke(Stroke(t.strokes[-1].mask ^ keys_to_mask(('*',))))
 
 def delete_space(translator, stroke, cmdline):
     assert not cmdline
@@ -48,6 +48,9 @@ else:
         CONFIG_DIR = config_directories[0]
 CONFIG_FILE = os.path.join(CONFIG_DIR, CONFIG_BASENAME)
 
+# Setup cache directory.
+CACHE_DIR = os.path.join(CONFIG_DIR, 'cache')
+
 # Setup plugins directory.
 PLUGINS_PLATFORM = PLATFORM
 
@@ -7,6 +7,7 @@
 
 import argparse
 import atexit
+import multiprocessing
 import os
 import sys
 import subprocess
@@ -39,6 +40,9 @@ def init_config_dir():
 
 def main():
     """Launch plover."""
+    # Needed for worker processes (see `DictionaryLoadingManager`) in
+    # frozen Windows executables: a no-op otherwise.
+    multiprocessing.freeze_support()
     description = "Run the plover stenotype engine. This is a graphical application."
     parser = argparse.ArgumentParser(description=description)
     parser.add_argument('--version', action='version', version='%s %s'
@@ -0,0 +1,275 @@
+"""Search index for prefix and substring queries on strings.
+
+Entries are `(text, key)` pairs, kept sorted on the lowercased text in
+parallel lists, so a prefix query is a binary search (case-insensitive,
+with an extra check on the original text for case-sensitive queries),
+and results come out sorted, ready for paging.
+
+Substring queries scan a single string holding all the lowercased texts
+(in order, `\\0` separated), which is much faster than testing each entry.
+That string is only built on the first substring query.
+
+The sorted lists are never modified: inserting into (or deleting from)
+them would be O(N) for each change. Instead, changes are recorded on the
+side (added entries, and removed indexes), and merged in on each query;
+once there are too many of those, the sorted lists are rebuilt in the
+background. The whole state is replaced on each change, so queries can
+run concurrently with changes, without locking: a query works on the
+state it started with.
+
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from heapq import merge
+from itertools import islice
+from operator import itemgetter
+import sys
+import threading
+
+
+SEPARATOR = '\0'
+
+# Maximum number of changes kept on the side, before the sorted entries
+# are rebuilt: each query costs O(MAX_CHANGES) more, a rebuild O(N).
+MAX_CHANGES = 1024
+
+
+def _fold(text):
+    folded = text.lower()
+    # Share the original string when possible.
+    return text if folded == text else folded
+
+
+class _SortedEntries:
+
+    __slots__ = ('folded', 'texts', 'keys', '_blob', '_offsets')
+
+    def __init__(self, folded, texts, keys):
+        # Note: sorting the indexes is much faster than sorting tuples.
+        order = sorted(range(len(folded)), key=folded.__getitem__)
+        self.folded = [folded[index] for index in order]
+        self.texts = [texts[index] for index in order]
+        self.keys = [keys[index] for index in order]
+        # Substring search data (see `_substring_matches`).
+        self._blob = None
+        self._offsets = None
+
+    def find(self, folded, text, key, removed, want_removed):
+        start = bisect_left(self.folded, folded)
+        end = bisect_right(self.folded, folded, start)
+        for index in range(start, end):
+            if (self.keys[index] == key and self.texts[index] == text and
+                (index in removed) == want_removed):
+                return index
+        return None
+
+    def _prefix_matches(self, folded_pattern):
+        start = bisect_left(self.folded, folded_pattern)
+        end = len(self.folded)
+        # The range ends at the first text sorting after all the
+        # texts starting with the pattern.
+        if folded_pattern and folded_pattern[-1] != chr(sys.maxunicode):
+            end = bisect_left(self.folded, folded_pattern[:-1] +
+                              chr(ord(folded_pattern[-1]) + 1), start)
+        return range(start, end)
+
+    def _substring_matches(self, folded_pattern):
+        if not self.folded:
+            return
+        blob = self._blob
+        offsets = self._offsets
+        if blob is None:
+            offsets = array('Q')
+            position = 0
+            for folded in self.folded:
+                offsets.append(position)
+                position += len(folded) + 1
+            blob = SEPARATOR.join(self.folded)
+            self._offsets = offsets
+            self._blob = blob
+        position = blob.find(folded_pattern)
+        while position != -1:
+            index = bisect_right(offsets, position) - 1
+            yield index
+            # Skip to the next entry.
+            if index + 1 == len(offsets):
+                break
+            position = blob.find(folded_pattern, offsets[index + 1])
+
+    def matches(self, pattern, substring, ignore_case):
+        folded_pattern = pattern.lower()
+        if substring:
+            matches = self._substring_matches(folded_pattern)
+        else:
+            matches = self._prefix_matches(folded_pattern)
+        if not ignore_case:
+            texts = self.texts
+            if substring:
+                matches = (index for index in matches if pattern in texts[index])
+            else:
+                matches = (index for index in matches if texts[index].startswith(pattern))
+        return matches
+
+
+def _match(entry, pattern, folded_pattern, substring, ignore_case):
+    folded, text, key = entry
+    if substring:
+        return folded_pattern in folded and (ignore_case or pattern in text)
+    return folded.startswith(folded_pattern) and (ignore_case or text.startswith(pattern))
+
+
+class SearchIndex:
+
+    def __init__(self, entries=()):
+        texts = []
+        keys = []
+        for text, key in entries:
+            texts.append(text)
+            keys.append(key)
+        folded = list(map(_fold, texts))
+        # Sorted entries, added entries (sorted `(folded, text, key)`
+        # tuples), and indexes of the removed sorted entries.
+        self._state = (_SortedEntries(folded, texts, keys), (), frozenset())
+        # Changes since the start of the current rebuild, if any
+        # (see `_rebuild`), as `(add, text, key)` tuples.
+        self._pending = None
+        self._rebuild_thread = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        entries, added, removed = self._state
+        return len(entries.keys) + len(added) - len(removed)
+
+    @staticmethod
+    def _add(state, text, key):
+        entries, added, removed = state
+        folded = _fold(text)
+        index = entries.find(folded, text, key, removed, True) if removed else None
+        if index is not None:
+            removed = removed - {index}
+        else:
+            # Note: compare on the folded text only, keys may not be orderable.
+            position = bisect_right(added, (folded,))
+            while position < len(added) and added[position][0] == folded:
+                position += 1
+            added = added[:position] + ((folded, text, key),) + added[position:]
+        return entries, added, removed
+
+    @staticmethod
+    def _remove(state, text, key):
+        entries, added, removed = state
+        folded = _fold(text)
+        position = bisect_right(added, (folded,))
+        while position < len(added) and added[position][0] == folded:
+            if added[position][1:] == (text, key):
+                added = added[:position] + added[position + 1:]
+                break
+            position += 1
+        else:
+            index = entries.find(folded, text, key, removed, False)
+            if index is None:
+                raise KeyError(key)
+            removed = removed | {index}
+        return entries, added, removed
+
+    def _change(self, add, text, key):
+        with self._lock:
+            state = (self._add if add else self._remove)(self._state, text, key)
+            self._state = state
+            if self._pending is not None:
+                self._pending.append((add, text, key))
+                return
+            entries, added, removed = state
+            if len(added) + len(removed) <= MAX_CHANGES:
+                return
+            # Rebuild the sorted entries in the background, as it's O(N).
+            self._pending = []
+            self._rebuild_thread = threading.Thread(target=self._rebuild,
+                                                    args=(state,), daemon=True)
+            self._rebuild_thread.start()
+
+    def _rebuild(self, state):
+        entries, added, removed = state
+        folded, texts, keys = entries.folded, entries.texts, entries.keys
+        if removed:
+            kept = [index for index in range(len(keys))
+                    if index not in removed]
+            folded = [folded[index] for index in kept]
+            texts = [texts[index] for index in kept]
+            keys = [keys[index] for index in kept]
+        else:
+            folded, texts, keys = list(folded), list(texts), list(keys)
+        for entry_folded, text, key in added:
+            folded.append(entry_folded)
+            texts.append(text)
+            keys.append(key)
+        state = (_SortedEntries(folded, texts, keys), (), frozenset())
+        with self._lock:
+            # Apply the changes made in the meantime.
+            for add, text, key in self._pending:
+                state = (self._add if add else self._remove)(state, text, key)
+            self._state = state
+            self._pending = None
+
+    def add(self, text, key):
+        self._change(True, text, key)
+
+    def remove(self, text, key):
+        self._change(False, text, key)
+
+    @staticmethod
+    def _matches(state, pattern, substring, ignore_case):
+        '''Iterate on the matching `(folded, text, key)` entries.'''
+        entries, added, removed = state
+        matches = entries.matches(pattern, substring, ignore_case)
+        if removed:
+            matches = (index for index in matches if index not in removed)
+        folded, texts, keys = entries.folded, entries.texts, entries.keys
+        matches = ((folded[index], texts[index], keys[index])
+                   for index in matches)
+        if added:
+            folded_pattern = pattern.lower()
+            matches = merge(matches, [
+                entry for entry in added
+                if _match(entry, pattern, folded_pattern, substring, ignore_case)
+            ], key=itemgetter(0))
+        return matches
+
+    def search(self, pattern, substring=False, ignore_case=False,
+               start=0, count=None):
+        '''Return the `(text, key)` entries matching <pattern>.
+
+        Entries whose text starts with <pattern> (or contains it,
+        if <substring> is set), sorted by text (case-insensitively).
+        Only <count> entries (or all if None), after skipping the
+        first <start> ones, are returned.
+        '''
+        if SEPARATOR in pattern:
+            return []
+        matches = self._matches(self._state, pattern, substring, ignore_case)
+        stop = None if count is None else start + count
+        return [(text, key) for folded, text, key
+                in islice(matches, start, stop)]
+
+    def select(self, pattern='', substring=False, ignore_case=False):
+        '''Return the entries matching <pattern>, see `search`.
+
+        Only the lowercased texts and keys are returned, as 2
+        separate lists: this is much cheaper than `search` when
+        many entries match (e.g. copying the whole index).
+        '''
+        if SEPARATOR in pattern:
+            return [], []
+        state = self._state
+        entries, added, removed = state
+        if not substring and (ignore_case or not pattern) and not (added or removed):
+            matches = entries.matches(pattern, substring, True)
+            return (entries.folded[matches.start:matches.stop],
+                    entries.keys[matches.start:matches.stop])
+        folded = []
+        keys = []
+        for entry_folded, text, key in self._matches(state, pattern, substring, ignore_case):
+            folded.append(entry_folded)
+            keys.append(key)
+        return folded, keys
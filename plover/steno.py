@@ -12,6 +12,7 @@ Stroke -- A data model class that encapsulates a sequence of steno keys.
 """
 
 import re
+import sys
 
 from plover import system
 
@@ -21,7 +22,43 @@ STROKE_DELIMITER = '/'
 _NUMBERS = set('0123456789')
 _IMPLICIT_NUMBER_RX = re.compile('(^|[1-4])([6-9])')
 
-def normalize_stroke(stroke):
+# Caches, only valid for the current system: `system.setup` always
+# creates a new `KEY_ORDER` mapping, which is used to detect changes
+# (see `_reset_caches`).
+_caches_system = None
+
+# Memo table of normalized strokes: the same (relatively few) strokes
+# are used over and over across a dictionary's entries. Results are
+# interned, so identical strokes share the same string object.
+_NORMALIZED_STROKES_MAX = 1 << 16
+_normalized_strokes = {}
+
+# Stroke instances, by set of steno keys or mask (see `Stroke`).
+_STROKES_MAX = 1 << 16
+_strokes = {}
+
+# Steno key -> bit mask, and bit -> steno key (see `keys_to_mask`).
+_key_masks = {}
+_mask_keys = []
+
+def _reset_caches():
+    global _caches_system
+    _normalized_strokes.clear()
+    _strokes.clear()
+    _key_masks.clear()
+    del _mask_keys[:]
+    for key in system.KEYS:
+        _add_key(key)
+    for number in system.NUMBERS.values():
+        _add_key(number)
+    _caches_system = system.KEY_ORDER
+
+def _add_key(key):
+    mask = _key_masks[key] = 1 << len(_mask_keys)
+    _mask_keys.append(key)
+    return mask
+
+def _normalize_stroke(stroke):
     letters = set(stroke)
     if letters & _NUMBERS:
         if system.NUMBER_KEY in letters:
@@ -38,12 +75,50 @@ def normalize_stroke(stroke):
             stroke = stroke.replace('-', '')
     return stroke
 
+def normalize_stroke(stroke):
+    if system.KEY_ORDER is not _caches_system:
+        _reset_caches()
+    else:
+        normalized = _normalized_strokes.get(stroke)
+        if normalized is not None:
+            return normalized
+    normalized = sys.intern(_normalize_stroke(stroke))
+    if len(_normalized_strokes) >= _NORMALIZED_STROKES_MAX:
+        _normalized_strokes.clear()
+    _normalized_strokes[stroke] = normalized
+    return normalized
+
 def normalize_steno(strokes_string):
     """Convert steno strings to one common form."""
     if not strokes_string:
         return ()
-    return tuple(normalize_stroke(stroke) for stroke
-                 in strokes_string.split(STROKE_DELIMITER))
+    return tuple(map(normalize_stroke, strokes_string.split(STROKE_DELIMITER)))
+
+def keys_to_mask(steno_keys):
+    """Return the bit mask of the steno keys <steno_keys>.
+
+    Each of the system's keys is mapped to a bit (in the same order
+    as `system.KEYS`), followed by the number keys, and any other key
+    is allocated its own bit on first use.
+
+    """
+    if system.KEY_ORDER is not _caches_system:
+        _reset_caches()
+    mask = 0
+    for key in steno_keys:
+        key_mask = _key_masks.get(key)
+        if key_mask is None:
+            key_mask = _add_key(key)
+        mask |= key_mask
+    return mask
+
+def mask_to_keys(mask):
+    """Return the list of steno keys in the bit mask <mask>."""
+    if system.KEY_ORDER is not _caches_system:
+        _reset_caches()
+    if mask >> len(_mask_keys):
+        raise ValueError('invalid steno keys mask: %#x' % mask)
+    return [key for n, key in enumerate(_mask_keys) if mask & (1 << n)]
 
 def sort_steno_keys(steno_keys):
     return sorted(steno_keys, key=lambda x: system.KEY_ORDER.get(x, -1))
@@ -64,23 +139,56 @@ class Stroke:
     stenographic ordering on the keys, and combines the keys into a single
     string (called RTFCRE for historical reasons).
 
+    Stroke objects are immutable, and cached: creating a stroke from
+    the same set of keys returns the same instance (as long as the
+    system does not change), so `steno_keys` must not be modified.
+
     """
 
-    def __init__(self, steno_keys) :
+    __slots__ = ('steno_keys', 'rtfcre', 'is_correction', 'mask')
+
+    def __new__(cls, steno_keys):
         """Create a steno stroke by formatting steno keys.
 
         Arguments:
 
-        steno_keys -- A sequence of pressed keys.
+        steno_keys -- A sequence of pressed keys, or their bit mask
+        (see `keys_to_mask`).
 
         """
-        # Remove duplicate keys and save local versions of the input 
-        # parameters.
-        steno_keys_set = set(steno_keys)
+        if not isinstance(steno_keys, int):
+            # Remove duplicate keys.
+            steno_keys = frozenset(steno_keys)
+        if not steno_keys:
+            # Note: no need for the system to be setup.
+            stroke = object.__new__(cls)
+            stroke._setup(frozenset())
+            return stroke
+        if system.KEY_ORDER is not _caches_system:
+            _reset_caches()
+        else:
+            stroke = _strokes.get((cls, steno_keys))
+            if stroke is not None:
+                return stroke
+        if isinstance(steno_keys, int):
+            stroke = cls(mask_to_keys(steno_keys))
+        else:
+            stroke = object.__new__(cls)
+            stroke._setup(steno_keys)
+        if len(_strokes) >= _STROKES_MAX:
+            _strokes.clear()
+        _strokes[(cls, steno_keys)] = stroke
+        return stroke
+
+    def _setup(self, steno_keys_set):
+        setattr = object.__setattr__
         if not steno_keys_set:
-            self.steno_keys = []
-            self.rtfcre = ''
+            setattr(self, 'steno_keys', [])
+            setattr(self, 'rtfcre', '')
+            setattr(self, 'is_correction', False)
+            setattr(self, 'mask', 0)
             return
+        steno_keys_set = set(steno_keys_set)
         # Order the steno keys so comparisons can be made.
         steno_keys = list(sort_steno_keys(steno_keys_set))
 
@@ -98,20 +206,38 @@ class Stroke:
                 steno_keys_set.remove(system.NUMBER_KEY)
 
         if steno_keys_set & system.IMPLICIT_HYPHEN_KEYS:
-            self.rtfcre = ''.join(key.strip('-') for key in steno_keys)
+            rtfcre = ''.join(key.strip('-') for key in steno_keys)
         else:
             pre = ''.join(k.strip('-') for k in steno_keys if k[-1] == '-' or 
                           k == system.NUMBER_KEY)
             post = ''.join(k.strip('-') for k in steno_keys if k[0] == '-')
-            self.rtfcre = '-'.join([pre, post]) if post else pre
+            rtfcre = '-'.join([pre, post]) if post else pre
 
-        self.steno_keys = steno_keys
+        mask = keys_to_mask(steno_keys)
 
+        setattr(self, 'steno_keys', steno_keys)
+        setattr(self, 'rtfcre', sys.intern(rtfcre))
         # Determine if this stroke is a correction stroke.
-        self.is_correction = (self.rtfcre == system.UNDO_STROKE_STENO)
+        setattr(self, 'is_correction', rtfcre == system.UNDO_STROKE_STENO)
+        # Bit mask of the steno keys (see `keys_to_mask`).
+        setattr(self, 'mask', mask)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Stroke objects are immutable')
+
+    __delattr__ = __setattr__
+
+    def __reduce__(self):
+        return (type(self), (self.steno_keys,))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def __hash__(self):
-        return hash(self.rtfcre)
+        return self.mask
 
     def __str__(self):
         if self.is_correction:
@@ -121,8 +247,8 @@ class Stroke:
         return '%sStroke(%s : %s)' % (prefix, self.rtfcre, self.steno_keys)
 
     def __eq__(self, other):
-        return (isinstance(other, Stroke)
-                and self.steno_keys == other.steno_keys)
+        return (self is other or isinstance(other, Stroke)
+                and self.mask == other.mask)
 
     def __ne__(self, other):
         return not self.__eq__(other)
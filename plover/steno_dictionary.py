@@ -7,10 +7,298 @@ A steno dictionary maps sequences of steno strokes to translations.
 
 """
 
+from array import array
 import collections
+import collections.abc
+import json
 import os
+import sys
+import threading
 
+from plover import log
 from plover.resource import ASSET_SCHEME, resource_filename, resource_timestamp, resource_update
+from plover.search_index import SearchIndex
+from plover.steno import STROKE_DELIMITER
+
+
+# Suffix of the journal file of a dictionary (see `StenoDictionary.save`).
+JOURNAL_SUFFIX = '.journal'
+
+
+def _lowercase(value):
+    lowercase = value.lower()
+    # Share the original string when possible.
+    return value if lowercase == value else lowercase
+
+
+class _DictStorage(dict):
+    """Default storage for dictionary entries: a plain `dict`.
+
+    Keys are used as is, so packing/unpacking is a no-op.
+
+    """
+
+    # True for read-only storage (see `StenoDictionary._thaw`).
+    frozen = False
+
+    @staticmethod
+    def pack(key):
+        return key
+
+    @staticmethod
+    def unpack(packed_key):
+        return packed_key
+
+    @staticmethod
+    def key_length(packed_key):
+        return len(packed_key)
+
+    @staticmethod
+    def prefixes(packed_key):
+        """Iterate over the (packed) proper prefixes of <packed_key>."""
+        return (packed_key[:n] for n in range(1, len(packed_key)))
+
+    @staticmethod
+    def intern(value):
+        return value
+
+    packed_keys = dict.keys
+    packed_items = dict.items
+
+
+# Marker for deleted entries in `CompactStorage` tables.
+_DELETED = 0xFFFFFFFF
+
+# Note: lone surrogates are valid stroke ids too.
+_PACKED_ENCODING = 'utf-8'
+_PACKED_ERRORS = 'surrogatepass'
+
+
+class CompactStorage(collections.abc.MutableMapping):
+    """Memory efficient storage for dictionary entries.
+
+    No Python object is kept per entry: entries live in a hash table
+    made of flat arrays (same layout as the binary cache, see
+    `plover.dictionary.cache`). Each distinct stroke is interned into
+    an integer id, and keys are packed as UTF-8 bytes holding one
+    character per stroke id (so 1 to 3 bytes per stroke), translations
+    are stored UTF-8 encoded too.
+
+    Lookups are a little slower (translations are decoded on access),
+    in exchange for a memory footprint several times smaller.
+
+    Reading does not need locking: changes are applied atomically,
+    and the table is replaced as a whole when it's rebuilt.
+
+    Note: stroke ids are never released (short of a `clear`), even
+    after all the entries using them have been removed. The space used
+    by removed entries is only reclaimed when the table is rebuilt:
+    when it grows, or when half of it is garbage.
+
+    """
+
+    frozen = False
+
+    def __init__(self, *args, **kwargs):
+        self.clear()
+        self.update(*args, **kwargs)
+
+    def clear(self):
+        # Stroke -> packed character (`chr(stroke id)`).
+        self._stroke_chars = {}
+        # Packed character -> stroke.
+        self._char_strokes = {}
+        # Hash table buckets (entry index + 1, 0 for an empty bucket),
+        # entries (4 integers per entry: key offset and length, and
+        # value offset and length), packed keys, and encoded values.
+        self._table = (array('I', bytes(4 * 8)), array('I'),
+                       bytearray(), bytearray())
+        self._count = 0
+        # Number of deleted entries, and bytes
+        # of replaced values, still in the table.
+        self._deleted = 0
+        self._garbage = 0
+
+    def _pack_new(self, key):
+        stroke_chars = self._stroke_chars
+        chars = []
+        for stroke in key:
+            c = stroke_chars.get(stroke)
+            if c is None:
+                c = chr(len(stroke_chars))
+                stroke = sys.intern(stroke)
+                stroke_chars[stroke] = c
+                self._char_strokes[c] = stroke
+            chars.append(c)
+        return ''.join(chars).encode(_PACKED_ENCODING, _PACKED_ERRORS)
+
+    def pack(self, key):
+        """Pack <key>, raise `KeyError` if it uses an unknown stroke."""
+        try:
+            chars = ''.join(map(self._stroke_chars.__getitem__, key))
+        except (KeyError, TypeError):
+            raise KeyError(key) from None
+        return chars.encode(_PACKED_ENCODING, _PACKED_ERRORS)
+
+    def unpack(self, packed_key):
+        return tuple(map(self._char_strokes.__getitem__,
+                         packed_key.decode(_PACKED_ENCODING, _PACKED_ERRORS)))
+
+    @staticmethod
+    def key_length(packed_key):
+        return len(packed_key.decode(_PACKED_ENCODING, _PACKED_ERRORS))
+
+    @staticmethod
+    def prefixes(packed_key):
+        chars = packed_key.decode(_PACKED_ENCODING, _PACKED_ERRORS)
+        return (chars[:n].encode(_PACKED_ENCODING, _PACKED_ERRORS)
+                for n in range(1, len(chars)))
+
+    @staticmethod
+    def intern(value):
+        return value
+
+    @staticmethod
+    def _find(table, packed_key):
+        # Return the bucket and entry offset of <packed_key>,
+        # or the first empty bucket and None if it's missing.
+        buckets, entries, keys, __ = table
+        mask = len(buckets) - 1
+        n = hash(packed_key) & mask
+        while True:
+            index = buckets[n]
+            if not index:
+                return n, None
+            if index != _DELETED:
+                index = 4 * (index - 1)
+                key_offset, key_len = entries[index], entries[index+1]
+                if keys[key_offset:key_offset+key_len] == packed_key:
+                    return n, index
+            n = (n + 1) & mask
+
+    def _rebuild(self):
+        __, entries, keys, values = self._table
+        new_entries = array('I')
+        new_keys = bytearray()
+        new_values = bytearray()
+        hashes = []
+        for index in range(0, len(entries), 4):
+            key_offset, key_len, value_offset, value_len = entries[index:index+4]
+            if key_offset == _DELETED:
+                continue
+            packed_key = bytes(keys[key_offset:key_offset+key_len])
+            new_entries.extend((len(new_keys), key_len, len(new_values), value_len))
+            new_keys += packed_key
+            new_values += values[value_offset:value_offset+value_len]
+            hashes.append(hash(packed_key))
+        # Leave room to grow: keep the load factor under 25%.
+        bucket_count = 8
+        while bucket_count < 4 * len(hashes):
+            bucket_count *= 2
+        mask = bucket_count - 1
+        buckets = array('I', bytes(4 * bucket_count))
+        for index, h in enumerate(hashes):
+            n = h & mask
+            while buckets[n]:
+                n = (n + 1) & mask
+            buckets[n] = index + 1
+        self._deleted = 0
+        self._garbage = 0
+        self._table = (buckets, new_entries, new_keys, new_values)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return map(self.unpack, self.packed_keys())
+
+    def __contains__(self, key):
+        try:
+            packed_key = self.pack(key)
+        except KeyError:
+            return False
+        return self._find(self._table, packed_key)[1] is not None
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, fallback=None):
+        try:
+            packed_key = self.pack(key)
+        except KeyError:
+            return fallback
+        table = self._table
+        index = self._find(table, packed_key)[1]
+        if index is None:
+            return fallback
+        value_offset, value_len = table[1][index+2:index+4]
+        return str(table[3][value_offset:value_offset+value_len], 'utf-8')
+
+    def __setitem__(self, key, value):
+        packed_key = self._pack_new(key)
+        value_bytes = value.encode('utf-8')
+        table = self._table
+        n, index = self._find(table, packed_key)
+        buckets, entries, keys, values = table
+        if index is not None:
+            self._garbage += entries[index+3]
+            value_offset = len(values)
+            values += value_bytes
+            entries[index+2:index+4] = array('I', (value_offset, len(value_bytes)))
+            if 2 * self._garbage > len(values):
+                self._rebuild()
+            return
+        if 2 * (len(entries) // 4 + 1) > len(buckets):
+            self._rebuild()
+            table = self._table
+            n = self._find(table, packed_key)[0]
+            buckets, entries, keys, values = table
+        entries.extend((len(keys), len(packed_key), len(values), len(value_bytes)))
+        keys += packed_key
+        values += value_bytes
+        # Only make the entry visible once complete.
+        buckets[n] = len(entries) // 4
+        self._count += 1
+
+    def __delitem__(self, key):
+        try:
+            packed_key = self.pack(key)
+        except KeyError:
+            raise KeyError(key) from None
+        table = self._table
+        n, index = self._find(table, packed_key)
+        if index is None:
+            raise KeyError(key)
+        buckets, entries, __, values = table
+        buckets[n] = _DELETED
+        entries[index] = _DELETED
+        self._count -= 1
+        self._deleted += 1
+        self._garbage += entries[index+3]
+        if 2 * self._deleted > len(entries) // 4 or 2 * self._garbage > len(values):
+            self._rebuild()
+
+    def packed_keys(self):
+        __, entries, keys, __ = self._table
+        for index in range(0, len(entries), 4):
+            key_offset, key_len = entries[index], entries[index+1]
+            if key_offset != _DELETED:
+                yield bytes(keys[key_offset:key_offset+key_len])
+
+    def packed_items(self):
+        __, entries, keys, values = self._table
+        for index in range(0, len(entries), 4):
+            key_offset, key_len, value_offset, value_len = entries[index:index+4]
+            if key_offset != _DELETED:
+                yield (bytes(keys[key_offset:key_offset+key_len]),
+                       str(values[value_offset:value_offset+value_len], 'utf-8'))
+
+    def items(self):
+        unpack = self.unpack
+        return ((unpack(k), v) for k, v in self.packed_items())
 
 
 class StenoDictionary:
@@ -28,17 +316,76 @@ class StenoDictionary:
     # False if class support creation.
     readonly = False
 
+    # True if the dictionary contents can be pre-compiled
+    # to a binary cache (see `plover.dictionary.cache`):
+    # only for formats fully described by their entries.
+    cacheable = False
+
+    # True if entries should be kept in compact storage
+    # (see `CompactStorage`), trading some lookup speed
+    # for a much smaller memory footprint.
+    compact_storage = False
+
+    # True if the format supports journaled saves (see `save`):
+    # only for formats fully described by their entries.
+    journalable = False
+
+    # True if all the entries are held by the dictionary storage,
+    # so indexes can be built from it (see `has_prefix`): this is
+    # automatically reset for classes overriding how entries are
+    # accessed (e.g. a Python dictionary plugin implementing `get`),
+    # see `__init_subclass__`.
+    indexable = True
+
+    # Number of entries in the journal after which
+    # it's compacted back into the dictionary file.
+    journal_compaction_threshold = 1000
+
+    # Set when the dictionary is saved in the background
+    # (see `plover.dictionary.base.SaveScheduler`).
+    save_scheduler = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if 'indexable' not in cls.__dict__ and any(
+            name in cls.__dict__ for name in
+            ('__getitem__', 'get', 'items', 'reverse_lookup')
+        ):
+            cls.indexable = False
+
     def __init__(self):
-        self._dict = {}
+        self._dict = self._new_storage()
         self._longest_key_length = 0
         self._longest_listener_callbacks = set()
-        self.reverse = collections.defaultdict(list)
-        # Case-insensitive reverse dict
-        self.casereverse = collections.defaultdict(list)
+        self._change_listener_callbacks = set()
+        # (reverse, case-insensitive reverse) dicts: only
+        # built on demand, see `build_reverse_index`.
+        self._reverse_index = None
+        # Storage and, for its proper prefixes of all the (packed) keys,
+        # the number of keys starting with that prefix: only built when
+        # requested, see `build_prefix_index`.
+        self._prefix_index = None
+        self._prefix_index_enabled = False
+        # Search indexes on strokes and translations (with packed
+        # keys): only built on demand too, see `search`.
+        self._strokes_index = None
+        self._translations_index = None
+        self._index_lock = threading.Lock()
         self.filters = []
         self.timestamp = 0
         self.readonly = False
-        self.enabled = True
+        self._enabled = True
+        self._progress = None
+        # If set (and supported by the format), `save` only appends
+        # the changes since the last save to the dictionary journal.
+        self.journaled = False
+        # Changes not saved yet: key -> translation (None if deleted).
+        self._journal_changes = {}
+        # Number of entries in the journal file.
+        self._journal_length = 0
+        # Set after bulk changes: the next save must be a full save.
+        self._full_save_needed = True
+        self._save_lock = threading.Lock()
         self.path = None
 
     def __str__(self):
@@ -57,11 +404,40 @@ class StenoDictionary:
         return d
 
     @classmethod
-    def load(cls, resource):
+    def load(cls, resource, storage=None, progress=None, compact_storage=None):
+        """Load a dictionary from <resource>.
+
+        If <storage> is set, it's used as is for the dictionary
+        entries, instead of parsing the file: see `plover.dictionary.cache`.
+
+        If <progress> is set, it's called with the number of bytes
+        processed so far and the total size of the file, for formats
+        supporting it (see `_loading_progress`).
+
+        If <compact_storage> is not None, it overrides the class
+        default (see `compact_storage`) for the loaded dictionary.
+
+        """
         filename = resource_filename(resource)
         timestamp = resource_timestamp(filename)
         d = cls()
-        d._load(filename)
+        if compact_storage is not None and compact_storage != d.compact_storage:
+            d.compact_storage = compact_storage
+            d._dict = d._new_storage()
+        if storage is None:
+            d._progress = progress
+            try:
+                d._load(filename)
+            finally:
+                d._progress = None
+            if cls.journalable:
+                d._replay_journal(filename + JOURNAL_SUFFIX)
+        else:
+            # Note: the storage already includes
+            # the changes from the journal, if any.
+            d._set_storage(storage, storage.longest_key)
+        d._journal_changes = {}
+        d._full_save_needed = False
         if (cls.readonly or
             resource.startswith(ASSET_SCHEME) or
             not os.access(filename, os.W_OK)):
@@ -71,10 +447,125 @@ class StenoDictionary:
         return d
 
     def save(self):
+        """Save the dictionary.
+
+        For journaled dictionaries (see `journaled`), only the changes
+        since the last save are appended to the dictionary journal (a
+        sidecar file, replayed on load). The journal is compacted back
+        into the dictionary file (see `compact`) after a bulk change, or
+        when it grows over `journal_compaction_threshold` entries.
+
+        """
+        assert not self.readonly
+        with self._save_lock:
+            with self._index_lock:
+                changes, self._journal_changes = self._journal_changes, {}
+                full_save = (self._full_save_needed or not
+                             (self.journaled and self.journalable))
+                self._full_save_needed = False
+            try:
+                if not full_save:
+                    self._append_to_journal(changes)
+                    full_save = self._journal_length > self.journal_compaction_threshold
+                if full_save:
+                    self._full_save()
+            except:
+                # Make sure those changes are not lost on the next save.
+                self._full_save_needed = True
+                raise
+
+    def compact(self):
+        """Compact the dictionary journal, if not empty, into the dictionary file."""
         assert not self.readonly
+        with self._save_lock:
+            with self._index_lock:
+                if not (self._journal_length or self._journal_changes):
+                    return
+                self._journal_changes = {}
+                self._full_save_needed = False
+            try:
+                self._full_save()
+            except:
+                self._full_save_needed = True
+                raise
+
+    def _full_save(self):
         with resource_update(self.path) as temp_path:
             self._save(temp_path)
         self.timestamp = resource_timestamp(self.path)
+        if self.journalable:
+            journal_filename = resource_filename(self.path) + JOURNAL_SUFFIX
+            if os.path.exists(journal_filename):
+                os.unlink(journal_filename)
+            self._journal_length = 0
+
+    def _append_to_journal(self, changes):
+        if not changes:
+            return
+        # One JSON array per line: key, and translation (null if deleted).
+        lines = ''.join(
+            json.dumps([STROKE_DELIMITER.join(key), value], ensure_ascii=False) + '\n'
+            for key, value in changes.items()
+        )
+        journal_filename = resource_filename(self.path) + JOURNAL_SUFFIX
+        with open(journal_filename, 'a', encoding='utf-8') as fp:
+            fp.write(lines)
+            fp.flush()
+            os.fsync(fp.fileno())
+        self._journal_length += len(changes)
+
+    def _replay_journal(self, journal_filename):
+        try:
+            fp = open(journal_filename, encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with fp:
+            for line in fp:
+                try:
+                    key, value = json.loads(line)
+                except ValueError:
+                    # Incomplete last entry (e.g. after a crash).
+                    log.warning('ignoring invalid entry in dictionary journal %s: %r',
+                                journal_filename, line)
+                    break
+                key = tuple(key.split(STROKE_DELIMITER))
+                if value is None:
+                    if key in self:
+                        del self[key]
+                else:
+                    self[key] = value
+                self._journal_length += 1
+
+    def _new_storage(self, *args):
+        if self.compact_storage:
+            return CompactStorage(*args)
+        return _DictStorage(*args)
+
+    def _set_storage(self, storage, longest_key=None):
+        with self._index_lock:
+            self._dict = storage
+            self._reverse_index = None
+            self._prefix_index = None
+            self._strokes_index = None
+            self._translations_index = None
+        if longest_key is None:
+            longest_key = max(map(storage.key_length, storage.packed_keys()), default=0)
+        self._longest_key = longest_key
+        if self._prefix_index_enabled:
+            self.build_prefix_index(background=True)
+        self._notify_change()
+
+    def _thaw(self):
+        # Read-only storage (e.g. a memory mapped cache) is
+        # replaced by a regular copy on the first change.
+        if self._dict.frozen:
+            self._set_storage(self._new_storage(self._dict.items()),
+                              self._longest_key)
+
+    def _loading_progress(self, done, total):
+        # Can be called by `_load` implementations to report progress.
+        if self._progress is not None:
+            self._progress(done, total)
 
     def _load(self, filename):
         raise NotImplementedError()
@@ -87,6 +578,17 @@ class StenoDictionary:
         """The length of the longest key in the dict."""
         return self._longest_key
 
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, enabled):
+        if enabled == self._enabled:
+            return
+        self._enabled = enabled
+        self._notify_change()
+
     def __len__(self):
         return self._dict.__len__()
 
@@ -98,14 +600,26 @@ class StenoDictionary:
 
     def clear(self):
         assert not self.readonly
-        self._dict.clear()
-        self.reverse.clear()
-        self.casereverse.clear()
-        self._longest_key = 0
+        self._set_storage(self._new_storage(), 0)
+        self._full_save_needed = True
 
     def items(self):
         return self._dict.items()
 
+    def items_snapshot(self):
+        """Iterate over a copy of the entries, as `(key, translation)` pairs.
+
+        Unlike `items`, this is safe even if the dictionary is being
+        changed from another thread: the (packed) entries are copied
+        upfront, and only unpacked on the fly.
+
+        """
+        with self._index_lock:
+            storage = self._dict
+            packed_items = list(storage.packed_items())
+        unpack = storage.unpack
+        return ((unpack(packed_key), value) for packed_key, value in packed_items)
+
     def update(self, *args, **kwargs):
         assert not self.readonly
         iterable_list = [
@@ -115,18 +629,9 @@ class StenoDictionary:
         if kwargs:
             iterable_list.append(kwargs.items())
         if not self._dict:
-            reverse = self.reverse
-            casereverse = self.casereverse
-            longest_key = self._longest_key
-            assert not (reverse or casereverse or longest_key)
-            self._dict = dict(*iterable_list)
-            for key, value in self._dict.items():
-                reverse[value].append(key)
-                casereverse[value.lower()].append(value)
-                key_len = len(key)
-                if key_len > longest_key:
-                    longest_key = key_len
-            self._longest_key = longest_key
+            assert not self._longest_key
+            self._set_storage(self._new_storage(*iterable_list))
+            self._full_save_needed = True
         else:
             for iterable in iterable_list:
                 for key, value in iterable:
@@ -134,32 +639,257 @@ class StenoDictionary:
 
     def __setitem__(self, key, value):
         assert not self.readonly
+        self._thaw()
         if key in self:
             del self[key]
         self._longest_key = max(self._longest_key, len(key))
-        self._dict[key] = value
-        self.reverse[value].append(key)
-        self.casereverse[value.lower()].append(value)
+        value = self._dict.intern(value)
+        with self._index_lock:
+            self._dict[key] = value
+            if self.journalable:
+                self._journal_changes[key] = value
+            packed_key = self._dict.pack(key)
+            if self._reverse_index is not None:
+                reverse, casereverse = self._reverse_index
+                reverse[value].append(packed_key)
+                casereverse[_lowercase(value)].append(value)
+            if self._prefix_index is not None:
+                prefix_index = self._prefix_index[1]
+                for prefix in self._dict.prefixes(packed_key):
+                    prefix_index[prefix] = prefix_index.get(prefix, 0) + 1
+            if self._strokes_index is not None:
+                self._strokes_index.add(STROKE_DELIMITER.join(key), packed_key)
+            if self._translations_index is not None:
+                self._translations_index.add(value, packed_key)
+        self._notify_change(key)
 
     def get(self, key, fallback=None):
         return self._dict.get(key, fallback)
 
     def __delitem__(self, key):
         assert not self.readonly
-        value = self._dict.pop(key)
-        self.reverse[value].remove(key)
-        self.casereverse[value.lower()].remove(value)
+        self._thaw()
+        with self._index_lock:
+            packed_key = self._dict.pack(key)
+            value = self._dict.pop(key)
+            if self.journalable:
+                self._journal_changes[key] = None
+            if self._reverse_index is not None:
+                reverse, casereverse = self._reverse_index
+                reverse[value].remove(packed_key)
+                casereverse[value.lower()].remove(value)
+            if self._prefix_index is not None:
+                prefix_index = self._prefix_index[1]
+                for prefix in self._dict.prefixes(packed_key):
+                    count = prefix_index[prefix] - 1
+                    if count:
+                        prefix_index[prefix] = count
+                    else:
+                        del prefix_index[prefix]
+            if self._strokes_index is not None:
+                self._strokes_index.remove(STROKE_DELIMITER.join(key), packed_key)
+            if self._translations_index is not None:
+                self._translations_index.remove(value, packed_key)
         if len(key) == self.longest_key:
             if self._dict:
-                self._longest_key = max(len(x) for x in self._dict)
+                self._longest_key = max(map(self._dict.key_length,
+                                            self._dict.packed_keys()))
             else:
                 self._longest_key = 0
+        self._notify_change(key)
 
     def __contains__(self, key):
         return self.get(key) is not None
 
+    @property
+    def reverse(self):
+        return self.build_reverse_index()[0]
+
+    @property
+    def casereverse(self):
+        return self.build_reverse_index()[1]
+
+    def build_reverse_index(self, background=False):
+        """Build the reverse lookup indexes.
+
+        This is normally done on the first reverse lookup, but can be
+        requested early, e.g. in the <background> after loading, to
+        avoid a delay on that first lookup. Once built, the indexes
+        are kept up to date on changes.
+
+        Return the `(reverse, casereverse)` indexes, or None when
+        building in the background.
+
+        """
+        if background:
+            threading.Thread(target=self.build_reverse_index, daemon=True).start()
+            return None
+        index = self._reverse_index
+        if index is not None:
+            return index
+        with self._index_lock:
+            if self._reverse_index is None:
+                reverse = collections.defaultdict(list)
+                casereverse = collections.defaultdict(list)
+                for key, value in self._dict.packed_items():
+                    reverse[value].append(key)
+                    casereverse[_lowercase(value)].append(value)
+                self._reverse_index = reverse, casereverse
+            return self._reverse_index
+
+    def build_prefix_index(self, background=False):
+        """Build the prefix index used by `has_prefix`.
+
+        Building it takes a while for big dictionaries, so it's only
+        done on request, e.g. in the <background> after loading. Once
+        built, the index is kept up to date on changes, and rebuilt (in
+        the background) when all the entries are replaced (e.g. `clear`).
+
+        """
+        self._prefix_index_enabled = True
+        if background:
+            threading.Thread(target=self.build_prefix_index, daemon=True).start()
+            return
+        with self._index_lock:
+            if self._prefix_index is None:
+                storage = self._dict
+                prefix_index = {}
+                prefixes = storage.prefixes
+                for packed_key in storage.packed_keys():
+                    for prefix in prefixes(packed_key):
+                        prefix_index[prefix] = prefix_index.get(prefix, 0) + 1
+                self._prefix_index = storage, prefix_index
+
+    def has_prefix(self, key):
+        """Return True if <key> may be a proper prefix of at least one key.
+
+        Note: until the prefix index is built (see `build_prefix_index`),
+        or if the dictionary is not `indexable` (as its entries cannot be
+        enumerated), this always returns True.
+
+        """
+        if not self.indexable:
+            return True
+        if not key:
+            return bool(self._dict)
+        index = self._prefix_index
+        if index is None:
+            return True
+        # Note: use the storage the index was built for, in
+        # case it's being replaced (see `_set_storage`).
+        storage, prefix_index = index
+        try:
+            return storage.pack(key) in prefix_index
+        except KeyError:
+            return False
+
+    def _search_index(self, strokes):
+        # Note: the storage is returned too, as it may be swapped
+        # (along with the indexes, see `_set_storage`) concurrently.
+        with self._index_lock:
+            storage = self._dict
+            if strokes:
+                if self._strokes_index is None:
+                    unpack = storage.unpack
+                    self._strokes_index = SearchIndex(
+                        (STROKE_DELIMITER.join(unpack(packed_key)), packed_key)
+                        for packed_key in storage.packed_keys()
+                    )
+                return storage, self._strokes_index
+            if self._translations_index is None:
+                self._translations_index = SearchIndex(
+                    (value, packed_key)
+                    for packed_key, value in storage.packed_items()
+                )
+            return storage, self._translations_index
+
+    def build_search_indexes(self, background=False, strokes=True, translations=True):
+        """Build the search indexes (see `search` and `sorted_keys`).
+
+        Like `build_reverse_index`: this is normally done on the first
+        search, but can be requested early, e.g. in the <background>
+        when opening a search tool, to avoid a delay on that first search.
+
+        Only the indexes on <strokes> and/or <translations> are built.
+
+        """
+        wanted = [index for index, enabled in ((False, translations), (True, strokes))
+                  if enabled]
+        if background:
+            if any((self._strokes_index if index else self._translations_index) is None
+                   for index in wanted):
+                threading.Thread(target=self.build_search_indexes,
+                                 args=(False, strokes, translations),
+                                 daemon=True).start()
+            return
+        for index in wanted:
+            self._search_index(index)
+
+    def has_search_index(self, strokes=False):
+        """Return True if the search index on <strokes> (or translations) is built."""
+        return (self._strokes_index if strokes else self._translations_index) is not None
+
+    def release_search_indexes(self, strokes=True, translations=True):
+        """Release the search indexes on <strokes> and/or <translations>.
+
+        To save memory: they'll be rebuilt on the next search.
+        """
+        with self._index_lock:
+            if strokes:
+                self._strokes_index = None
+            if translations:
+                self._translations_index = None
+
+    def search(self, pattern, strokes=False, substring=False,
+               ignore_case=False, start=0, count=None):
+        """Return the entries matching <pattern>, as `(key, translation)` pairs.
+
+        Translations are searched, or strokes (joined with `/`) if
+        <strokes> is set: see `plover.search_index.SearchIndex.search`
+        for the other parameters, and the order of the results.
+
+        The first call builds the necessary index, which is then
+        kept up to date on changes. Searching does not block changes
+        to the dictionary (and vice versa).
+
+        """
+        storage, index = self._search_index(strokes)
+        matches = index.search(pattern, substring, ignore_case, start, count)
+        unpack = storage.unpack
+        if not strokes:
+            return [(unpack(packed_key), value) for value, packed_key in matches]
+        results = []
+        for __, packed_key in matches:
+            key = unpack(packed_key)
+            value = storage.get(key)
+            # Skip entries deleted since the search.
+            if value is not None:
+                results.append((key, value))
+        return results
+
+    def sorted_keys(self, strokes=False, pattern='', substring=False,
+                    ignore_case=False, reverse=False):
+        """Iterate over the keys of the entries matching <pattern>.
+
+        Like `search`, but only produce `(sort_key, key)` pairs, with
+        <sort_key> the lowercased strokes or translation, in order (or
+        in <reverse> order). The matching entries are selected upfront,
+        but the keys are only unpacked on the fly: this is meant for
+        paging through a big number of entries.
+
+        Note: later changes to the dictionary are not taken into
+        account, some keys may be gone by the time they're produced.
+
+        """
+        storage, index = self._search_index(strokes)
+        sort_keys, packed_keys = index.select(pattern, substring, ignore_case)
+        if reverse:
+            sort_keys.reverse()
+            packed_keys.reverse()
+        return zip(sort_keys, map(storage.unpack, packed_keys))
+
     def reverse_lookup(self, value):
-        return set(self.reverse.get(value, ()))
+        return set(map(self._dict.unpack, self.reverse.get(value, ())))
 
     def casereverse_lookup(self, value):
         return set(self.casereverse.get(value, ()))
@@ -182,30 +912,417 @@ class StenoDictionary:
     def remove_longest_key_listener(self, callback):
         self._longest_listener_callbacks.remove(callback)
 
+    def _notify_change(self, key=None):
+        for callback in self._change_listener_callbacks:
+            callback(self, key)
+
+    def add_change_listener(self, callback):
+        """Add a listener for changes to the dictionary.
+
+        <callback> is called with the dictionary and the changed key,
+        or None if potentially all entries changed (e.g. on `clear`,
+        `update`, or when toggling `enabled`).
+
+        """
+        self._change_listener_callbacks.add(callback)
+
+    def remove_change_listener(self, callback):
+        self._change_listener_callbacks.remove(callback)
+
+
+class StenoDictionaryCollectionSnapshot:
+    """Immutable view of the state of a `StenoDictionaryCollection`.
+
+    The enabled dictionaries (in priority order) and the filters are
+    captured when the snapshot is taken: later changes to the collection
+    (toggling a dictionary, changing the list of dictionaries or the
+    filters) do not affect it, so it can be queried from any thread
+    without locking.
+
+    Note: entries are not copied, each query sees the dictionaries
+    entries at the time it's made. The exception is the reverse index
+    (see `reverse_lookup`), which stops being updated once the snapshot
+    has been replaced by the collection.
+
+    """
+
+    __slots__ = ('dicts', 'filters', '_unindexed',
+                 '_reverse', '_reverse_keys', '_reverse_lock')
+
+    def __init__(self, dicts, filters):
+        self.dicts = tuple(d for d in dicts if d.enabled)
+        self.filters = tuple(filters)
+        # Dictionaries that are not indexable (with their priority),
+        # those are left out of the reverse index (but still taken
+        # into account for overrides), see `reverse_lookup`.
+        self._unindexed = tuple((n, d) for n, d in enumerate(self.dicts)
+                                if not d.indexable)
+        # Reverse index, accounting for priorities: value -> set of keys,
+        # and key -> values (in priority order) it's indexed under. Only
+        # built on demand, see `_build_reverse_index`.
+        self._reverse = None
+        self._reverse_keys = None
+        self._reverse_lock = threading.Lock()
+
+    def __str__(self):
+        return 'StenoDictionaryCollectionSnapshot' + repr(self.dicts)
+
+    def __repr__(self):
+        return str(self)
+
+    @property
+    def longest_key(self):
+        return max((d.longest_key for d in self.dicts), default=0)
+
+    def _lookup(self, key, dicts, filters=()):
+        key_len = len(key)
+        for d in dicts:
+            if key_len > d.longest_key:
+                continue
+            value = d.get(key)
+            if value:
+                if not any(f(key, value) for f in filters):
+                    return value
+        return None
+
+    def _lookup_from_all(self, key, filters=()):
+        key_len = len(key)
+        values = []
+        for d in self.dicts:
+            if key_len > d.longest_key:
+                continue
+            value = d.get(key)
+            if value:
+                if not any(f(key, value) for f in filters):
+                    values.append((value, d))
+        return values
+
+    def lookup(self, key):
+        return self._lookup(key, self.dicts, filters=self.filters)
+
+    def raw_lookup(self, key):
+        return self._lookup(key, self.dicts)
+
+    def lookup_from_all(self, key):
+        return self._lookup_from_all(key, filters=self.filters)
+
+    def raw_lookup_from_all(self, key):
+        return self._lookup_from_all(key)
+
+    def _key_values(self, key):
+        # Values of <key> visible to a reverse lookup: a value
+        # is only overridden by a non-empty value in a higher
+        # priority dictionary.
+        values = []
+        for d in self.dicts:
+            value = d.get(key)
+            if value is None:
+                continue
+            if not d.indexable:
+                if value:
+                    break
+                continue
+            values.append(value)
+            if value:
+                break
+        return tuple(values)
+
+    @staticmethod
+    def _overridden(key, dicts):
+        key_len = len(key)
+        for d in dicts:
+            if key_len <= d.longest_key and d.get(key):
+                return True
+        return False
+
+    def _build_reverse_index(self):
+        with self._reverse_lock:
+            if self._reverse is None:
+                reverse = {}
+                reverse_keys = {}
+                # Higher priority dictionaries that are not indexable.
+                unindexed = []
+                for d in self.dicts:
+                    if not d.indexable:
+                        unindexed.append(d)
+                        continue
+                    for key, value in d.items_snapshot():
+                        values = reverse_keys.get(key, ())
+                        if values and values[-1]:
+                            # Overridden by a higher priority dictionary.
+                            continue
+                        if unindexed and self._overridden(key, unindexed):
+                            continue
+                        reverse_keys[key] = values + (value,)
+                        reverse.setdefault(value, set()).add(key)
+                self._reverse_keys = reverse_keys
+                self._reverse = reverse
+            return self._reverse
+
+    def _update_reverse_index(self, key):
+        with self._reverse_lock:
+            reverse = self._reverse
+            if reverse is None:
+                return
+            for value in self._reverse_keys.pop(key, ()):
+                keys = reverse[value]
+                keys.discard(key)
+                if not keys:
+                    del reverse[value]
+            values = self._key_values(key)
+            if values:
+                self._reverse_keys[key] = values
+                for value in values:
+                    reverse.setdefault(value, set()).add(key)
+
+    def reverse_lookup(self, value):
+        """Return the keys translating to <value>, ignoring the
+        ones overridden by a higher priority dictionary.
+
+        The first call builds the necessary index, which is then
+        kept up to date on changes by the collection. Dictionaries
+        that are not indexable are queried with their own
+        `reverse_lookup` instead.
+
+        """
+        reverse = self._reverse
+        if reverse is None:
+            reverse = self._build_reverse_index()
+        keys = set(reverse.get(value, ()))
+        for n, d in self._unindexed:
+            higher_dicts = self.dicts[:n]
+            keys.update(k for k in d.reverse_lookup(value)
+                        if not self._overridden(k, higher_dicts))
+        return keys
+
+    def casereverse_lookup(self, value):
+        keys = set()
+        for d in self.dicts:
+            keys.update(d.casereverse_lookup(value))
+        return keys
+
+    def search_translations(self, pattern, substring=False,
+                            ignore_case=False, count=None):
+        """Return the distinct translations matching <pattern>.
+
+        Sorted case-insensitively, and limited to the first <count>
+        ones if set (see `StenoDictionary.search`).
+
+        """
+        translations = set()
+        for d in self.dicts:
+            if count is None:
+                translations.update(value for __, value in
+                                    d.search(pattern, substring=substring,
+                                             ignore_case=ignore_case))
+                continue
+            # Only the first <count> distinct translations of
+            # each dictionary are needed, fetch them by pages.
+            found = set()
+            page_size = max(count, 64)
+            start = 0
+            while len(found) < count:
+                page = d.search(pattern, substring=substring,
+                                ignore_case=ignore_case,
+                                start=start, count=page_size)
+                for __, value in page:
+                    found.add(value)
+                    if len(found) == count:
+                        break
+                if len(page) < page_size:
+                    break
+                start += page_size
+            translations |= found
+        return sorted(translations, key=lambda t: (t.lower(), t))[:count]
+
 
 class StenoDictionaryCollection:
 
-    def __init__(self, dicts=[]):
+    def __init__(self, dicts=[], merged_index=False, lookup_cache_size=0):
         self.dicts = []
         self.filters = []
+        # Current snapshot (see `snapshot`), replaced on changes.
+        self._snapshot = None
         self.longest_key = 0
         self.longest_key_callbacks = set()
+        self._change_listener_callbacks = set()
+        # Merged view of all the enabled dictionaries (see `merged_index`),
+        # and the enabled dictionaries not in it (see `_build_merged`).
+        self._merged_index = False
+        self._merged = None
+        # Incremented on changes, to detect stale builds.
+        self._merged_generation = 0
+        self._merged_lock = threading.Lock()
+        # Optional LRU cache of `lookup` results (including misses).
+        self._lookup_cache = None
+        self._lookup_cache_size = 0
+        # Changes are notified from other threads (e.g. when saving a
+        # dictionary), so the cache is only accessed with this lock held.
+        self._lookup_cache_lock = threading.Lock()
+        # Incremented on changes, to avoid caching stale results.
+        self._lookup_cache_generation = 0
+        self.lookup_cache_hits = 0
+        self.lookup_cache_misses = 0
+        self.lookup_cache_size = lookup_cache_size
         self.set_dicts(dicts)
+        self.merged_index = merged_index
+
+    @property
+    def merged_index(self):
+        return self._merged_index
+
+    @merged_index.setter
+    def merged_index(self, enabled):
+        '''Enable/disable the merged index.
+
+        If enabled, lookups go through a merged view of all the enabled
+        dictionaries, mapping each key to its `(value, dictionary)` entries
+        in priority order, instead of walking the dictionaries. The view
+        is built in the background (see `build_merged_index`).
+        '''
+        if enabled == self._merged_index:
+            return
+        self._merged_index = enabled
+        self._reset_merged()
+
+    @property
+    def lookup_cache_size(self):
+        return self._lookup_cache_size
+
+    @lookup_cache_size.setter
+    def lookup_cache_size(self, size):
+        '''Set the maximum number of entries in the lookup cache.
+
+        A size of 0 disables the cache.
+        '''
+        if size == self._lookup_cache_size:
+            return
+        self._lookup_cache_size = size
+        self._lookup_cache = collections.OrderedDict() if size else None
+        self.lookup_cache_hits = 0
+        self.lookup_cache_misses = 0
 
     def set_dicts(self, dicts):
         for d in self.dicts:
             d.remove_longest_key_listener(self._longest_key_listener)
+            d.remove_change_listener(self._dictionary_changed)
         self.dicts = dicts[:]
         for d in self.dicts:
             d.add_longest_key_listener(self._longest_key_listener)
+            d.add_change_listener(self._dictionary_changed)
+        self._reset_merged()
         self._longest_key_listener()
+        self._notify_change()
+
+    def _reset_merged(self):
+        with self._merged_lock:
+            self._merged = None
+            self._merged_generation += 1
+        if self._merged_index:
+            self.build_merged_index(background=True)
+
+    def build_merged_index(self, background=False):
+        '''Build the merged index, if enabled (see `merged_index`).
+
+        Until it's ready, lookups walk the dictionaries. Once built,
+        the index is kept up to date on changes, and rebuilt in the
+        background when all the entries may have changed (e.g. when
+        changing the list of dictionaries).
+        '''
+        if background:
+            threading.Thread(target=self.build_merged_index, daemon=True).start()
+            return
+        while True:
+            with self._merged_lock:
+                if self._merged is not None or not self._merged_index:
+                    return
+                generation = self._merged_generation
+            merged = self._build_merged()
+            with self._merged_lock:
+                # Start over if something changed in the meantime.
+                if generation == self._merged_generation:
+                    self._merged = merged
+                    return
+
+    def _build_merged(self):
+        merged = {}
+        # The entries of dictionaries that are not indexable cannot
+        # be enumerated: those are queried on lookup instead.
+        unindexed = []
+        for n, d in enumerate(self.dicts):
+            if not d.enabled:
+                continue
+            if not d.indexable:
+                unindexed.append((n, d))
+                continue
+            for key, value in d.items_snapshot():
+                if value:
+                    merged[key] = merged.get(key, ()) + ((value, d),)
+        return merged, tuple(unindexed)
+
+    def _merged_entries(self, merged, key):
+        merged, unindexed = merged
+        entries = merged.get(key, ())
+        if not unindexed:
+            return entries
+        key_len = len(key)
+        extra = []
+        for n, d in unindexed:
+            if key_len > d.longest_key:
+                continue
+            value = d.get(key)
+            if value:
+                extra.append((n, value, d))
+        if not extra:
+            return entries
+        # Restore the priority order.
+        priorities = {id(d): n for n, d in enumerate(self.dicts)}
+        extra.extend((priorities[id(d)], value, d) for value, d in entries)
+        extra.sort(key=lambda entry: entry[0])
+        return tuple((value, d) for __, value, d in extra)
+
+    def _dictionary_changed(self, dictionary, key):
+        self._update_merged(dictionary, key)
+        self._notify_change(key)
+
+    def _update_merged(self, dictionary, key):
+        if key is None:
+            # Too many changes, rebuild.
+            self._reset_merged()
+            return
+        with self._merged_lock:
+            merged = self._merged
+            if merged is None:
+                # Make sure a build in progress takes the change into account.
+                self._merged_generation += 1
+                return
+        merged = merged[0]
+        if not dictionary.enabled:
+            return
+        entries = []
+        for d in self.dicts:
+            if not d.enabled or not d.indexable:
+                continue
+            value = d.get(key)
+            if value:
+                entries.append((value, d))
+        if entries:
+            merged[key] = tuple(entries)
+        else:
+            merged.pop(key, None)
 
     def _lookup(self, key, dicts=None, filters=()):
-        if dicts is None:
-            dicts = self.dicts
         key_len = len(key)
         if key_len > self.longest_key:
             return None
+        if dicts is None:
+            merged = self._merged
+            if merged is not None:
+                for value, d in self._merged_entries(merged, key):
+                    if not any(f(key, value) for f in filters):
+                        return value
+                return None
+            dicts = self.dicts
         for d in dicts:
             if not d.enabled:
                 continue
@@ -221,11 +1338,18 @@ class StenoDictionaryCollection:
 
         Returns list of (value, dictionary) tuples
         '''
-        if dicts is None:
-            dicts = self.dicts
         key_len = len(key)
         if key_len > self.longest_key:
             return None
+        if dicts is None:
+            merged = self._merged
+            if merged is not None:
+                return [
+                    (value, d)
+                    for value, d in self._merged_entries(merged, key)
+                    if not any(f(key, value) for f in filters)
+                ]
+            dicts = self.dicts
         values = []
         for d in dicts:
             if not d.enabled:
@@ -245,7 +1369,45 @@ class StenoDictionaryCollection:
         return str(self)
 
     def lookup(self, key):
-        return self._lookup(key, filters=self.filters)
+        cache = self._lookup_cache
+        if cache is None:
+            return self._lookup(key, filters=self.filters)
+        with self._lookup_cache_lock:
+            try:
+                value = cache[key]
+            except KeyError:
+                generation = self._lookup_cache_generation
+            else:
+                self.lookup_cache_hits += 1
+                cache.move_to_end(key)
+                return value
+        value = self._lookup(key, filters=self.filters)
+        with self._lookup_cache_lock:
+            self.lookup_cache_misses += 1
+            # Don't cache the result if a change was made in the meantime.
+            if generation == self._lookup_cache_generation:
+                cache[key] = value
+                if len(cache) > self._lookup_cache_size:
+                    cache.popitem(last=False)
+        return value
+
+    def has_prefix(self, key):
+        '''Return True if <key> is a proper prefix of a key
+        in at least one of the enabled dictionaries.
+
+        Note: filters are not taken into account.
+        '''
+        key_len = len(key)
+        if key_len >= self.longest_key:
+            return False
+        for d in self.dicts:
+            if not d.enabled:
+                continue
+            if key_len >= d.longest_key:
+                continue
+            if d.has_prefix(key):
+                return True
+        return False
 
     def raw_lookup(self, key):
         return self._lookup(key)
@@ -256,15 +1418,25 @@ class StenoDictionaryCollection:
     def raw_lookup_from_all(self, key):
         return self._lookup_from_all(key)
 
-    def reverse_lookup(self, value):
-        keys = set()
+    def entries(self):
+        '''Iterate over the entries of the collection, respecting priority.
+
+        Only the (key, translation) pairs that `lookup` would return are
+        produced, on the fly, without building a merged dictionary first.
+        '''
         for n, d in enumerate(self.dicts):
             if not d.enabled:
                 continue
-            # Ignore key if it's overridden by a higher priority dictionary.
-            keys.update(k for k in d.reverse_lookup(value)
-                        if self._lookup(k, dicts=self.dicts[:n]) is None)
-        return keys
+            higher_dicts = self.dicts[:n]
+            for key, value in d.items():
+                if not value or any(f(key, value) for f in self.filters):
+                    continue
+                # Ignore key if it's overridden by a higher priority dictionary.
+                if self._lookup(key, dicts=higher_dicts, filters=self.filters) is None:
+                    yield key, value
+
+    def reverse_lookup(self, value):
+        return self._snapshot.reverse_lookup(value)
 
     def casereverse_lookup(self, value):
         keys = set()
@@ -274,6 +1446,11 @@ class StenoDictionaryCollection:
             keys.update(d.casereverse_lookup(value))
         return keys
 
+    def search_translations(self, pattern, substring=False,
+                            ignore_case=False, count=None):
+        return self._snapshot.search_translations(pattern, substring,
+                                                  ignore_case, count)
+
     def first_writable(self):
         '''Return the first writable dictionary.'''
         for d in self.dicts:
@@ -317,9 +1494,50 @@ class StenoDictionaryCollection:
 
     def add_filter(self, f):
         self.filters.append(f)
+        self._notify_change()
 
     def remove_filter(self, f):
         self.filters.remove(f)
+        self._notify_change()
+
+    def snapshot(self):
+        """Return an immutable view of the collection's current state.
+
+        See `StenoDictionaryCollectionSnapshot`: the snapshot is only
+        replaced (atomically) when the list of enabled dictionaries
+        or the filters change, so it's cheap to call.
+
+        """
+        return self._snapshot
+
+    def _notify_change(self, key=None):
+        if key is None:
+            self._snapshot = StenoDictionaryCollectionSnapshot(self.dicts, self.filters)
+        else:
+            self._snapshot._update_reverse_index(key)
+        cache = self._lookup_cache
+        if cache is not None:
+            with self._lookup_cache_lock:
+                self._lookup_cache_generation += 1
+                if key is None:
+                    cache.clear()
+                else:
+                    cache.pop(key, None)
+        for callback in self._change_listener_callbacks:
+            callback(key)
+
+    def add_change_listener(self, callback):
+        """Add a listener for changes to the collection's entries.
+
+        <callback> is called with the changed key, or None if potentially
+        all entries changed (e.g. when one of the dictionaries is cleared,
+        or when changing the list of dictionaries or the filters).
+
+        """
+        self._change_listener_callbacks.add(callback)
+
+    def remove_change_listener(self, callback):
+        self._change_listener_callbacks.remove(callback)
 
     def add_longest_key_listener(self, callback):
         self.longest_key_callbacks.add(callback)
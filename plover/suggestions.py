@@ -1,4 +1,5 @@
 import collections
+import threading
 
 from plover.steno import sort_steno_strokes
 
@@ -7,10 +8,38 @@ Suggestion = collections.namedtuple('Suggestion', 'text steno_list')
 
 
 class Suggestions:
-    def __init__(self, dictionary):
+    def __init__(self, dictionary, cache_size=0):
         self.dictionary = dictionary
+        # Optional LRU cache of `find` results: the dictionary must not
+        # change while it's in use (create a new instance instead).
+        self._cache = collections.OrderedDict() if cache_size else None
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
 
     def find(self, translation):
+        cache = self._cache
+        if cache is None:
+            return self._find(translation)
+        with self._cache_lock:
+            suggestions = cache.get(translation)
+            if suggestions is not None:
+                cache.move_to_end(translation)
+                return list(suggestions)
+        suggestions = self._find(translation)
+        with self._cache_lock:
+            cache[translation] = tuple(suggestions)
+            if len(cache) > self._cache_size:
+                cache.popitem(last=False)
+        return suggestions
+
+    def find_many(self, translations):
+        '''Return the suggestions for all of <translations>, in order.'''
+        suggestions = []
+        for translation in translations:
+            suggestions.extend(self.find(translation))
+        return suggestions
+
+    def _find(self, translation):
         suggestions = []
 
         mods = [
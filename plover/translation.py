@@ -19,7 +19,7 @@ emits one or more Translation objects based on a greedy conversion algorithm.
 from collections import namedtuple
 import re
 
-from plover.steno import Stroke
+from plover.steno import Stroke, keys_to_mask
 from plover.steno_dictionary import StenoDictionaryCollection
 from plover.registry import registry
 from plover import system
@@ -27,6 +27,9 @@ from plover import system
 
 PREFIX_STROKE = Stroke(())
 
+# Maximum number of strokes for which the suffix folded variants are cached.
+SUFFIX_FOLDS_CACHE_SIZE = 4096
+
 _ESCAPE_RX = re.compile('(\\\\[nrt]|[\n\r\t])')
 _ESCAPE_REPLACEMENTS = {
     '\n': r'\n',
@@ -195,6 +198,17 @@ class Translator:
     def __init__(self):
         self._undo_length = 0
         self._dictionary = None
+        # Suffix folding: the suffix keys the table was built for (and
+        # the corresponding system), the mask of all the suffix keys,
+        # and a list of `(key_mask, suffix_dict_key)` for each of them.
+        self._suffixes = None
+        self._suffixes_system = None
+        self._suffixes_mask = 0
+        self._suffixes_table = ()
+        # Stroke mask -> suffix folded variants (see `_suffix_folds`).
+        self._suffix_folds_cache = {}
+        # Suffix dictionary key -> mapping.
+        self._suffix_mappings = {}
         self.set_dictionary(StenoDictionaryCollection())
         self._listeners = set()
         self._state = _State()
@@ -211,8 +225,11 @@ class Translator:
         callback = self._dict_callback
         if self._dictionary:
             self._dictionary.remove_longest_key_listener(callback)
+            self._dictionary.remove_change_listener(self._dict_changed)
         self._dictionary = d
         d.add_longest_key_listener(callback)
+        d.add_change_listener(self._dict_changed)
+        self._suffix_mappings.clear()
 
     def get_dictionary(self):
         return self._dictionary
@@ -278,6 +295,10 @@ class Translator:
     def _dict_callback(self, value):
         self._resize_translations()
 
+    def _dict_changed(self, key):
+        if key is None or key in self._suffix_mappings:
+            self._suffix_mappings.clear()
+
     def get_state(self):
         """Get the state of the translator."""
         return self._state
@@ -327,14 +348,14 @@ class Translator:
 
     def _undo(self, *translations):
         for t in reversed(translations):
-            assert t == self._state.translations.pop()
+            assert t == self._state.pop()
             if self._to_do:
                 self._to_do -= 1
             else:
                 self._to_undo.insert(0, t)
 
     def _do(self, *translations):
-        self._state.translations.extend(translations)
+        self._state.push(*translations)
         self._to_do += len(translations)
 
     def _find_translation_helper(self, stroke, suffixes=()):
@@ -364,26 +385,66 @@ class Translator:
 
     def lookup(self, strokes, suffixes=()):
         dict_key = tuple(s.rtfcre for s in strokes)
+        if len(dict_key) > 1 and not self._dictionary.has_prefix(dict_key[:-1]):
+            # No entry can start with those strokes: neither
+            # the key nor its suffix folded variants can match.
+            return None
         result = self._dictionary.lookup(dict_key)
         if result is not None:
             return result
-        for key in suffixes:
-            if key in strokes[-1].steno_keys:
-                dict_key = (Stroke([key]).rtfcre,)
-                suffix_mapping = self._dictionary.lookup(dict_key)
-                if suffix_mapping is None:
-                    continue
-                keys = strokes[-1].steno_keys[:]
-                keys.remove(key)
-                copy = strokes[:]
-                copy[-1] = Stroke(keys)
-                dict_key = tuple(s.rtfcre for s in copy)
-                main_mapping = self._dictionary.lookup(dict_key)
-                if main_mapping is None:
-                    continue
-                return main_mapping + ' ' + suffix_mapping
+        if not suffixes:
+            return None
+        for main_rtfcre, suffix_key in self._suffix_folds(strokes[-1], suffixes):
+            try:
+                suffix_mapping = self._suffix_mappings[suffix_key]
+            except KeyError:
+                suffix_mapping = self._dictionary.lookup(suffix_key)
+                self._suffix_mappings[suffix_key] = suffix_mapping
+            if suffix_mapping is None:
+                continue
+            main_mapping = self._dictionary.lookup(dict_key[:-1] + (main_rtfcre,))
+            if main_mapping is None:
+                continue
+            return main_mapping + ' ' + suffix_mapping
         return None
 
+    def _suffix_folds(self, stroke, suffixes):
+        """Return the suffix folded variants of <stroke>.
+
+        A tuple of `(main_rtfcre, suffix_dict_key)`, one for each of
+        the keys in <suffixes> present in the stroke, with the RTFCRE of
+        the stroke minus that key, and the dictionary key for the suffix.
+
+        """
+        if suffixes is not self._suffixes or \
+           system.KEY_ORDER is not self._suffixes_system:
+            suffixes_mask = 0
+            suffixes_table = []
+            for key in suffixes:
+                key_mask = keys_to_mask((key,))
+                suffixes_mask |= key_mask
+                suffixes_table.append((key_mask, (Stroke(key_mask).rtfcre,)))
+            self._suffixes = suffixes
+            self._suffixes_system = system.KEY_ORDER
+            self._suffixes_mask = suffixes_mask
+            self._suffixes_table = suffixes_table
+            self._suffix_folds_cache.clear()
+            self._suffix_mappings.clear()
+        mask = stroke.mask
+        if not mask & self._suffixes_mask:
+            return ()
+        folds = self._suffix_folds_cache.get(mask)
+        if folds is None:
+            folds = tuple(
+                (Stroke(mask & ~key_mask).rtfcre, suffix_key)
+                for key_mask, suffix_key in self._suffixes_table
+                if mask & key_mask
+            )
+            if len(self._suffix_folds_cache) >= SUFFIX_FOLDS_CACHE_SIZE:
+                self._suffix_folds_cache.clear()
+            self._suffix_folds_cache[mask] = folds
+        return folds
+
     def _previous_word_is_finished(self, last_translations):
         if not last_translations:
             return True
@@ -413,6 +474,38 @@ class _State:
     def __init__(self):
         self.translations = []
         self.tail = None
+        # Number of strokes in `translations`, as `(list, length, count)`:
+        # only valid for that same list, as long as its length matches
+        # (see `push`/`pop`, and `restrict_size`).
+        self._stroke_count = None
+
+    def _cached_stroke_count(self):
+        cache = self._stroke_count
+        if cache is None:
+            return None
+        translations, length, count = cache
+        if translations is not self.translations or \
+           length != len(translations):
+            return None
+        return count
+
+    def _set_stroke_count(self, count):
+        self._stroke_count = (self.translations, len(self.translations), count)
+
+    def push(self, *translations):
+        """Add new translations."""
+        count = self._cached_stroke_count()
+        self.translations.extend(translations)
+        if count is not None:
+            self._set_stroke_count(count + sum(map(len, translations)))
+
+    def pop(self):
+        """Remove and return the last translation."""
+        count = self._cached_stroke_count()
+        t = self.translations.pop()
+        if count is not None:
+            self._set_stroke_count(count - len(t))
+        return t
 
     def prev(self, count=None):
         """Get the most recent translations."""
@@ -428,14 +521,22 @@ class _State:
 
     def restrict_size(self, n):
         """Reduce the history of translations to n."""
-        stroke_count = 0
-        translation_count = 0
-        for t in reversed(self.translations):
-            stroke_count += len(t)
-            translation_count += 1
-            if stroke_count >= n:
+        translations = self.translations
+        stroke_count = self._cached_stroke_count()
+        if stroke_count is None:
+            stroke_count = sum(map(len, translations))
+        # Drop the oldest translations, as long as the remaining
+        # ones still hold at least n strokes (but always keep the
+        # last one): thanks to the cached count of strokes, this
+        # only costs the number of translations dropped.
+        translation_index = 0
+        while translation_index < len(translations) - 1:
+            length = len(translations[translation_index])
+            if stroke_count - length < n:
                 break
-        translation_index = len(self.translations) - translation_count
+            stroke_count -= length
+            translation_index += 1
         if translation_index:
-            self.tail = self.translations[translation_index - 1]
-        del self.translations[:translation_index]
+            self.tail = translations[translation_index - 1]
+            del translations[:translation_index]
+        self._set_stroke_count(stroke_count)
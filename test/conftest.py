@@ -11,3 +11,24 @@ def setup_plover():
     system.setup(DEFAULT_SYSTEM_NAME)
 
 pytest.register_assert_rewrite('plover_build_utils.testing')
+
+
+def pytest_addoption(parser):
+    parser.addoption('--benchmark', action='store_true',
+                     help='run benchmarks (tests marked with `benchmark`)')
+    parser.addoption('--benchmark-stroke-log', action='append', default=[],
+                     metavar='PATH', help='stroke log to replay in the '
+                     'translation benchmarks (can be used multiple times)')
+    parser.addoption('--benchmark-json', metavar='PATH',
+                     help='save the translation benchmarks results to PATH')
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'benchmark: benchmark, only run with --benchmark')
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--benchmark'):
+        return
+    skip = pytest.mark.skip(reason='need --benchmark option to run')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1,135 @@
+"""Tests for dictionary_editor.py."""
+
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from PyQt5.QtCore import QCoreApplication, QModelIndex, Qt
+
+from plover.gui_qt.dictionary_editor import (
+    DictionaryItemModel,
+    _COL_STENO,
+    _COL_TRANS,
+)
+from plover.steno_dictionary import StenoDictionary
+
+
+@pytest.fixture(scope='module', autouse=True)
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+def make_dict(path, entries):
+    d = StenoDictionary()
+    d.path = path
+    d.update(entries)
+    return d
+
+
+def open_model(dictionary_list, sort_column=_COL_STENO,
+               sort_order=Qt.AscendingOrder):
+    model = DictionaryItemModel(dictionary_list, sort_column, sort_order)
+    wait_for_indexes(model)
+    return model
+
+
+def wait_for_indexes(model):
+    while model.loading:
+        model._loading_thread.join()
+        QCoreApplication.processEvents()
+
+
+def fetch_all(model):
+    while model.canFetchMore(QModelIndex()):
+        model.fetchMore(QModelIndex())
+    return [
+        (model.data(model.index(row, _COL_STENO), Qt.DisplayRole),
+         model.data(model.index(row, _COL_TRANS), Qt.DisplayRole))
+        for row in range(model.rowCount(QModelIndex()))
+    ]
+
+
+ENTRIES = {
+    ('A',): 'a',
+    ('PW',): 'b',
+    ('KR',): 'c',
+    ('TK',): 'd',
+    ('E',): 'e',
+    ('TP',): 'f',
+}
+
+
+def test_indexes_built_in_background():
+    d = make_dict('main.json', ENTRIES)
+    model = DictionaryItemModel([d], _COL_TRANS, Qt.AscendingOrder)
+    # No rows until the indexes are ready, filtering still works.
+    model.filter(translation_filter='b')
+    assert model.rowCount(QModelIndex()) == 0
+    wait_for_indexes(model)
+    # Only the necessary index is built.
+    assert not d.has_search_index(strokes=True)
+    assert d.has_search_index(strokes=False)
+    assert fetch_all(model) == [('PW', 'b')]
+    # Sorting on another column needs another index.
+    model.filter()
+    model.sort(_COL_STENO, Qt.AscendingOrder)
+    assert model.loading
+    wait_for_indexes(model)
+    assert d.has_search_index(strokes=True)
+    assert [strokes for strokes, translation in fetch_all(model)] == \
+            sorted('/'.join(strokes) for strokes in ENTRIES)
+    # The indexes are released when done.
+    model.release_indexes()
+    assert not d.has_search_index(strokes=True)
+    assert not d.has_search_index(strokes=False)
+
+
+def test_existing_indexes_are_kept():
+    d = make_dict('main.json', ENTRIES)
+    d.build_search_indexes()
+    model = DictionaryItemModel([d], _COL_TRANS, Qt.AscendingOrder)
+    # No need to wait.
+    assert not model.loading
+    assert len(fetch_all(model)) == len(ENTRIES)
+    model.release_indexes()
+    assert d.has_search_index(strokes=True)
+    assert d.has_search_index(strokes=False)
+
+
+def test_open_after_edit():
+    d = make_dict('main.json', ENTRIES)
+    model = open_model([d], _COL_TRANS)
+    model.setData(model.index(0, _COL_TRANS), 'z')
+    model.setData(model.index(1, _COL_STENO), 'S')
+    del d[('TP',)]
+    d[('H',)] = 'h'
+    # The indexes are up to date when reopening.
+    model = open_model([d], _COL_TRANS)
+    assert fetch_all(model) == [
+        ('S', 'b'),
+        ('KR', 'c'),
+        ('TK', 'd'),
+        ('E', 'e'),
+        ('H', 'h'),
+        ('A', 'z'),
+    ]
+
+
+@pytest.mark.parametrize('new_strokes', ('TP', 'W'))
+def test_no_duplicate_rows_after_edit(monkeypatch, new_strokes):
+    monkeypatch.setattr(DictionaryItemModel, 'FETCH_SIZE', 2)
+    d = make_dict('main.json', ENTRIES)
+    model = open_model([d])
+    assert model.rowCount(QModelIndex()) == 2
+    # Change the first row to an entry that has not been fetched yet.
+    assert model.setData(model.index(0, _COL_STENO), new_strokes)
+    assert model.setData(model.index(0, _COL_TRANS), 'x')
+    rows = fetch_all(model)
+    assert rows[0] == (new_strokes, 'x')
+    assert len(rows) == len(set(strokes for strokes, translation in rows))
+    assert sorted(rows) == sorted(('/'.join(strokes), translation)
+                                  for strokes, translation in d.items())
+    # A reset lists the entry again.
+    model.sort(_COL_TRANS, Qt.AscendingOrder)
+    wait_for_indexes(model)
+    assert fetch_all(model)[-1] == (new_strokes, 'x')
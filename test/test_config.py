@@ -130,7 +130,21 @@ DEFAULTS = {
     'machine_specific_options': { 'arpeggiate': False },
     'system_name': config.DEFAULT_SYSTEM_NAME,
     'system_keymap': DEFAULT_KEYMAP,
-    'dictionaries': [DictionaryConfig(p) for p in english_stenotype.DEFAULT_DICTIONARIES]
+    'dictionaries': [DictionaryConfig(p) for p in english_stenotype.DEFAULT_DICTIONARIES],
+    'cache_dictionaries': False,
+    'dictionary_loading_processes': 0,
+    'prebuild_reverse_index': False,
+    'prebuild_search_indexes': False,
+    'prune_multistroke_lookups': False,
+    'compact_dictionary_storage': False,
+    'journaled_dictionary_saves': False,
+    'dictionary_save_delay': 0,
+    'dictionary_lookup_cache_size': 0,
+    'merged_dictionary_index': False,
+    'enable_latency_probes': False,
+    'latency_log_interval': 60,
+    'hook_slow_threshold': 0,
+    'asynchronous_hooks': False,
 }
 
 CONFIG_TESTS = (
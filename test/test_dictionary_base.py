@@ -0,0 +1,87 @@
+"""Tests for dictionary/base.py."""
+
+import threading
+import time
+
+from plover.dictionary.base import SaveScheduler
+from plover.steno_dictionary import StenoDictionary
+
+
+class FakeDictionary(StenoDictionary):
+
+    def __init__(self, fail=False):
+        super().__init__()
+        self.path = 'fake.json'
+        self.fail = fail
+        self.saves = 0
+        self.saving = threading.Event()
+        self.can_save = threading.Event()
+        self.can_save.set()
+
+    def save(self):
+        self.saving.set()
+        self.can_save.wait()
+        self.saves += 1
+        if self.fail:
+            raise IOError('save failed')
+
+
+def test_save_scheduler():
+    d = FakeDictionary()
+    scheduler = SaveScheduler.install(d)
+    assert d.save_scheduler is scheduler
+    notifications = []
+    scheduler.add_listener(lambda *args: notifications.append(args))
+    # Nothing to do.
+    scheduler.flush()
+    assert d.saves == 0
+    # Simple save.
+    d.save()
+    scheduler.flush()
+    assert d.saves == 1
+    assert len(notifications) == 1
+    dictionary, duration, exception = notifications[0]
+    assert dictionary is d
+    assert duration >= 0
+    assert exception is None
+    # Requests made during a save are coalesced into a single save.
+    d.can_save.clear()
+    d.saving.clear()
+    d.save()
+    d.saving.wait()
+    for __ in range(10):
+        d.save()
+    d.can_save.set()
+    scheduler.flush()
+    assert d.saves == 3
+    assert len(notifications) == 3
+
+
+def test_save_scheduler_delay():
+    d = FakeDictionary()
+    scheduler = SaveScheduler.install(d, delay=60)
+    for __ in range(10):
+        d.save()
+    time.sleep(0.1)
+    assert d.saves == 0
+    # Flushing does not wait for the delay.
+    scheduler.flush()
+    assert d.saves == 1
+
+
+def test_save_scheduler_failure():
+    d = FakeDictionary(fail=True)
+    scheduler = SaveScheduler.install(d)
+    notifications = []
+    scheduler.add_listener(lambda *args: notifications.append(args))
+    d.save()
+    scheduler.flush()
+    assert d.saves == 1
+    assert len(notifications) == 1
+    assert isinstance(notifications[0][2], IOError)
+    # The scheduler is still usable.
+    d.fail = False
+    d.save()
+    scheduler.flush()
+    assert d.saves == 2
+    assert notifications[1][2] is None
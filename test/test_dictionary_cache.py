@@ -0,0 +1,172 @@
+"""Tests for dictionary/cache.py."""
+
+import os
+import types
+
+import pytest
+
+from plover.dictionary import cache as dictionary_cache
+from plover.dictionary.cache import DictionaryCache, MappedStorage, write_cache
+from plover.dictionary.json_dict import JsonDictionary
+
+from plover_build_utils.testing import make_dict
+
+
+ENTRIES = {
+    ('TEFT',): 'test',
+    ('TEFT', '-G'): 'testing',
+    ('KAFR',): 'café',
+    ('-G',): '{^ing}',
+    ('S', 'T', 'R'): 'str',
+}
+
+
+class SynchronousThread:
+
+    def __init__(self, target, args=(), kwargs={}, daemon=None):
+        self._target = target
+        self._args = args
+        self._kwargs = kwargs
+
+    def start(self):
+        self._target(*self._args, **self._kwargs)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(dictionary_cache, 'threading',
+                        types.SimpleNamespace(Thread=SynchronousThread))
+    return DictionaryCache(str(tmp_path / 'cache'))
+
+
+def test_mapped_storage(tmp_path):
+    cache_file = str(tmp_path / 'test.cache')
+    write_cache(cache_file, b'signature', ENTRIES.items())
+    storage = MappedStorage.open(cache_file)
+    assert storage.signature == b'signature'
+    assert storage.longest_key == 3
+    assert len(storage) == len(ENTRIES)
+    assert sorted(storage) == sorted(ENTRIES)
+    assert sorted(storage.items()) == sorted(ENTRIES.items())
+    for k, v in ENTRIES.items():
+        assert k in storage
+        assert storage[k] == v
+        assert storage.get(k) == v
+    for k in (('TEFT', '-S'), ('-G', 'TEFT'), (), 'TEFT', ('S', 'T')):
+        assert k not in storage
+        assert storage.get(k, 42) == 42
+        with pytest.raises(KeyError):
+            storage[k]
+
+
+def test_mapped_storage_lookup_cache(tmp_path, monkeypatch):
+    cache_file = str(tmp_path / 'test.cache')
+    write_cache(cache_file, b'', ENTRIES.items())
+    storage = MappedStorage.open(cache_file)
+    monkeypatch.setattr(storage, 'LOOKUP_CACHE_SIZE', 2)
+    finds = []
+    find = storage._find
+    monkeypatch.setattr(storage, '_find', lambda key: finds.append(key) or find(key))
+    # Hits and misses are both cached.
+    for __ in range(2):
+        assert storage.get(('TEFT',)) == 'test'
+        assert storage.get(('TEFT', '-S')) is None
+    assert finds == [('TEFT',), ('TEFT', '-S')]
+    assert ('TEFT', '-S') not in storage
+    assert len(finds) == 2
+    # The cache is reset once full.
+    assert storage[('-G',)] == '{^ing}'
+    assert storage.get(('TEFT',)) == 'test'
+    assert finds == [('TEFT',), ('TEFT', '-S'), ('-G',), ('TEFT',)]
+
+
+def test_mapped_storage_empty(tmp_path):
+    cache_file = str(tmp_path / 'test.cache')
+    write_cache(cache_file, b'', ())
+    storage = MappedStorage.open(cache_file)
+    assert len(storage) == 0
+    assert list(storage.items()) == []
+    assert storage.get(('S',)) is None
+
+
+def test_dictionary_cache(tmp_path, cache):
+    contents = ('{%s}' % ', '.join(
+        '"%s": "%s"' % ('/'.join(k), v)
+        for k, v in ENTRIES.items()
+    )).encode('utf-8')
+    with make_dict(tmp_path, contents, 'json') as dict_path:
+        dict_path = str(dict_path)
+        cache_path = cache.cache_path(dict_path)
+        # First load: no cache yet, it's created.
+        d = cache.load(JsonDictionary, dict_path)
+        assert not d._dict.frozen
+        assert os.path.exists(cache_path)
+        # Second load: from the cache.
+        d = cache.load(JsonDictionary, dict_path)
+        assert d._dict.frozen
+        assert d.path == dict_path
+        assert d.timestamp == os.path.getmtime(dict_path)
+        assert d.longest_key == 3
+        assert sorted(d.items()) == sorted(ENTRIES.items())
+        assert d[('TEFT', '-G')] == 'testing'
+        assert d.reverse_lookup('testing') == {('TEFT', '-G')}
+        assert d.casereverse_lookup('café') == {'café'}
+        assert d.has_prefix(('S', 'T'))
+        # Changing a dictionary loaded from the cache.
+        d[('TEFT', '-D')] = 'tested'
+        assert not d._dict.frozen
+        assert d[('TEFT', '-D')] == 'tested'
+        assert d.reverse_lookup('testing') == {('TEFT', '-G')}
+        d.save()
+        # The cache is outdated: the dictionary is parsed again.
+        d = cache.load(JsonDictionary, dict_path)
+        assert not d._dict.frozen
+        assert d[('TEFT', '-D')] == 'tested'
+        d = cache.load(JsonDictionary, dict_path)
+        assert d._dict.frozen
+        assert d[('TEFT', '-D')] == 'tested'
+        # Invalid cache file.
+        with open(cache_path, 'wb') as fp:
+            fp.write(b'invalid')
+        d = cache.load(JsonDictionary, dict_path)
+        assert not d._dict.frozen
+        assert d[('TEFT', '-D')] == 'tested'
+
+
+def test_dictionary_cache_changes_before_update(tmp_path, monkeypatch):
+    # The cache is updated in the background: changes
+    # made in the meantime must not end up in it.
+    updates = []
+    class DeferredThread(SynchronousThread):
+        def start(self):
+            updates.append(super().start)
+    monkeypatch.setattr(dictionary_cache, 'threading',
+                        types.SimpleNamespace(Thread=DeferredThread))
+    cache = DictionaryCache(str(tmp_path / 'cache'))
+    with make_dict(tmp_path, b'{"TEFT": "test"}', 'json') as dict_path:
+        dict_path = str(dict_path)
+        d = cache.load(JsonDictionary, dict_path)
+        d[('TEFT',)] = 'changed'
+        d[('-G',)] = '{^ing}'
+        update, = updates
+        update()
+        d = cache.load(JsonDictionary, dict_path)
+        assert d._dict.frozen
+        assert dict(d.items()) == {('TEFT',): 'test'}
+
+
+def test_dictionary_cache_prune(tmp_path, cache):
+    with \
+            make_dict(tmp_path, b'{"TEFT": "test"}', 'json') as d1, \
+            make_dict(tmp_path, b'{"S": "is"}', 'json') as d2:
+        d1, d2 = str(d1), str(d2)
+        for dict_path in (d1, d2):
+            cache.load(JsonDictionary, dict_path)
+        other_file = tmp_path / 'cache' / 'other.txt'
+        other_file.write_text('keep me')
+        cache.prune([d2])
+        assert not os.path.exists(cache.cache_path(d1))
+        assert os.path.exists(cache.cache_path(d2))
+        assert other_file.exists()
+    # Nothing to prune.
+    DictionaryCache(str(tmp_path / 'missing')).prune([])
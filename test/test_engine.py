@@ -2,12 +2,14 @@ from functools import partial
 from unittest.mock import MagicMock
 import os
 import tempfile
+import threading
+import time
 
 import pytest
 
 from plover import system
 from plover.config import Config, DictionaryConfig
-from plover.engine import ErroredDictionary, StenoEngine
+from plover.engine import ErroredDictionary, HookDispatcher, StenoEngine
 from plover.machine.base import (
     STATE_INITIALIZING,
     STATE_RUNNING,
@@ -18,7 +20,8 @@ from plover.machine.keymap import Keymap
 from plover.misc import normalize_path
 from plover.oslayer.controller import Controller
 from plover.registry import Registry
-from plover.steno_dictionary import StenoDictionaryCollection
+from plover.steno_dictionary import StenoDictionary, StenoDictionaryCollection
+from plover.suggestions import Suggestion
 
 from plover_build_utils.testing import make_dict
 
@@ -170,6 +173,9 @@ def test_engine(engine):
 
 def test_loading_dictionaries(tmp_path, engine):
     def check_loaded_events(actual_events, expected_events):
+        # Note: progress events are sent from the loading threads.
+        actual_events = [event for event in actual_events
+                         if event[0] != 'dictionary_loading_progress']
         assert len(actual_events) == len(expected_events)
         for n, event in enumerate(actual_events):
             event_type, event_args, event_kwargs = event
@@ -246,3 +252,229 @@ def test_loading_dictionaries(tmp_path, engine):
             (valid_dict_1, False, False),
             (invalid_dict_2, True, True),
         ]])
+
+def test_dictionary_loading_progress(tmp_path, engine):
+    contents = b'{"TEFT": "test", "TEFTS": "tests"}'
+    with make_dict(tmp_path, contents, 'json') as dict_path:
+        dict_path = normalize_path(str(dict_path))
+        engine.start()
+        engine.events.clear()
+        engine.config = {'dictionaries': [DictionaryConfig(dict_path)]}
+        progress = [args for hook, args, kwargs in engine.events
+                    if hook == 'dictionary_loading_progress']
+        assert progress
+        assert all(filename == dict_path for filename, done, total in progress)
+        assert progress[-1] == (dict_path, len(contents), len(contents))
+
+def test_prebuild_reverse_index(tmp_path, engine):
+    with make_dict(tmp_path, b'{"TEFT": "test"}', 'json') as dict_path:
+        dict_path = normalize_path(str(dict_path))
+        engine.start()
+        engine.config = {
+            'dictionaries': [DictionaryConfig(dict_path)],
+            'prebuild_reverse_index': True,
+        }
+        d = engine.dictionaries[dict_path]
+        # The reverse index is built in the background after loading.
+        for __ in range(100):
+            if d._reverse_index is not None:
+                break
+            time.sleep(0.01)
+        assert d._reverse_index is not None
+        assert engine.reverse_lookup('test') == {('TEFT',)}
+
+def test_prebuild_search_indexes(tmp_path, engine):
+    with make_dict(tmp_path, b'{"TEFT": "test"}', 'json') as dict_path:
+        dict_path = normalize_path(str(dict_path))
+        engine.start()
+        engine.config = {
+            'dictionaries': [DictionaryConfig(dict_path)],
+            'prebuild_search_indexes': True,
+        }
+        d = engine.dictionaries[dict_path]
+        # The search indexes are built in the background after loading.
+        for __ in range(100):
+            if d._strokes_index is not None and d._translations_index is not None:
+                break
+            time.sleep(0.01)
+        assert d._strokes_index is not None
+        assert d._translations_index is not None
+        assert engine.search_translations('te') == ['test']
+
+def test_prune_multistroke_lookups(tmp_path, engine):
+    with make_dict(tmp_path, b'{"TEFT/-G": "testing"}', 'json') as dict_path:
+        dict_path = normalize_path(str(dict_path))
+        engine.start()
+        engine.config = {
+            'dictionaries': [DictionaryConfig(dict_path)],
+            'prune_multistroke_lookups': True,
+        }
+        d = engine.dictionaries[dict_path]
+        # The prefix index is built in the background after loading.
+        for __ in range(100):
+            if d._prefix_index is not None:
+                break
+            time.sleep(0.01)
+        assert d._prefix_index is not None
+        assert d.has_prefix(('TEFT',))
+        assert not d.has_prefix(('-G',))
+        assert engine.lookup(('TEFT', '-G')) == 'testing'
+
+def test_merged_dictionary_index(tmp_path, engine):
+    with make_dict(tmp_path, b'{"TEFT": "test"}', 'json') as dict_path:
+        dict_path = normalize_path(str(dict_path))
+        engine.start()
+        engine.config = {
+            'dictionaries': [DictionaryConfig(dict_path)],
+            'merged_dictionary_index': True,
+        }
+        dictionaries = engine.dictionaries
+        assert dictionaries.merged_index
+        # The index is built in the background.
+        for __ in range(100):
+            if dictionaries._merged is not None:
+                break
+            time.sleep(0.01)
+        assert dictionaries._merged is not None
+        assert engine.lookup(('TEFT',)) == 'test'
+        engine.config = {'merged_dictionary_index': False}
+        assert not engine.dictionaries.merged_index
+
+def test_latency_probes(engine):
+    engine.start()
+    engine.output = True
+    assert engine.latency_stats is None
+    engine.config = {'enable_latency_probes': True}
+    for keys in (['S-'], ['S-'], ['*']):
+        FakeMachine.instance._notify(keys)
+    stats = engine.latency_stats
+    assert set(stats) == {'queue', 'translate', 'format', 'output', 'hooks', 'total'}
+    for stage, stage_stats in stats.items():
+        assert stage_stats['count'] == 3, stage
+        assert 0 < stage_stats['p50'] <= stage_stats['p95'] <= stage_stats['p99']
+    engine.reset_latency_stats()
+    assert engine.latency_stats['total']['count'] == 0
+    # Disabled.
+    engine.config = {'enable_latency_probes': False}
+    assert engine.latency_stats is None
+    FakeMachine.instance._notify(['S-'])
+    assert engine.events[-1][0] == 'stroked'
+
+
+def test_hook_profiling(engine, monkeypatch):
+    warnings = []
+    monkeypatch.setattr('plover.engine.log.warning',
+                        lambda *args: warnings.append(args))
+    clock = iter(range(100))
+    monkeypatch.setattr('plover.engine.time.perf_counter',
+                        lambda: next(clock) * 0.0015)
+    engine.start()
+    engine.output = True
+    assert engine.hook_stats == {}
+    engine.config = {'hook_slow_threshold': 2}
+    engine.reset_hook_stats()
+    FakeMachine.instance._notify(['S-'])
+    stats = engine.hook_stats
+    assert set(stats) == {'stroked', 'translated', 'send_string'}
+    for hook_stats in stats.values():
+        (callback_stats,) = hook_stats.values()
+        # Each callback takes 1.5ms with the fake clock.
+        assert callback_stats['count'] == 1
+        assert callback_stats['total'] == callback_stats['max'] == pytest.approx(0.0015)
+        assert callback_stats['slow'] == 0
+    assert warnings == []
+    engine.config = {'hook_slow_threshold': 1}
+    del warnings[:]
+    FakeMachine.instance._notify(['S-'])
+    (callback_stats,) = engine.hook_stats['stroked'].values()
+    assert callback_stats['count'] == 2
+    assert callback_stats['slow'] == 1
+    assert sorted(w[1] for w in warnings) == ['send_string', 'stroked', 'translated']
+    # Disabled.
+    engine.config = {'hook_slow_threshold': 0}
+    assert engine.hook_stats == {}
+    FakeMachine.instance._notify(['S-'])
+    assert engine.hook_stats == {}
+
+
+def test_asynchronous_hooks(engine):
+    threads = []
+    engine.hook_connect('stroked', lambda stroke: threads.append(
+        threading.current_thread()))
+    engine.start()
+    engine.output = True
+    engine.config = {'asynchronous_hooks': True}
+    del engine.events[:]
+    FakeMachine.instance._notify(['S-'])
+    # Flush pending hooks.
+    engine.config = {'asynchronous_hooks': False}
+    assert sorted(e[0] for e in engine.events
+                  if e[0] in engine.ASYNC_HOOKS) == ['stroked', 'translated']
+    assert len(threads) == 1
+    assert threads[0] is not threading.current_thread()
+    del threads[:]
+    FakeMachine.instance._notify(['S-'])
+    assert threads == [threading.current_thread()]
+
+
+def test_hook_dispatcher_full_queue():
+    calls = []
+    delivering = threading.Event()
+    release = threading.Event()
+    def run_hook(hook, callbacks, args, kwargs):
+        delivering.set()
+        release.wait()
+        calls.append(hook)
+    dispatcher = HookDispatcher(run_hook, 2)
+    dispatcher.start()
+    dispatcher.put('stroked', (), (), {})
+    delivering.wait()
+    # The first hook is being delivered, the next 2 are
+    # queued, and the last one does not fit in the queue.
+    for hook in ('translated', 'output_changed', 'stroked'):
+        dispatcher.put(hook, (), (), {})
+    assert dispatcher.dropped == 1
+    release.set()
+    dispatcher.stop()
+    assert calls == ['stroked', 'translated', 'output_changed']
+
+
+def test_lookup_without_lock(engine):
+    d = StenoDictionary()
+    d.update({('S',): 'is', ('TEFT',): 'test'})
+    engine._set_dictionaries([d])
+    locked = threading.Event()
+    release = threading.Event()
+    def hold_lock():
+        with engine:
+            locked.set()
+            release.wait()
+    thread = threading.Thread(target=hold_lock)
+    thread.start()
+    locked.wait()
+    try:
+        # Lookups do not wait for the engine lock.
+        assert engine.lookup(('S',)) == 'is'
+        assert engine.raw_lookup_from_all(('TEFT',)) == [('test', d)]
+        assert engine.reverse_lookup('test') == {('TEFT',)}
+        assert engine.casereverse_lookup('test') == {'test'}
+        assert [s.text for s in engine.get_suggestions('test')] == ['test']
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_suggestions_cache(engine):
+    d = StenoDictionary()
+    d[('TEFT',)] = 'test'
+    engine._set_dictionaries([d])
+    assert engine.get_suggestions_many(['test', 'tested']) == [
+        Suggestion('test', [('TEFT',)]),
+    ]
+    # The cache is invalidated on changes.
+    d[('TEFTD',)] = 'tested'
+    assert engine.get_suggestions('tested') == [
+        Suggestion('tested', [('TEFTD',)]),
+    ]
+    d.enabled = False
+    assert engine.get_suggestions('tested') == []
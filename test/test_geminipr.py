@@ -0,0 +1,62 @@
+"""Unit tests for geminipr.py."""
+
+import threading
+import time
+
+from plover.machine.geminipr import GeminiPr
+from plover.steno import keys_to_mask
+
+from plover_build_utils.testing import parametrize
+
+
+class MockSerial:
+
+    def __init__(self, **params):
+        pass
+
+    def isOpen(self):
+        return True
+
+    def read(self, size=1):
+        if not self.data:
+            self.event.set()
+            time.sleep(0.01)
+            return b''
+        data = self.data.pop(0)
+        assert len(data) <= size
+        return data
+
+    def close(self):
+        pass
+
+
+GEMINIPR_TESTS = (
+    # Single key.
+    lambda: ((b'\x80\x00\x00\x00\x00\x00',), []),
+    lambda: ((b'\x80\x40\x00\x00\x00\x00',), [['S1-']]),
+    # Multiple keys, across bytes.
+    lambda: ((b'\xa0\x01\x40\x00\x00\x01',), [['#1', 'H-', 'R-', '-Z']]),
+    # Short reads.
+    lambda: ((b'\x80\x00', b'\x40\x00\x00\x00'), [['R-']]),
+    # Invalid packet.
+    lambda: ((b'\x00\x40\x00\x00\x00\x00',
+              b'\x80\x40\x00\x00\x00\x00'), [['S1-']]),
+)
+
+@parametrize(GEMINIPR_TESTS)
+def test_geminipr(monkeypatch, inputs, expected):
+    params = {k: v[0] for k, v in GeminiPr.get_option_info().items()}
+    class mock(MockSerial):
+        event = threading.Event()
+        data = list(inputs)
+    monkeypatch.setattr('plover.machine.base.serial.Serial', mock)
+    actual = []
+    actual_masks = []
+    m = GeminiPr(params)
+    m.add_stroke_callback(actual.append)
+    m.add_stroke_mask_callback(actual_masks.append)
+    m.start_capture()
+    mock.event.wait()
+    m.stop_capture()
+    assert [sorted(keys) for keys in actual] == [sorted(keys) for keys in expected]
+    assert actual_masks == [keys_to_mask(keys) for keys in expected]
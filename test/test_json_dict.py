@@ -4,9 +4,14 @@
 
 """Unit tests for json.py."""
 
+import os
+
+import pytest
+
+from plover.dictionary import json_dict
 from plover.dictionary.json_dict import JsonDictionary
 
-from plover_build_utils.testing import dictionary_test
+from plover_build_utils.testing import dictionary_test, make_dict
 
 
 def json_load_test(contents, expected):
@@ -24,6 +29,8 @@ JSON_LOAD_TESTS = (
     # Invalid JSON.
     lambda: json_load_test('{"foo", "bar",}', ValueError),
     # Invalid JSON.
+    lambda: json_load_test('{"S": "a"} "T"', ValueError),
+    # Invalid JSON.
     lambda: json_load_test('foo', ValueError),
     # Cannot convert to dict.
     lambda: json_load_test('"foo"', ValueError),
@@ -83,3 +90,98 @@ class TestJsonDictionary:
     DICT_LOAD_TESTS = JSON_LOAD_TESTS
     DICT_SAVE_TESTS = JSON_SAVE_TESTS
     DICT_SAMPLE = b'{}'
+
+
+class CompactJsonDictionary(JsonDictionary):
+
+    compact_storage = True
+
+@dictionary_test
+class TestCompactJsonDictionary:
+
+    DICT_CLASS = CompactJsonDictionary
+    DICT_EXTENSION = 'json'
+    DICT_LOAD_TESTS = JSON_LOAD_TESTS
+    DICT_SAVE_TESTS = JSON_SAVE_TESTS
+    DICT_SAMPLE = b'{}'
+
+
+@pytest.mark.parametrize('chunk_size', (1, 2, 3, 5, 7, 1024))
+def test_incremental_load(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(json_dict, 'CHUNK_SIZE', chunk_size)
+    contents = (
+        '{\n"S": "a",\n"T/-P" : "b\\"}\\u00e9",'
+        ' "K": "{^ing}", "KAFR": "caf\u00e9"\t}\n'
+    ).encode('utf-8')
+    progress = []
+    with make_dict(tmp_path, contents, 'json') as dict_path:
+        d = JsonDictionary.load(str(dict_path),
+                                progress=lambda *args: progress.append(args))
+    assert dict(d.items()) == {
+        ('S',): 'a',
+        ('T', '-P'): 'b"}\u00e9',
+        ('K',): '{^ing}',
+        ('KAFR',): 'caf\u00e9',
+    }
+    total = len(contents)
+    assert progress[-1] == (total, total)
+    assert all(0 < done <= total and t == total for done, t in progress)
+    assert [done for done, t in progress] == sorted(done for done, t in progress)
+
+
+def dict_path_contents(dict_path):
+    with open(dict_path, 'rb') as fp:
+        return fp.read()
+
+
+def test_journaled_save(tmp_path):
+    contents = b'{\n"S": "a",\n"T": "b"\n}\n'
+    with make_dict(tmp_path, contents, 'json') as dict_path:
+        dict_path = str(dict_path)
+        journal_path = dict_path + '.journal'
+        d = JsonDictionary.load(dict_path)
+        d.journaled = True
+        # No changes.
+        d.save()
+        assert not os.path.exists(journal_path)
+        # Changes are only appended to the journal.
+        d[('K',)] = 'c'
+        del d[('S',)]
+        d[('T',)] = 'd'
+        d.save()
+        assert dict_path_contents(dict_path) == contents
+        assert os.path.exists(journal_path)
+        # And replayed on load.
+        expected = {('T',): 'd', ('K',): 'c'}
+        d = JsonDictionary.load(dict_path)
+        assert dict(d.items()) == expected
+        # An incomplete last entry is ignored.
+        with open(journal_path, 'a') as fp:
+            fp.write('["P", "e')
+        d = JsonDictionary.load(dict_path)
+        assert dict(d.items()) == expected
+        d.journaled = True
+        # Compaction.
+        d.compact()
+        assert not os.path.exists(journal_path)
+        assert dict_path_contents(dict_path) == b'{\n"K": "c",\n"T": "d"\n}\n'
+        assert dict(JsonDictionary.load(dict_path).items()) == expected
+        # Automatic compaction once the journal is too long.
+        d.journal_compaction_threshold = 2
+        d[('P',)] = 'e'
+        d.save()
+        assert os.path.exists(journal_path)
+        d[('W',)] = 'f'
+        d[('K',)] = 'g'
+        d.save()
+        assert not os.path.exists(journal_path)
+        expected.update({('P',): 'e', ('W',): 'f', ('K',): 'g'})
+        assert dict(JsonDictionary.load(dict_path).items()) == expected
+        # Bulk changes always trigger a full save.
+        d[('S',)] = 'h'
+        d.save()
+        assert os.path.exists(journal_path)
+        d.clear()
+        d.save()
+        assert not os.path.exists(journal_path)
+        assert dict_path_contents(dict_path) == b'{}\n'
@@ -0,0 +1,33 @@
+"""Tests for latency.py."""
+
+import pytest
+
+from plover.latency import Histogram, LatencyProbes, STAGES
+
+
+def test_histogram():
+    h = Histogram()
+    assert h.percentile(0.5) is None
+    for ns in range(1, 1001):
+        h.add(ns * 1000)
+    assert h.count == 1000
+    for p in (0.01, 0.5, 0.95, 0.99, 1.0):
+        expected = p * 1000 * 1e-6
+        # Buckets are accurate to within 25%.
+        assert expected <= h.percentile(p) <= expected * 1.25
+    h.reset()
+    assert h.count == 0
+    assert h.percentile(0.5) is None
+
+def test_latency_probes():
+    probes = LatencyProbes()
+    assert probes.summary() == 'stroke latency (ms, p50/p95/p99): no data'
+    probes.add('total', 2000000)
+    stats = probes.stats()
+    assert set(stats) == set(STAGES)
+    assert stats['total']['count'] == 1
+    assert stats['total']['p50'] == pytest.approx(2e-3, rel=0.25)
+    assert stats['queue'] == {'count': 0, 'p50': None, 'p95': None, 'p99': None}
+    assert probes.summary().startswith('stroke latency (ms, p50/p95/p99): total 2.')
+    probes.reset()
+    assert probes.stats()['total']['count'] == 0
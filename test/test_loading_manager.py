@@ -4,14 +4,21 @@
 """Tests for loading_manager.py."""
 
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import os
+import sys
 import tempfile
 
 import pytest
 
+from plover.dictionary.cache import DictionaryCache
+from plover.dictionary.json_dict import JsonDictionary
 from plover.exception import DictionaryLoaderException
+from plover.steno_dictionary import CompactStorage
 import plover.dictionary.loading_manager as loading_manager
 
+from plover_build_utils.testing import make_dict
+
 
 class FakeDictionaryContents:
 
@@ -40,7 +47,8 @@ class MockLoader:
         self.files = files
         self.load_counts = defaultdict(int)
 
-    def __call__(self, filename):
+    def __call__(self, filename, cache=None, executor=None, progress=None,
+                 compact_storage=None):
         self.load_counts[filename] += 1
         d = self.files[filename]
         if isinstance(d.contents, Exception):
@@ -116,3 +124,84 @@ def test_loading(monkeypatch):
     manager.unload_outdated()
     assert len(manager) == 0
     assert df('c') not in manager
+
+
+def test_loading_in_processes(tmp_path):
+    with \
+            make_dict(tmp_path, b'{"TEFT": "test", "TEFT/-G": "testing"}', 'json') as d1, \
+            make_dict(tmp_path, b'{"S": "is"}', 'json') as d2, \
+            make_dict(tmp_path, b'{"S": ', 'json') as d3:
+        d1, d2, d3 = str(d1), str(d2), str(d3)
+        manager = loading_manager.DictionaryLoadingManager(processes=2)
+        results = manager.load([d1, d2, d3])
+        assert len(results) == 3
+        assert sorted(results[0].items()) == [
+            (('TEFT',), 'test'),
+            (('TEFT', '-G'), 'testing'),
+        ]
+        assert results[0].path == d1
+        assert results[0].longest_key == 2
+        assert dict(results[1].items()) == {('S',): 'is'}
+        assert isinstance(results[2], DictionaryLoaderException)
+        assert results[2].path == d3
+        # Dictionaries loaded by worker processes can still be edited.
+        results[1][('S',)] = 'was'
+        assert results[1][('S',)] == 'was'
+
+
+def test_loading_in_frozen_build(tmp_path, monkeypatch):
+    # Worker processes would start another instance of the application.
+    monkeypatch.setattr(sys, 'frozen', True, raising=False)
+    monkeypatch.setattr(sys, 'platform', 'darwin')
+    def executor(*args, **kwargs):
+        raise AssertionError('worker processes must not be used')
+    monkeypatch.setattr(loading_manager, 'ProcessPoolExecutor', executor)
+    with make_dict(tmp_path, b'{"S": "is"}', 'json') as d1:
+        d1 = str(d1)
+        manager = loading_manager.DictionaryLoadingManager(processes=2)
+        results = manager.load([d1])
+        assert dict(results[0].items()) == {('S',): 'is'}
+
+
+def test_loading_processes_are_spawned(tmp_path, monkeypatch):
+    # Forking from the (multi-threaded) application could deadlock.
+    contexts = []
+    class Executor(ThreadPoolExecutor):
+        def __init__(self, max_workers, mp_context, initializer, initargs):
+            contexts.append(mp_context)
+            super().__init__(max_workers=max_workers)
+    monkeypatch.setattr(loading_manager, 'ProcessPoolExecutor', Executor)
+    with make_dict(tmp_path, b'{"S": "is"}', 'json') as d1:
+        manager = loading_manager.DictionaryLoadingManager(processes=2)
+        manager.load([str(d1)])
+    assert [context.get_start_method() for context in contexts] == ['spawn']
+
+
+@pytest.mark.parametrize('mode', ('parse', 'processes', 'cache'))
+def test_loading_compact_storage(tmp_path, monkeypatch, mode):
+    monkeypatch.setattr(loading_manager, 'ProcessPoolExecutor',
+                        lambda max_workers, **kwargs: ThreadPoolExecutor(max_workers))
+    manager = loading_manager.DictionaryLoadingManager(compact_storage=True)
+    with make_dict(tmp_path, b'{"TEFT": "test", "TEFT/-G": "testing"}', 'json') as d1:
+        d1 = str(d1)
+        if mode == 'processes':
+            manager.processes = 2
+        elif mode == 'cache':
+            cache = manager.cache = DictionaryCache(str(tmp_path / 'cache'))
+            cache.update(cache.cache_path(d1),
+                         cache.signature(JsonDictionary, d1),
+                         JsonDictionary.load(d1).items())
+        d, = manager.load([d1])
+        assert d.compact_storage
+        if mode == 'parse':
+            assert isinstance(d._dict, CompactStorage)
+        else:
+            # Frozen storage, until the first change.
+            assert d._dict.frozen
+        d[('S',)] = 'is'
+        assert isinstance(d._dict, CompactStorage)
+        assert dict(d.items()) == {
+            ('TEFT',): 'test',
+            ('TEFT', '-G'): 'testing',
+            ('S',): 'is',
+        }
@@ -1,11 +1,24 @@
 # Copyright (c) 2013 Hesky Fisher
 # See LICENSE.txt for details.
 
+import random
 import textwrap
+import time
 
 import pytest
 
-from plover.dictionary.rtfcre_dict import RtfDictionary, format_translation
+from plover.dictionary.rtfcre_dict import (
+    DICT_ENTRY_PATTERN,
+    RtfDictionary,
+    TranslationConverter,
+    TranslationParser,
+    _format_translation,
+    export,
+    format_translation,
+    load_stylesheet,
+    parse_entries,
+)
+from plover.steno_dictionary import StenoDictionary, StenoDictionaryCollection
 
 from plover_build_utils.testing import dictionary_test, parametrize
 
@@ -22,6 +35,31 @@ def test_format_translation(before, expected):
     assert result == expected
 
 
+def test_format_translation_compatibility():
+    rnd = random.Random(42)
+    fragments = (
+        '{', '}', '^', ' ', '  ', '\t', 'a', 'word', '.', '!', '?', ',', ':', ';',
+        '-|', '>', '&', '#', 'PLOVER:', 'Lookup', '1', '"', '\\', '\\{', '\\}',
+    )
+    for __ in range(20000):
+        t = ''.join(rnd.choice(fragments) for __ in range(rnd.randint(0, 12)))
+        assert format_translation(t) == _format_translation(t), repr(t)
+
+
+def test_export_collection(tmp_path):
+    d1 = StenoDictionary()
+    d1.update({('S',): 'a', ('T',): '{^ing}'})
+    d2 = StenoDictionary()
+    d2.update({('S',): 'b', ('W', '-R'): '{.}'})
+    dc = StenoDictionaryCollection([d2, d1])
+    filename = str(tmp_path / 'export.rtf')
+    export(filename, dc.entries())
+    d = RtfDictionary.load(filename)
+    assert dict(d.items()) == {
+        ('S',): 'b', ('T',): '{^ing}', ('W', '-R'): '{.}',
+    }
+
+
 def rtf_load_test(*spec):
     assert 1 <= len(spec) <= 2
     if len(spec) == 2:
@@ -288,3 +326,94 @@ class TestRtfDictionary:
             + '\r\n}'
         )
         return rtf.encode('cp1252')
+
+
+def reference_parse(s):
+    # Original implementation.
+    converter = TranslationConverter(load_stylesheet(s))
+    return [
+        (m.group('steno'), m.group('translation'),
+         converter(m.group('translation')))
+        for m in DICT_ENTRY_PATTERN.finditer(s)
+    ]
+
+def parse(s):
+    converter = TranslationParser(load_stylesheet(s))
+    return [
+        (steno, translation, converter(translation))
+        for steno, translation in parse_entries(s)
+    ]
+
+RTF_FRAGMENTS = (
+    r'{\*\cxs S}', r'{\*\cxs T/-P}', r'{\*\cxs }', r'\{\*\cxs X}',
+    '\\', r'\\', r'\{', r'\}', r'\-', r'\~', r'\_', r'\*', '\\\r', '\\\n',
+    '{', '}', ']', '|', '.', ',', '?', 'word', 'a', 'X', '3', '-12',
+    '\r\n', '\n', '\r', ' ', '  ', '\t', '\x0c',
+    r'\cxds', r'\cxds ', 'ing', r'\par', r'\s1', r'\s4', r'\cxfc', r'\cxfl ', r'\cxa',
+    r'{\cxp ', r'{\cxp. }', r'{\cxfing ', r'{\cxstit ', r'{\*\cxsvatdictflags N}',
+    r'{\cxconf [', r'{\cxc ', r'{\nonexistent ', r'{\*\nonexistent ',
+    '{eclipse', r'{\cxa Q.}',
+)
+
+def test_parser_compatibility():
+    rnd = random.Random(42)
+    for __ in range(5000):
+        s = ''.join(rnd.choice(RTF_FRAGMENTS)
+                    for __ in range(rnd.randint(0, 30)))
+        if rnd.random() < 0.5:
+            s = r'{\rtf1\ansi{\s1 Q;}{\s4 Continuation Q;}}' + s
+        if rnd.random() < 0.7:
+            s += rnd.choice(('}', '}\r\n', '\r\n}', ' \r\n }  ', '\\\r\n}'))
+        assert parse(s) == reference_parse(s), repr(s)
+
+
+@pytest.mark.benchmark
+def test_parser_benchmark(capsys):
+    rnd = random.Random(42)
+    words = ['word%u' % n for n in range(1000)]
+    words.extend((
+        r'{\cxp. }', r'\cxds ing', r'pre\cxds ', r'\cxds in\cxds ',
+        r'{\cxfing x}', r'\par\s1 ', 'two  spaces',
+        r'{\*\cxsvatdictentrydate\yr2006\mo5\dy10}',
+    ))
+    strokes = ['STKPW', 'HRAO', '-FRPB', 'TPH-FPL']
+    s = ''.join(
+        [r'{\rtf1\ansi\cxdict{\stylesheet{\s0 Normal;}{\s1 Question;}}' '\r\n'] +
+        [r'{\*\cxs %s%u}%s' '\r\n' % (
+            '/'.join(rnd.choice(strokes) for __ in range(rnd.randint(1, 3))), n,
+            ' '.join(rnd.choice(words) for __ in range(rnd.randint(1, 4))),
+        ) for n in range(150000)] +
+        ['}\r\n']
+    )
+    timings = []
+    for fn in (reference_parse, parse):
+        start_time = time.perf_counter()
+        entries = fn(s)
+        timings.append(time.perf_counter() - start_time)
+    assert entries == reference_parse(s)
+    with capsys.disabled():
+        print('\n%.1fMB: reference parser %.2fs, new parser: %.2fs'
+              % ((len(s) / 1e6,) + tuple(timings)))
+
+
+@pytest.mark.benchmark
+def test_format_translation_benchmark(capsys):
+    rnd = random.Random(42)
+    words = ['word%u' % n for n in range(1000)]
+    words.extend((
+        '{.}', '{,}', '{^ing}', '{pre^}', '{^in^}', '{-|}', '{&x}',
+        '{#Return}', '{PLOVER:TOGGLE}', '{^}', '{ }',
+    ))
+    translations = [
+        ' '.join(rnd.choice(words) for __ in range(rnd.randint(1, 4)))
+        for __ in range(150000)
+    ]
+    timings = []
+    for fn in (_format_translation, format_translation):
+        start_time = time.perf_counter()
+        results = [fn(t) for t in translations]
+        timings.append(time.perf_counter() - start_time)
+    assert results == [_format_translation(t) for t in translations]
+    with capsys.disabled():
+        print('\n%u translations: reference formatter %.2fs, new formatter: %.2fs'
+              % ((len(translations),) + tuple(timings)))
@@ -0,0 +1,182 @@
+"""Tests for search_index.py."""
+
+import random
+import threading
+
+import pytest
+
+from plover import search_index
+from plover.search_index import SearchIndex
+
+
+ENTRIES = (
+    ('test', 1),
+    ('Testing', 2),
+    ('tested', 3),
+    ('contest', 4),
+    ('TEST', 5),
+    ('attestation', 6),
+    ('café', 7),
+)
+
+
+def texts(results):
+    return [text for text, key in results]
+
+
+def test_prefix_search():
+    index = SearchIndex(ENTRIES)
+    assert len(index) == len(ENTRIES)
+    assert texts(index.search('test')) == ['test', 'tested']
+    assert set(texts(index.search('test', ignore_case=True))) == \
+            {'TEST', 'test', 'tested', 'Testing'}
+    assert texts(index.search('Test')) == ['Testing']
+    assert texts(index.search('caf')) == ['café']
+    assert texts(index.search('x')) == []
+    # Empty pattern: everything, sorted.
+    assert [t.lower() for t in texts(index.search(''))] == \
+            sorted(t.lower() for t, k in ENTRIES)
+
+
+def test_substring_search():
+    index = SearchIndex(ENTRIES)
+    assert texts(index.search('test', substring=True)) == \
+            ['attestation', 'contest', 'test', 'tested']
+    assert texts(index.search('EST', substring=True)) == ['TEST']
+    assert len(index.search('EST', substring=True, ignore_case=True)) == 6
+    # Matches are reported once per entry.
+    assert texts(index.search('t', substring=True, ignore_case=True)) == [
+        text for text in texts(index.search(''))
+        if 't' in text.lower()
+    ]
+    assert index.search('\0', substring=True) == []
+    assert SearchIndex().search('', substring=True) == []
+
+
+def test_paging():
+    index = SearchIndex(ENTRIES)
+    for substring in (False, True):
+        results = index.search('test', substring=substring, ignore_case=True)
+        pages = [
+            index.search('test', substring=substring, ignore_case=True,
+                         start=start, count=2)
+            for start in range(0, len(results) + 2, 2)
+        ]
+        assert sum(pages, []) == results
+        assert pages[-1] == []
+
+
+def test_changes():
+    index = SearchIndex(ENTRIES)
+    # Build the substring search data.
+    index.search('test', substring=True)
+    index.add('testament', 8)
+    index.add('test', 9)
+    assert texts(index.search('testa')) == ['testament']
+    assert sorted(key for text, key in index.search('test', substring=True)
+                  if text == 'test') == [1, 9]
+    index.remove('test', 1)
+    assert index.search('test', count=1) == [('test', 9)]
+    assert texts(index.search('attest', substring=True)) == ['attestation']
+    with pytest.raises(KeyError):
+        index.remove('test', 1)
+    with pytest.raises(KeyError):
+        index.remove('testament', 9)
+    assert len(index) == len(ENTRIES) + 1
+
+
+def test_select():
+    index = SearchIndex(ENTRIES)
+    for pattern, substring, ignore_case in (
+        ('', False, False),
+        ('test', False, False),
+        ('test', False, True),
+        ('TEST', True, False),
+        ('test', True, True),
+        ('\0', True, True),
+    ):
+        results = index.search(pattern, substring=substring, ignore_case=ignore_case)
+        assert index.select(pattern, substring, ignore_case) == (
+            [text.lower() for text, key in results],
+            [key for text, key in results],
+        )
+
+
+@pytest.mark.parametrize('max_changes', (0, 3, 1024))
+def test_many_changes(monkeypatch, max_changes):
+    monkeypatch.setattr(search_index, 'MAX_CHANGES', max_changes)
+    rnd = random.Random(42)
+    words = ['%s%d' % (rnd.choice(('test', 'Test', 'attest', 'x')), n)
+             for n in range(200)]
+    entries = dict(zip(range(100), words))
+    index = SearchIndex((text, key) for key, text in entries.items())
+    index.search('t', substring=True)
+    for n in range(1000):
+        key = rnd.randrange(200)
+        if key in entries:
+            index.remove(entries.pop(key), key)
+        else:
+            entries[key] = rnd.choice(words)
+            index.add(entries[key], key)
+        if n % 100:
+            continue
+        # Note: compare sorted results, entries with the same
+        # lowercased text can be in any order.
+        expected = SearchIndex((text, key) for key, text in entries.items())
+        assert len(index) == len(expected)
+        for pattern, substring, ignore_case in (
+            ('', False, False),
+            ('test', False, False),
+            ('test', False, True),
+            ('Test', True, False),
+            ('test', True, True),
+        ):
+            results = index.search(pattern, substring, ignore_case)
+            assert sorted(results) == sorted(expected.search(pattern, substring, ignore_case))
+            assert [text.lower() for text, key in results] == \
+                    sorted(text.lower() for text, key in results)
+            assert index.select(pattern, substring, ignore_case) == (
+                [text.lower() for text, key in results],
+                [key for text, key in results],
+            )
+
+
+def test_search_during_changes():
+    index = SearchIndex(('test%d' % n, n) for n in range(1000))
+    results = index._matches(index._state, 'test', False, False)
+    # Changes do not affect a search in progress.
+    next(results)
+    for n in range(1000):
+        index.remove('test%d' % n, n)
+    assert len(index) == 0
+    assert len(list(results)) == 999
+    assert index.search('test') == []
+
+
+def test_background_rebuild(monkeypatch):
+    monkeypatch.setattr(search_index, 'MAX_CHANGES', 2)
+    index = SearchIndex(ENTRIES)
+    # Hold the rebuild until more changes are made.
+    resume = threading.Event()
+    sorted_entries = search_index._SortedEntries
+    def slow_sorted_entries(*args):
+        resume.wait()
+        return sorted_entries(*args)
+    monkeypatch.setattr(search_index, '_SortedEntries', slow_sorted_entries)
+    index.add('testament', 8)
+    index.remove('test', 1)
+    index.add('tester', 9)
+    rebuild_thread = index._rebuild_thread
+    assert rebuild_thread.is_alive()
+    # Changes and searches are not blocked by the rebuild.
+    index.remove('tested', 3)
+    index.add('test', 10)
+    index.remove('testament', 8)
+    assert texts(index.search('test')) == ['test', 'tester']
+    resume.set()
+    rebuild_thread.join()
+    entries, added, removed = index._state
+    # The changes made during the rebuild were applied on top of it.
+    assert len(added) + len(removed) == 3
+    assert index.search('test') == [('test', 10), ('tester', 9)]
+    assert len(index) == len(ENTRIES)
@@ -3,7 +3,16 @@
 
 """Unit tests for steno.py."""
 
-from plover.steno import normalize_steno, Stroke
+import copy
+import pickle
+
+import pytest
+
+from plover import system
+from plover.steno import (
+    Stroke, keys_to_mask, mask_to_keys,
+    normalize_steno, normalize_stroke,
+)
 
 from plover_build_utils.testing import parametrize
 
@@ -51,6 +60,19 @@ def test_normalize_steno(steno, strokes):
     )
     assert result == strokes, msg
 
+def test_normalize_stroke_memoization(monkeypatch):
+    # Normalized strokes are interned.
+    stroke = normalize_stroke(''.join(('SA', '-R')))
+    assert stroke == 'SAR'
+    assert normalize_stroke('SA-R') is stroke
+    assert normalize_steno('SA-R/SA-R')[1] is stroke
+    # And the memo table is invalidated on system change.
+    monkeypatch.setattr(system, 'KEY_ORDER', dict(system.KEY_ORDER))
+    monkeypatch.setattr(system, 'IMPLICIT_HYPHENS', set())
+    assert normalize_stroke('SA-R') == 'SA-R'
+    monkeypatch.undo()
+    assert normalize_stroke('SA-R') == 'SAR'
+
 
 STROKE_TESTS = (
     lambda: (['S-'], ['S-'], 'S'),
@@ -66,3 +88,34 @@ def test_stroke(keys, steno_keys, rtfcre):
     stroke = Stroke(keys)
     assert stroke.steno_keys == steno_keys
     assert stroke.rtfcre == rtfcre
+
+def test_stroke_cache(monkeypatch):
+    stroke = Stroke(['-T', 'S-'])
+    # Same set of keys: same instance.
+    assert Stroke(('S-', '-T', 'S-')) is stroke
+    assert copy.deepcopy(stroke) is stroke
+    assert pickle.loads(pickle.dumps(stroke)) is stroke
+    with pytest.raises(AttributeError):
+        stroke.rtfcre = 'ST'
+    # Equivalent sets of keys.
+    assert Stroke(['#', 'S-', '-T']) == Stroke(['1-', '-9'])
+    assert Stroke(['#', 'S-', '-T']) != Stroke(['#', 'S-'])
+    assert Stroke(['S-', '-T']).mask != Stroke(['S-', 'T-']).mask
+    # Not a system key.
+    assert Stroke(['S-', 'foo']) == Stroke(['foo', 'S-'])
+    assert Stroke(['S-', 'foo']) != Stroke(['S-', 'bar'])
+    # The cache is invalidated on system change.
+    monkeypatch.setattr(system, 'KEY_ORDER', dict(system.KEY_ORDER))
+    assert Stroke(['-T', 'S-']) is not stroke
+
+def test_keys_mask():
+    assert keys_to_mask(()) == 0
+    for keys in (['S-'], ['S-', '-T'], ['#', 'A-', '1-'], list(system.KEYS)):
+        mask = keys_to_mask(keys)
+        assert sorted(mask_to_keys(mask)) == sorted(keys)
+        assert Stroke(mask) == Stroke(keys)
+    assert keys_to_mask(['S-', '-T']) == keys_to_mask(['S-']) | keys_to_mask(['-T'])
+    assert keys_to_mask(['1-']) != keys_to_mask(['#', 'S-'])
+    assert Stroke(keys_to_mask(['#', 'S-'])).rtfcre == '1'
+    with pytest.raises(ValueError):
+        mask_to_keys(1 << 1000)
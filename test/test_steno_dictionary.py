@@ -3,13 +3,46 @@
 
 """Unit tests for steno_dictionary.py."""
 
+import gc
+import json
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
 import pytest
 
-from plover.steno_dictionary import StenoDictionary, StenoDictionaryCollection
+from plover.steno_dictionary import (
+    CompactStorage,
+    StenoDictionary,
+    StenoDictionaryCollection,
+    StenoDictionaryCollectionSnapshot,
+)
 
 from plover_build_utils.testing import dictionary_test
 
 
+class PluginDictionary(StenoDictionary):
+    """Like a Python dictionary plugin: entries are not held by the storage."""
+
+    readonly = True
+
+    def __init__(self, entries):
+        super().__init__()
+        self._entries = dict(entries)
+        self._longest_key = max(map(len, self._entries), default=0)
+
+    def __getitem__(self, key):
+        return self._entries[key]
+
+    def get(self, key, fallback=None):
+        return self._entries.get(key, fallback)
+
+    def reverse_lookup(self, value):
+        return {k for k, v in self._entries.items() if v == value}
+
+
 def test_dictionary_collection():
     d1 = StenoDictionary()
     d1[('S',)] = 'a'
@@ -178,6 +211,61 @@ def test_reverse_lookup():
     assert dc.reverse_lookup('beautiful') == {('PW-FL',), ('PWAOUFL',)}
 
 
+def test_reverse_lookup_index_updates():
+    d1 = StenoDictionary()
+    d1[('WAOUFL',)] = 'not beautiful'
+    d2 = StenoDictionary()
+    d2.update({('PWAOUFL',): 'beautiful', ('WAOUFL',): 'beautiful'})
+    dc = StenoDictionaryCollection([d1, d2])
+    assert dc.reverse_lookup('beautiful') == {('PWAOUFL',)}
+    # The index is kept up to date on changes.
+    del d1[('WAOUFL',)]
+    assert dc.reverse_lookup('beautiful') == {('PWAOUFL',), ('WAOUFL',)}
+    assert dc.reverse_lookup('not beautiful') == set()
+    d1[('PWAOUFL',)] = 'pretty'
+    assert dc.reverse_lookup('beautiful') == {('WAOUFL',)}
+    assert dc.reverse_lookup('pretty') == {('PWAOUFL',)}
+    d2[('PW-FL',)] = 'beautiful'
+    assert dc.reverse_lookup('beautiful') == {('WAOUFL',), ('PW-FL',)}
+    # An empty translation does not override lower priority entries.
+    d1[('PW-FL',)] = ''
+    assert dc.reverse_lookup('beautiful') == {('WAOUFL',), ('PW-FL',)}
+    assert dc.reverse_lookup('') == {('PW-FL',)}
+    # Disabling a dictionary.
+    d1.enabled = False
+    assert dc.reverse_lookup('beautiful') == {('PWAOUFL',), ('WAOUFL',), ('PW-FL',)}
+    assert dc.reverse_lookup('pretty') == set()
+
+
+def test_reverse_lookup_not_indexable():
+    d1 = StenoDictionary()
+    d1.update({('TEFT',): 'test', ('TEFGT',): 'testing', ('-G',): ''})
+    d2 = PluginDictionary({('TEFT', '-G'): 'testing', ('TEFT',): 'tested',
+                           ('-G',): 'testing'})
+    d3 = StenoDictionary()
+    d3.update({('TEFT',): 'tested', ('-G',): 'ing', ('T-G',): 'testing'})
+    dc = StenoDictionaryCollection([d2])
+    assert dc.reverse_lookup('testing') == {('TEFT', '-G'), ('-G',)}
+    dc.set_dicts([d1, d2, d3])
+    assert dc.reverse_lookup('testing') == {('TEFT', '-G'), ('-G',),
+                                            ('TEFGT',), ('T-G',)}
+    # Overridden by a higher priority dictionary.
+    assert dc.reverse_lookup('tested') == set()
+    assert dc.reverse_lookup('ing') == set()
+    assert dc.reverse_lookup('') == {('-G',)}
+    # The index is kept up to date.
+    del d1[('TEFT',)]
+    assert dc.reverse_lookup('tested') == {('TEFT',)}
+    d1[('TEFT', '-G')] = 'tested'
+    assert dc.reverse_lookup('testing') == {('-G',), ('TEFGT',), ('T-G',)}
+    d3[('TEFT',)] = 'test'
+    assert dc.reverse_lookup('test') == set()
+    dc.set_dicts([d3, d2, d1])
+    assert dc.reverse_lookup('testing') == {('T-G',), ('TEFT', '-G'), ('TEFGT',)}
+    assert dc.reverse_lookup('test') == {('TEFT',)}
+    assert dc.reverse_lookup('tested') == set()
+
+
 def test_dictionary_enabled():
     dc = StenoDictionaryCollection()
     d1 = StenoDictionary()
@@ -205,6 +293,527 @@ def test_dictionary_enabled():
     assert dc.reverse_lookup('Testing') == set()
 
 
+def test_dictionary_collection_merged_index():
+    d1 = StenoDictionary()
+    d1.update({('S',): 'a', ('T',): 'b'})
+    d2 = StenoDictionary()
+    d2.update({('S',): 'c', ('W',): 'd', ('S', 'T'): 'e'})
+    dc = StenoDictionaryCollection([d2, d1], merged_index=True)
+    ref = StenoDictionaryCollection([d2, d1])
+    keys = [('S',), ('T',), ('W',), ('S', 'T'), ('P',)]
+    def check():
+        # Note: the index is (re)built in the background, wait for it.
+        dc.build_merged_index()
+        assert dc._merged is not None
+        for k in keys:
+            assert dc.lookup(k) == ref.lookup(k), k
+            assert dc.raw_lookup(k) == ref.raw_lookup(k), k
+            assert dc.lookup_from_all(k) == ref.lookup_from_all(k), k
+    check()
+    assert dc.lookup_from_all(('S',)) == [('c', d2), ('a', d1)]
+    # Incremental updates.
+    d1[('P',)] = 'f'
+    del d2[('S',)]
+    d2[('T',)] = 'g'
+    check()
+    assert dc.lookup(('T',)) == 'g'
+    assert dc.lookup(('P',)) == 'f'
+    # Toggling a dictionary.
+    d2.enabled = False
+    check()
+    assert dc.lookup(('T',)) == 'b'
+    d2.enabled = True
+    check()
+    # Filters are still applied.
+    f = lambda k, v: v == 'g'
+    dc.add_filter(f)
+    ref.add_filter(f)
+    check()
+    assert dc.lookup(('T',)) == 'b'
+    # Bulk changes.
+    d2.clear()
+    check()
+    d2.update({('W',): 'h'})
+    check()
+    assert dc.lookup(('W',)) == 'h'
+    # Changing the dictionaries list.
+    dc.set_dicts([d1, d2])
+    ref.set_dicts([d1, d2])
+    check()
+    dc.set_dicts([d2])
+    d1[('W',)] = 'i'
+    assert dc.lookup(('W',)) == 'h'
+    assert dc.lookup(('S',)) is None
+    dc.build_merged_index()
+    assert dc.lookup(('W',)) == 'h'
+    assert dc.lookup(('S',)) is None
+    # Disabling the index.
+    dc.merged_index = False
+    assert dc._merged is None
+    assert dc.lookup(('W',)) == 'h'
+
+
+def test_dictionary_collection_merged_index_concurrent_changes():
+    d = StenoDictionary()
+    d.update({('S',): 'a'})
+    dc = StenoDictionaryCollection([d])
+    # Change the dictionary during the build.
+    changes = [(('T',), 'b')]
+    items_snapshot = d.items_snapshot
+    def snapshot():
+        items = items_snapshot()
+        for key, value in changes:
+            d[key] = value
+        changes.clear()
+        return items
+    d.items_snapshot = snapshot
+    dc.merged_index = True
+    dc.build_merged_index()
+    # The change is not lost.
+    assert not changes
+    assert dc._merged is not None
+    assert dc.lookup(('T',)) == 'b'
+    assert dc.lookup_from_all(('T',)) == [('b', d)]
+
+
+def test_dictionary_collection_merged_index_not_indexable():
+    d1 = StenoDictionary()
+    d1.update({('S',): 'a', ('T',): 'b', ('TEFT',): 'c'})
+    d2 = PluginDictionary({('TEFT', '-G'): 'testing', ('S',): 'd'})
+    d3 = StenoDictionary()
+    d3.update({('S',): 'e', ('TEFT', '-G'): 'tested'})
+    for dicts in ([d1, d2, d3], [d3, d2, d1], [d2, d1, d3]):
+        dc = StenoDictionaryCollection(dicts, merged_index=True)
+        dc.build_merged_index()
+        ref = StenoDictionaryCollection(dicts)
+        for k in (('S',), ('T',), ('TEFT',), ('TEFT', '-G'), ('P',)):
+            assert dc.lookup(k) == ref.lookup(k), k
+            assert dc.lookup_from_all(k) == ref.lookup_from_all(k), k
+        # Changes to other dictionaries.
+        d3[('T',)] = 'f'
+        assert dc.lookup_from_all(('T',)) == ref.lookup_from_all(('T',))
+        del d3[('T',)]
+    assert dc.lookup(('TEFT', '-G')) == 'testing'
+
+
+def test_dictionary_collection_entries():
+    d1 = StenoDictionary()
+    d1.update({('S',): 'a', ('T',): 'b', ('P',): 'c'})
+    d2 = StenoDictionary()
+    d2.update({('S',): 'd', ('W',): 'e', ('P',): 'f', ('S', 'T'): 'g'})
+    d3 = StenoDictionary()
+    d3.update({('K',): 'h'})
+    d3.enabled = False
+    dc = StenoDictionaryCollection([d2, d1, d3])
+    def check():
+        entries = dict(dc.entries())
+        keys = set(d1) | set(d2) | set(d3)
+        assert entries == {k: dc.lookup(k) for k in keys if dc.lookup(k) is not None}
+        return entries
+    assert check() == {
+        ('S',): 'd', ('T',): 'b', ('P',): 'f', ('W',): 'e', ('S', 'T'): 'g',
+    }
+    dc.add_filter(lambda k, v: v in ('f', 'b'))
+    assert check() == {
+        ('S',): 'd', ('P',): 'c', ('W',): 'e', ('S', 'T'): 'g',
+    }
+
+
+def test_dictionary_collection_change_listener():
+    d1 = StenoDictionary()
+    d2 = StenoDictionary()
+    dc = StenoDictionaryCollection()
+    changes = []
+    dc.add_change_listener(changes.append)
+    dc.set_dicts([d1, d2])
+    assert changes == [None]
+    d1[('S',)] = 'a'
+    del d1[('S',)]
+    d2[('T',)] = 'b'
+    assert changes == [None, ('S',), ('S',), ('T',)]
+    del changes[:]
+    d2.clear()
+    d1.enabled = False
+    f = lambda k, v: False
+    dc.add_filter(f)
+    dc.remove_filter(f)
+    assert changes == [None] * 4
+    del changes[:]
+    dc.remove_change_listener(changes.append)
+    d1[('S',)] = 'a'
+    assert changes == []
+
+
+def test_dictionary_collection_lookup_cache():
+    d1 = StenoDictionary()
+    d1.update({('S',): 'a', ('T',): 'b'})
+    d2 = StenoDictionary()
+    d2.update({('S',): 'c', ('P',): 'd'})
+    dc = StenoDictionaryCollection([d1, d2], lookup_cache_size=2)
+    def check(key, value, hits, misses):
+        assert dc.lookup(key) == value
+        assert (dc.lookup_cache_hits, dc.lookup_cache_misses) == (hits, misses)
+    check(('S',), 'a', 0, 1)
+    check(('S',), 'a', 1, 1)
+    check(('K',), None, 1, 2)
+    check(('K',), None, 2, 2)
+    # Least recently used entries are evicted.
+    check(('S',), 'a', 3, 2)
+    check(('T',), 'b', 3, 3)
+    check(('K',), None, 3, 4)
+    check(('S',), 'a', 3, 5)
+    # Changes are taken into account.
+    d2[('K',)] = 'e'
+    check(('K',), 'e', 3, 6)
+    del d1[('S',)]
+    check(('S',), 'c', 3, 7)
+    d1.update({('S',): 'f'})
+    check(('S',), 'f', 3, 8)
+    d1.enabled = False
+    check(('S',), 'c', 3, 9)
+    d1.enabled = True
+    f = lambda k, v: v == 'f'
+    dc.add_filter(f)
+    check(('S',), 'c', 3, 10)
+    dc.remove_filter(f)
+    check(('S',), 'f', 3, 11)
+    d1.clear()
+    check(('S',), 'c', 3, 12)
+    dc.set_dicts([d1])
+    check(('S',), None, 3, 13)
+    # Disabling the cache.
+    dc.lookup_cache_size = 0
+    check(('S',), None, 0, 0)
+
+
+def test_dictionary_collection_lookup_cache_concurrent_changes(monkeypatch):
+    d1 = StenoDictionary()
+    d1.update({('S',): 'a'})
+    dc = StenoDictionaryCollection([d1], lookup_cache_size=2)
+    lookup = dc._lookup
+    def changing_lookup(key, **kwargs):
+        value = lookup(key, **kwargs)
+        # Simulate a change from another thread during the lookup.
+        if value == 'a':
+            d1[('S',)] = 'b'
+        return value
+    monkeypatch.setattr(dc, '_lookup', changing_lookup)
+    assert dc.lookup(('S',)) == 'a'
+    # The stale result was not cached.
+    assert dc.lookup(('S',)) == 'b'
+    assert dc.lookup(('S',)) == 'b'
+    assert (dc.lookup_cache_hits, dc.lookup_cache_misses) == (1, 2)
+
+
+def test_dictionary_collection_snapshot():
+    d1 = StenoDictionary()
+    d1.update({('S',): 'a', ('T', 'P'): 'b'})
+    d2 = StenoDictionary()
+    d2.update({('S',): 'c', ('P',): 'd', ('K',): 'A'})
+    dc = StenoDictionaryCollection([d1, d2])
+    snapshot = dc.snapshot()
+    # Unchanged until the collection state changes.
+    assert dc.snapshot() is snapshot
+    assert snapshot.dicts == (d1, d2)
+    assert snapshot.longest_key == 2
+    assert snapshot.lookup(('S',)) == 'a'
+    assert snapshot.lookup(('T', 'P')) == 'b'
+    assert snapshot.lookup_from_all(('S',)) == [('a', d1), ('c', d2)]
+    assert snapshot.reverse_lookup('c') == set()
+    assert snapshot.reverse_lookup('d') == {('P',)}
+    assert snapshot.casereverse_lookup('a') == {'a', 'A'}
+    # Entries changes are visible.
+    d1[('P',)] = 'e'
+    assert dc.snapshot() is snapshot
+    assert snapshot.lookup(('P',)) == 'e'
+    # But not other changes.
+    f = lambda k, v: v == 'a'
+    dc.add_filter(f)
+    d1.enabled = False
+    assert snapshot.dicts == (d1, d2)
+    assert snapshot.lookup(('S',)) == 'a'
+    new_snapshot = dc.snapshot()
+    assert new_snapshot is not snapshot
+    assert new_snapshot.dicts == (d2,)
+    assert new_snapshot.filters == (f,)
+    assert new_snapshot.lookup(('S',)) == 'c'
+    assert new_snapshot.lookup(('K',)) == 'A'
+    assert new_snapshot.raw_lookup(('P',)) == 'd'
+    d2.enabled = False
+    assert dc.snapshot().lookup(('K',)) is None
+    assert dc.snapshot().longest_key == 0
+
+
+@pytest.mark.parametrize('compact_storage', (False, True))
+def test_dictionary_collection_snapshot_concurrent_changes(compact_storage):
+    d = StenoDictionary()
+    d.compact_storage = compact_storage
+    d.update({('S%u' % n,): 'a' for n in range(20000)})
+    # Note: make sure changes don't affect the longest key.
+    d[('S', 'T', 'P')] = 'c'
+    dc = StenoDictionaryCollection([d])
+    stop = threading.Event()
+    def change():
+        n = 0
+        while not stop.is_set():
+            key = ('T%u' % (n % 100),)
+            d[key] = 'b'
+            del d[key]
+            n += 1
+    thread = threading.Thread(target=change)
+    thread.start()
+    try:
+        for __ in range(20):
+            snapshot = StenoDictionaryCollectionSnapshot(dc.dicts, dc.filters)
+            assert len(snapshot.reverse_lookup('a')) == 20000
+            assert len(snapshot.reverse_lookup('b')) <= 1
+            assert snapshot.reverse_lookup('c') == {('S', 'T', 'P')}
+    finally:
+        stop.set()
+        thread.join()
+
+
+@pytest.mark.parametrize('compact_storage', (False, True))
+def test_search(compact_storage):
+    d = StenoDictionary()
+    d.compact_storage = compact_storage
+    d.update({
+        ('TEFT',): 'test',
+        ('TEFT', '-G'): 'testing',
+        ('KON', 'TEFT'): 'contest',
+        ('TEFTS',): 'Tests',
+    })
+    assert d.search('test') == [(('TEFT',), 'test'), (('TEFT', '-G'), 'testing')]
+    assert d.search('test', count=1) == [(('TEFT',), 'test')]
+    assert d.search('test', ignore_case=True, start=2) == [(('TEFTS',), 'Tests')]
+    assert d.search('test', substring=True) == [
+        (('KON', 'TEFT'), 'contest'),
+        (('TEFT',), 'test'),
+        (('TEFT', '-G'), 'testing'),
+    ]
+    assert d.search('TEFT', strokes=True) == [
+        (('TEFT',), 'test'),
+        (('TEFT', '-G'), 'testing'),
+        (('TEFTS',), 'Tests'),
+    ]
+    assert d.search('/TEFT', strokes=True, substring=True) == [
+        (('KON', 'TEFT'), 'contest'),
+    ]
+    # The indexes are kept up to date.
+    d[('TEFT',)] = 'taste'
+    del d[('TEFT', '-G')]
+    d[('TEFTD',)] = 'tested'
+    assert d.search('test') == [(('TEFTD',), 'tested')]
+    assert d.search('TEFT', strokes=True) == [
+        (('TEFT',), 'taste'),
+        (('TEFTD',), 'tested'),
+        (('TEFTS',), 'Tests'),
+    ]
+    d.clear()
+    assert d.search('') == []
+    d.update({('TEFT',): 'test'})
+    assert d.search('te') == [(('TEFT',), 'test')]
+
+
+@pytest.mark.parametrize('compact_storage', (False, True))
+def test_sorted_keys(compact_storage):
+    d = StenoDictionary()
+    d.compact_storage = compact_storage
+    d.update({
+        ('TEFT',): 'test',
+        ('TEFT', '-G'): 'Testing',
+        ('A',): 'zebra',
+        ('PWAOE',): 'bee',
+    })
+    assert list(d.sorted_keys(strokes=True)) == [
+        ('a', ('A',)),
+        ('pwaoe', ('PWAOE',)),
+        ('teft', ('TEFT',)),
+        ('teft/-g', ('TEFT', '-G')),
+    ]
+    assert list(d.sorted_keys(reverse=True)) == [
+        ('zebra', ('A',)),
+        ('testing', ('TEFT', '-G')),
+        ('test', ('TEFT',)),
+        ('bee', ('PWAOE',)),
+    ]
+    assert list(d.sorted_keys(pattern='test')) == [('test', ('TEFT',))]
+    assert list(d.sorted_keys(pattern='test', ignore_case=True)) == [
+        ('test', ('TEFT',)),
+        ('testing', ('TEFT', '-G')),
+    ]
+    # Later changes are not taken into account.
+    keys = d.sorted_keys(strokes=True, pattern='TEFT')
+    del d[('TEFT',)]
+    assert list(keys) == [('teft', ('TEFT',)), ('teft/-g', ('TEFT', '-G'))]
+    assert list(d.sorted_keys(strokes=True, pattern='TEFT')) == [
+        ('teft/-g', ('TEFT', '-G')),
+    ]
+
+
+@pytest.mark.parametrize('compact_storage', (False, True))
+def test_search_concurrent_changes(compact_storage):
+    d = StenoDictionary()
+    d.compact_storage = compact_storage
+    d.update({('S%u' % n,): 'a%u' % n for n in range(2000)})
+    # Note: make sure changes don't affect the longest key.
+    d[('S', 'T', 'P')] = 'c'
+    d.build_search_indexes()
+    stop = threading.Event()
+    errors = []
+    def search():
+        while not stop.is_set():
+            try:
+                assert len(d.search('a', count=10)) == 10
+                for key, value in d.search('T', strokes=True):
+                    assert value == 'b'
+            except Exception as e:
+                errors.append(e)
+                break
+    thread = threading.Thread(target=search)
+    thread.start()
+    try:
+        # Note: enough changes to trigger some index rebuilds.
+        for n in range(2000):
+            key = ('T%u' % (n % 100),)
+            d[key] = 'b'
+            del d[key]
+            d[('S%u' % (n % 2000),)] = 'a%u' % n
+    finally:
+        stop.set()
+        thread.join()
+    assert not errors
+    assert d.search('b') == []
+    assert d.search('T', strokes=True) == []
+    assert sorted(d.search('')) == sorted(d.items())
+
+
+def test_build_search_indexes():
+    d = StenoDictionary()
+    d.update({('TEFT',): 'test'})
+    # Only the requested indexes are built.
+    d.build_search_indexes(strokes=False)
+    assert d._strokes_index is None
+    assert d._translations_index is not None
+    d.build_search_indexes(background=True)
+    for __ in range(100):
+        if d._strokes_index is not None and d._translations_index is not None:
+            break
+        time.sleep(0.01)
+    assert d._strokes_index is not None
+    assert d._translations_index is not None
+    assert d.search('te') == [(('TEFT',), 'test')]
+    assert d.search('TE', strokes=True) == [(('TEFT',), 'test')]
+    assert d.has_search_index(strokes=True)
+    assert d.has_search_index(strokes=False)
+    # Releasing them.
+    d.release_search_indexes(translations=False)
+    assert not d.has_search_index(strokes=True)
+    assert d.has_search_index(strokes=False)
+    d.release_search_indexes()
+    assert not d.has_search_index(strokes=False)
+    assert d.search('TE', strokes=True) == [(('TEFT',), 'test')]
+
+
+def test_dictionary_collection_search_translations():
+    d1 = StenoDictionary()
+    d1.update({('TEFT',): 'test', ('TEFTS',): 'Tests', ('TEFGT',): 'test'})
+    d2 = StenoDictionary()
+    d2.update({('TEFT',): 'testing', ('T*EFT',): 'test', ('TEFTD',): 'tested'})
+    dc = StenoDictionaryCollection([d1, d2])
+    assert dc.search_translations('test') == ['test', 'tested', 'testing']
+    assert dc.search_translations('test', count=2) == ['test', 'tested']
+    assert dc.search_translations('tests', ignore_case=True) == ['Tests']
+    assert dc.search_translations('sted', substring=True) == ['tested']
+    d1.enabled = False
+    assert dc.search_translations('test', ignore_case=True) == ['test', 'tested', 'testing']
+
+
+@pytest.mark.parametrize('compact_storage', (False, True))
+def test_has_prefix(compact_storage):
+    d = StenoDictionary()
+    d.compact_storage = compact_storage
+    assert not d.has_prefix(())
+    d.update({('S',): 'a', ('S', 'T', 'R'): 'b'})
+    assert d.has_prefix(())
+    # No pruning until the index is built.
+    assert d.has_prefix(('T',))
+    d.build_prefix_index()
+    assert d.has_prefix(('S',))
+    assert d.has_prefix(('S', 'T'))
+    assert not d.has_prefix(('S', 'T', 'R'))
+    assert not d.has_prefix(('T',))
+    assert not d.has_prefix(('P',))
+    # The index is kept up to date.
+    d[('T', 'P')] = 'c'
+    assert d.has_prefix(('T',))
+    d[('S', 'T', 'P')] = 'd'
+    del d[('S', 'T', 'R')]
+    assert d.has_prefix(('S', 'T'))
+    del d[('S', 'T', 'P')]
+    assert not d.has_prefix(('S', 'T'))
+    assert not d.has_prefix(('S',))
+    # The index is rebuilt (in the background) when
+    # the storage is replaced: wait for it.
+    d.clear()
+    d.build_prefix_index()
+    assert not d.has_prefix(('T',))
+    d.update({('T', 'P'): 'c'})
+    d.build_prefix_index()
+    assert d.has_prefix(('T',))
+    # Collection.
+    d2 = StenoDictionary()
+    d2[('S', 'T')] = 'e'
+    d2.build_prefix_index()
+    dc = StenoDictionaryCollection([d, d2])
+    assert dc.has_prefix(('T',))
+    assert dc.has_prefix(('S',))
+    assert not dc.has_prefix(('S', 'T'))
+    d2.enabled = False
+    assert not dc.has_prefix(('S',))
+
+
+def test_has_prefix_not_indexable():
+    assert StenoDictionary.indexable
+    d = PluginDictionary({('TEFT', '-G'): 'testing'})
+    assert not d.indexable
+    # The entries cannot be enumerated, so no pruning.
+    assert d.has_prefix(('TEFT',))
+    assert d.has_prefix(('-G',))
+    dc = StenoDictionaryCollection([d])
+    assert dc.has_prefix(('TEFT',))
+    # Opting back in.
+    class IndexableDictionary(PluginDictionary):
+        indexable = True
+    assert IndexableDictionary.indexable
+
+
+def test_lazy_reverse_index():
+    d = StenoDictionary()
+    d.update({('S',): 'a', ('T',): 'b', ('S', 'T'): 'a'})
+    d[('W',)] = 'c'
+    del d[('T',)]
+    # Reverse indexes are only built on demand...
+    assert d._reverse_index is None
+    assert d.reverse_lookup('a') == {('S',), ('S', 'T')}
+    assert d._reverse_index is not None
+    # ...and then kept up to date.
+    d[('T',)] = 'A'
+    del d[('S',)]
+    assert d.reverse_lookup('a') == {('S', 'T')}
+    assert d.casereverse_lookup('a') == {'a', 'A'}
+    assert d.reverse_lookup('c') == {('W',)}
+    d.clear()
+    assert d._reverse_index is None
+    assert d.reverse_lookup('a') == set()
+    # Building can be requested early, in the background.
+    d.update({('S',): 'a'})
+    assert d._reverse_index is None
+    d.build_reverse_index(background=True)
+    assert d.casereverse_lookup('A') == set()
+    assert d.reverse_lookup('a') == {('S',)}
+
+
 @dictionary_test
 class TestStenoDictionary:
 
@@ -224,3 +833,117 @@ class TestReadOnlyStenoDictionary:
             pass
     DICT_EXTENSION = 'dict'
     DICT_SAMPLE = b''
+
+
+def test_compact_storage():
+    s = CompactStorage()
+    assert len(s) == 0
+    s[('TEFT',)] = 'test'
+    s[('TEFT', '-G')] = 'testing'
+    s[('-G',)] = 'testing'
+    assert len(s) == 3
+    assert s[('TEFT',)] == 'test'
+    assert s.get(('TEFT', '-G')) == 'testing'
+    # Strokes are only stored once.
+    assert len(list(s.packed_keys())) == 3
+    assert sorted(map(s.key_length, s.packed_keys())) == [1, 1, 2]
+    assert s.pack(('TEFT', '-G')) == s.pack(('TEFT',)) + s.pack(('-G',))
+    assert list(s.prefixes(s.pack(('TEFT', '-G')))) == [s.pack(('TEFT',))]
+    # Unknown strokes.
+    assert ('-G', 'TEFT') not in s
+    assert ('TAOEUPL',) not in s
+    assert s.get(('TAOEUPL',)) is None
+    with pytest.raises(KeyError):
+        s[('TAOEUPL',)]
+    with pytest.raises(KeyError):
+        s.pack(('TAOEUPL',))
+    assert sorted(s.items()) == [
+        (('-G',), 'testing'),
+        (('TEFT',), 'test'),
+        (('TEFT', '-G'), 'testing'),
+    ]
+    assert s.unpack(s.pack(('TEFT', '-G'))) == ('TEFT', '-G')
+    del s[('TEFT',)]
+    assert ('TEFT',) not in s
+    assert ('TEFT', '-G') in s
+    with pytest.raises(KeyError):
+        del s[('TEFT',)]
+    s[('TEFT', '-G')] = 'tested'
+    assert s[('TEFT', '-G')] == 'tested'
+    assert len(s) == 2
+    s.clear()
+    assert len(s) == 0
+    assert list(s) == []
+    # Stroke ids are released too.
+    assert s._stroke_chars == {}
+    with pytest.raises(KeyError):
+        s.pack(('TEFT',))
+
+
+def test_compact_storage_many_changes():
+    # More strokes than fit in one byte, and enough
+    # changes to trigger a few rebuilds of the table.
+    strokes = ['S%uT' % n for n in range(1000)]
+    ref = {}
+    s = CompactStorage()
+    rnd = random.Random(42)
+    for n in range(20000):
+        key = tuple(rnd.choice(strokes) for __ in range(rnd.randint(1, 3)))
+        if key in ref and rnd.random() < 0.5:
+            del ref[key]
+            del s[key]
+        else:
+            ref[key] = 'translation %u' % n
+            s[key] = ref[key]
+    assert len(s) == len(ref)
+    assert dict(s.items()) == ref
+    for key, value in ref.items():
+        assert s[key] == value
+        assert s.unpack(s.pack(key)) == key
+        assert s.key_length(s.pack(key)) == len(key)
+
+
+def test_compact_storage_memory():
+    # Realistic vocabulary: a few thousand distinct strokes,
+    # keys of 1 to 3 strokes, mostly distinct translations.
+    rnd = random.Random(42)
+    strokes = [sys.intern('%s%u' % (rnd.choice('STKPWHR'), n)) for n in range(2000)]
+    entries = {}
+    while len(entries) < 8000:
+        key = '/'.join(rnd.choice(strokes) for __ in range(rnd.choice((1, 1, 2, 3))))
+        entries[key] = ' '.join(rnd.choice(('un', 'test', 'ing', 'ed', 'pre', 'ly'))
+                                for __ in range(rnd.randint(1, 4)))
+    data = json.dumps(entries)
+    del entries
+    def load(compact_storage):
+        # Like a dictionary loader: new key tuples (but with shared
+        # normalized strokes) and new translation strings.
+        d = StenoDictionary()
+        d.compact_storage = compact_storage
+        d.update((tuple(map(sys.intern, k.split('/'))), v)
+                 for k, v in json.loads(data).items())
+        return d
+    sizes = []
+    for compact_storage in (False, True):
+        gc.collect()
+        tracemalloc.start()
+        try:
+            d = load(compact_storage)
+            gc.collect()
+            sizes.append(tracemalloc.get_traced_memory()[0])
+        finally:
+            tracemalloc.stop()
+        del d
+    default_size, compact_size = sizes
+    assert compact_size < 0.6 * default_size
+
+
+@dictionary_test
+class TestCompactStenoDictionary:
+
+    class DICT_CLASS(StenoDictionary):
+        compact_storage = True
+        def _load(self, filename):
+            pass
+    DICT_EXTENSION = 'dict'
+    DICT_SAMPLE = b''
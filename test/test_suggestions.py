@@ -0,0 +1,64 @@
+"""Tests for suggestions.py."""
+
+from plover.steno_dictionary import StenoDictionary, StenoDictionaryCollection
+from plover.suggestions import Suggestion, Suggestions
+
+
+class CountingCollection(StenoDictionaryCollection):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reverse_lookups = 0
+
+    def reverse_lookup(self, value):
+        self.reverse_lookups += 1
+        return super().reverse_lookup(value)
+
+
+def make_collection():
+    d = StenoDictionary()
+    d.update({
+        ('TEFT',): 'test',
+        ('T*EFT',): '{^test}',
+        ('TEFTS',): 'Test',
+        ('-G',): '{^ing}',
+    })
+    return CountingCollection([d])
+
+
+def test_find():
+    suggestions = Suggestions(make_collection())
+    # Note: the order depends on the case variants found.
+    assert sorted(suggestions.find('test')) == [
+        Suggestion('Test', [('TEFTS',)]),
+        Suggestion('test', [('TEFT',)]),
+        Suggestion('{^test}', [('T*EFT',)]),
+    ]
+    assert suggestions.find('ing') == [Suggestion('{^ing}', [('-G',)])]
+    assert suggestions.find('unknown') == []
+
+
+def test_find_cache():
+    dc = make_collection()
+    suggestions = Suggestions(dc, cache_size=2)
+    expected = suggestions.find('test')
+    lookups = dc.reverse_lookups
+    assert lookups
+    assert suggestions.find('test') == expected
+    assert dc.reverse_lookups == lookups
+    # Least recently used results are evicted.
+    suggestions.find('ing')
+    suggestions.find('unknown')
+    lookups = dc.reverse_lookups
+    assert suggestions.find('test') == expected
+    assert dc.reverse_lookups > lookups
+
+
+def test_find_many():
+    dc = make_collection()
+    suggestions = Suggestions(dc, cache_size=10)
+    assert suggestions.find_many(['ing', 'unknown', 'test']) == \
+            suggestions.find('ing') + suggestions.find('test')
+    lookups = dc.reverse_lookups
+    suggestions.find_many(['test', 'ing'])
+    assert dc.reverse_lookups == lookups
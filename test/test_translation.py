@@ -404,6 +404,31 @@ class TestState:
         assert s.translations == [self.b, self.c]
         assert s.tail == self.a
 
+    def test_restrict_size_push_pop(self):
+        s = _State()
+        s.push(self.a, self.b)
+        s.restrict_size(3)
+        assert s.translations == [self.a, self.b]
+        s.push(self.c)
+        s.restrict_size(5)
+        assert s.translations == [self.b, self.c]
+        assert s.tail == self.a
+        assert s.pop() == self.c
+        s.push(self.a)
+        s.restrict_size(3)
+        assert s.translations == [self.b, self.a]
+        assert s.tail == self.a
+
+    def test_restrict_size_reassigned_translations(self):
+        s = _State()
+        s.push(self.c)
+        s.restrict_size(3)
+        # Replacing the list must not reuse the stale count of strokes.
+        s.translations = [self.a, self.a, self.a]
+        s.restrict_size(2)
+        assert s.translations == [self.a, self.a]
+        assert s.tail == self.a
+
 
 class TestTranslateStroke:
 
@@ -469,6 +494,19 @@ class TestTranslateStroke:
         self.tlor.add_listener(self.o)
         self.tlor.set_state(self.s)
 
+    def test_lookup_not_indexable_dictionary(self):
+        # Entries of dictionaries not held by their storage
+        # (e.g. a Python dictionary plugin) must not be pruned.
+        class PluginDictionary(StenoDictionary):
+            def get(self, key, fallback=None):
+                return {('TEFT', '-G'): 'testing'}.get(key, fallback)
+        d = PluginDictionary()
+        d._longest_key = 2
+        self.dc.set_dicts([d])
+        self.translate('TEFT')
+        self.translate('-G')
+        assert [t.english for t in self.s.translations] == ['testing']
+
     def test_first_stroke(self):
         self.translate('-B')
         self._check_translations(self.lt('-B'))
@@ -608,6 +646,21 @@ class TestTranslateStroke:
         self.translate('K-LG')
         self._check_translations(lt)
 
+    def test_suffix_folding_dictionary_change(self):
+        self.define('K-L', 'look')
+        self.translate('K-LG')
+        assert self.s.translations[-1].english is None
+        # The suffix mapping is not cached across changes.
+        self.define('-G', '{^ing}')
+        self.translate('K-LG')
+        assert self.s.translations[-1].english == 'look {^ing}'
+        self.define('-G', '{^in\'}')
+        self.translate('K-LG')
+        assert self.s.translations[-1].english == 'look {^in\'}'
+        self.d.clear()
+        self.translate('K-LG')
+        assert self.s.translations[-1].english is None
+
     def test_retrospective_insert_space(self):
         self.define('T/E/S/T', 'a longer key')
         self.define('PER', 'perfect')
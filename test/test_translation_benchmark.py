@@ -0,0 +1,280 @@
+"""Benchmarks for the translation hot path (`Translator` + `Formatter`).
+
+Run with `pytest --benchmark test/test_translation_benchmark.py`.
+
+Long stroke streams are replayed against big generated dictionaries,
+reporting the throughput, per-stroke latency percentiles, and memory
+allocations. All the inputs are generated from a fixed seed, so results
+are comparable across commits; use `--benchmark-json` to save them.
+
+Real strokes can also be replayed with `--benchmark-stroke-log`, from
+a stroke log as written when stroke logging is enabled: only the strokes
+are used (translations in the log, if any, are ignored).
+
+"""
+
+import ast
+import gc
+import json
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+import pytest
+
+from plover import system
+from plover.config import DEFAULT_UNDO_LEVELS
+from plover.formatting import Formatter
+from plover.steno import Stroke
+from plover.steno_dictionary import StenoDictionary, StenoDictionaryCollection
+from plover.translation import Translator
+
+
+SEED = 42
+
+# Memory allocations are only traced for the first strokes
+# of a stream (as tracing slows down the replay a lot).
+ALLOCATIONS_STROKES = 10000
+
+STROKE_LOG_RX = re.compile(r'\*?Stroke\(.* : (\[[^\]]*\])\)$')
+
+SYLLABLES = '''
+ba be bi bo bu da de di do du fa fe fi fo fu ga ge go gu ka ke ki ko ku
+la le li lo lu ma me mi mo mu na ne ni no nu pa pe pi po pu ra re ri ro
+ru sa se si so su ta te ti to tu va ve vi vo vu an en in on un ar er or
+'''.split()
+
+AFFIXES = (
+    '{^ing}', '{^ed}', '{^s}', '{^er}', '{^ly}', '{^ment}', '{^ness}',
+    '{re^}', '{un^}', '{pre^}', '{^-^}', '{^}',
+)
+
+PUNCTUATION = (
+    '{.}', '{,}', '{?}', '{!}', '{:}', '{;}', '{-|}', '{>}', '{<}',
+)
+
+# Dictionaries of a typical setup: a small user dictionary
+# on top of a few big ones (in priority order).
+DICTIONARIES_SPLIT = (0.02, 0.18, 0.8)
+
+
+def parse_stroke_log(fp):
+    """Return the list of strokes (steno keys) in the stroke log <fp>."""
+    strokes = []
+    for line in fp:
+        m = STROKE_LOG_RX.search(line.rstrip())
+        if m is not None:
+            strokes.append(ast.literal_eval(m.group(1)))
+    return strokes
+
+def generate_strokes(rnd, count):
+    """Generate <count> distinct strokes."""
+    keys = [k for k in system.KEYS if k != system.NUMBER_KEY]
+    strokes = {}
+    while len(strokes) < count:
+        stroke = Stroke(rnd.sample(keys, rnd.randint(1, 7)))
+        if not stroke.is_correction:
+            strokes[stroke.rtfcre] = stroke
+    return list(strokes.values())
+
+def generate_word(rnd):
+    return ''.join(rnd.choice(SYLLABLES) for __ in range(rnd.randint(1, 4)))
+
+def generate_translation(rnd):
+    r = rnd.random()
+    if r < 0.70:
+        return generate_word(rnd)
+    if r < 0.85:
+        return ' '.join(generate_word(rnd) for __ in range(rnd.randint(2, 4)))
+    if r < 0.95:
+        return rnd.choice(AFFIXES)
+    return rnd.choice(PUNCTUATION)
+
+def generate_entries(rnd, strokes, count):
+    """Generate <count> dictionary entries, from the pool of <strokes>."""
+    entries = {}
+    while len(entries) < count:
+        r = rnd.random()
+        length = 1 if r < 0.6 else 2 if r < 0.9 else 3
+        key = tuple(rnd.choice(strokes).rtfcre for __ in range(length))
+        entries[key] = generate_translation(rnd)
+    # Folded suffixes.
+    for key, translation in (
+        ('-G', '{^ing}'), ('-S', '{^s}'), ('-D', '{^ed}'), ('-Z', '{^s}'),
+    ):
+        entries[(key,)] = translation
+    return entries
+
+def generate_stream(rnd, strokes, entries, count):
+    """Generate a stream of <count> strokes (steno keys).
+
+    Most strokes make up dictionary entries, with a few strokes
+    not necessarily in the dictionary, and some undo strokes.
+    """
+    by_rtfcre = {s.rtfcre: s for s in strokes}
+    keys = list(entries)
+    undo_stroke = Stroke([system.UNDO_STROKE_STENO.strip('-')])
+    stream = []
+    while len(stream) < count:
+        r = rnd.random()
+        if r < 0.03 and undo_stroke.is_correction:
+            stream.append(list(undo_stroke.steno_keys))
+        elif r < 0.08:
+            stream.append(list(rnd.choice(strokes).steno_keys))
+        else:
+            for rtfcre in rnd.choice(keys):
+                stroke = by_rtfcre.get(rtfcre)
+                if stroke is not None:
+                    stream.append(list(stroke.steno_keys))
+    return stream[:count]
+
+def build_dictionaries(rnd, entries):
+    """Split <entries> over multiple dictionaries (see `DICTIONARIES_SPLIT`)."""
+    dicts = [StenoDictionary() for __ in DICTIONARIES_SPLIT]
+    for d, path in zip(dicts, ('user.json', 'main.json', 'big.json')):
+        d.path = path
+    cumulative = []
+    total = 0
+    for ratio in DICTIONARIES_SPLIT:
+        total += ratio
+        cumulative.append(total)
+    split = [{} for __ in dicts]
+    for key, translation in entries.items():
+        r = rnd.random()
+        n = next((n for n, c in enumerate(cumulative) if r < c), len(dicts) - 1)
+        split[n][key] = translation
+    for d, d_entries in zip(dicts, split):
+        d.update(d_entries)
+    return dicts
+
+def new_pipeline(dicts):
+    translator = Translator()
+    translator.set_min_undo_length(DEFAULT_UNDO_LEVELS)
+    translator.set_dictionary(StenoDictionaryCollection(dicts))
+    formatter = Formatter()
+    translator.add_listener(formatter.format)
+    return translator
+
+def replay(dicts, stream):
+    """Replay <stream>, and return the latency of each stroke (ns)."""
+    translator = new_pipeline(dicts)
+    clock = time.perf_counter_ns
+    latencies = []
+    for keys in stream:
+        start = clock()
+        translator.translate(Stroke(keys))
+        latencies.append(clock() - start)
+    return latencies
+
+def replay_allocations(dicts, stream):
+    """Replay <stream>, and return the peak of traced memory
+    and the number of memory blocks still allocated after."""
+    translator = new_pipeline(dicts)
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    try:
+        for keys in stream:
+            translator.translate(Stroke(keys))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    gc.collect()
+    return peak, sys.getallocatedblocks() - blocks
+
+def percentile(sorted_values, p):
+    index = min(len(sorted_values) - 1, int(p * len(sorted_values)))
+    return sorted_values[index]
+
+def run_benchmark(name, dicts, stream, warmup=1000):
+    # Warm the caches (strokes, dictionaries indexes, ...).
+    replay(dicts, stream[:warmup])
+    gc.collect()
+    latencies = replay(dicts, stream)
+    peak, blocks = replay_allocations(dicts, stream[:ALLOCATIONS_STROKES])
+    latencies.sort()
+    return {
+        'name': name,
+        'strokes': len(stream),
+        'strokes_per_sec': len(stream) / (sum(latencies) / 1e9),
+        # Latencies in microseconds.
+        'latency_p50': percentile(latencies, 0.50) / 1e3,
+        'latency_p90': percentile(latencies, 0.90) / 1e3,
+        'latency_p99': percentile(latencies, 0.99) / 1e3,
+        'latency_max': latencies[-1] / 1e3,
+        'memory_peak_kib': peak / 1024,
+        'retained_blocks': blocks,
+    }
+
+def format_result(result):
+    return (
+        '{name}: {strokes} strokes, {strokes_per_sec:.0f} strokes/s, '
+        'latency (µs) p50={latency_p50:.1f} p90={latency_p90:.1f} '
+        'p99={latency_p99:.1f} max={latency_max:.1f}, '
+        'memory peak={memory_peak_kib:.0f}KiB retained={retained_blocks} blocks'
+    ).format(**result)
+
+
+def test_parse_stroke_log(tmp_path):
+    log_file = tmp_path / 'strokes.log'
+    log_file.write_text('\n'.join((
+        "2020-01-01 12:00:00,001 Stroke(S : ['S-'])",
+        "2020-01-01 12:00:00,002 Translation(('S',) : 'is')",
+        "2020-01-01 12:00:00,003 *Stroke(* : ['*'])",
+        "2020-01-01 12:00:00,004 *Translation(('S',) : 'is')",
+        "2020-01-01 12:00:00,005 Stroke(1-9 : ['1-', '-9'])",
+        '',
+    )), encoding='utf-8')
+    with open(str(log_file), encoding='utf-8') as fp:
+        assert parse_stroke_log(fp) == [['S-'], ['*'], ['1-', '-9']]
+
+def test_run_benchmark():
+    # Check the benchmark machinery itself, on a small scale.
+    rnd = random.Random(SEED)
+    strokes = generate_strokes(rnd, 50)
+    entries = generate_entries(rnd, strokes, 200)
+    stream = generate_stream(rnd, strokes, entries, 300)
+    assert len(stream) == 300
+    dicts = build_dictionaries(rnd, entries)
+    assert sum(len(d) for d in dicts) == len(entries)
+    result = run_benchmark('small', dicts, stream, warmup=10)
+    assert result['strokes'] == 300
+    assert result['latency_p50'] <= result['latency_p99'] <= result['latency_max']
+    assert format_result(result).startswith('small: 300 strokes, ')
+
+
+@pytest.mark.benchmark
+def test_translation_benchmark(request, capsys):
+    rnd = random.Random(SEED)
+    strokes = generate_strokes(rnd, 4000)
+    entries = generate_entries(rnd, strokes, 150000)
+    stream = generate_stream(rnd, strokes, entries, 50000)
+    dicts = build_dictionaries(rnd, entries)
+    single_dict = StenoDictionary()
+    single_dict.update(entries)
+    benchmarks = [
+        ('synthetic (1 dictionary)', [single_dict], stream),
+        ('synthetic (%u dictionaries)' % len(dicts), dicts, stream),
+    ]
+    for log_filename in request.config.getoption('--benchmark-stroke-log'):
+        with open(log_filename, encoding='utf-8') as fp:
+            log_stream = parse_stroke_log(fp)
+        benchmarks.append(('stroke log %s' % log_filename, dicts, log_stream))
+    results = []
+    for name, bench_dicts, bench_stream in benchmarks:
+        result = run_benchmark(name, bench_dicts, bench_stream)
+        with capsys.disabled():
+            print('\n' + format_result(result), end='')
+        results.append(result)
+    with capsys.disabled():
+        print()
+    json_filename = request.config.getoption('--benchmark-json')
+    if json_filename is not None:
+        with open(json_filename, 'w', encoding='utf-8') as fp:
+            json.dump({
+                'python': sys.version.split()[0],
+                'seed': SEED,
+                'results': results,
+            }, fp, indent=2)
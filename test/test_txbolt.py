@@ -0,0 +1,69 @@
+"""Unit tests for txbolt.py."""
+
+import threading
+import time
+
+from plover.machine.txbolt import TxBolt
+from plover.steno import keys_to_mask
+
+from plover_build_utils.testing import parametrize
+
+
+class MockSerial:
+
+    def __init__(self, **params):
+        pass
+
+    def isOpen(self):
+        return True
+
+    def getSettingsDict(self):
+        return {}
+
+    def applySettingsDict(self, settings):
+        pass
+
+    def inWaiting(self):
+        return len(self.data[0]) if self.data else 0
+
+    def read(self, size=1):
+        if not self.data:
+            self.event.set()
+            time.sleep(0.01)
+            return b''
+        return self.data.pop(0)
+
+    def close(self):
+        pass
+
+
+TXBOLT_TESTS = (
+    # One key per set.
+    lambda: ((b'\x01\x41\x81\xc1',), [['S-', 'R-', '-F', '-T']]),
+    # Number bar.
+    lambda: ((b'\x01\xd0',), [['S-', '#']]),
+    # New stroke started by a lower set.
+    lambda: ((b'\x02\x42\x04',), [['T-', 'A-'], ['K-']]),
+    # Zero byte.
+    lambda: ((b'\x04\x00\x04',), [['K-'], ['K-']]),
+    # Stroke finished on timeout.
+    lambda: ((b'\x08', b'', b'\x10'), [['P-'], ['W-']]),
+)
+
+@parametrize(TXBOLT_TESTS)
+def test_txbolt(monkeypatch, inputs, expected):
+    params = {k: v[0] for k, v in TxBolt.get_option_info().items()}
+    class mock(MockSerial):
+        event = threading.Event()
+        data = list(inputs)
+    monkeypatch.setattr('plover.machine.base.serial.Serial', mock)
+    actual = []
+    actual_masks = []
+    m = TxBolt(params)
+    m.add_stroke_callback(actual.append)
+    m.add_stroke_mask_callback(actual_masks.append)
+    m.start_capture()
+    mock.event.wait()
+    m.stop_capture()
+    assert [sorted(keys) for keys in actual] == [sorted(keys) for keys in expected]
+    assert actual_masks == [keys_to_mask(keys) for keys in expected]